@@ -0,0 +1,436 @@
+"""
+Benchmark suite for the simulation and the data pipeline.
+
+Measures how fast simulate_day(), full_spectrum(), log_data() and
+vsc_data.fetch() are, so a change can be compared with an earlier revision.
+Everything runs offline: the Snowflake connector is replaced by a mock that
+returns fixed fixture tables, and all log/checkpoint files are written to a
+temporary folder instead of the real "log.csv".
+
+Usage:
+    python benchmark.py                      run and write benchmark_results.json
+    python benchmark.py --save-baseline      run and store the results as the baseline
+    python benchmark.py --baseline FILE      run and compare against FILE, exits
+                                             with code 1 if anything regressed by
+                                             more than --threshold (default 25%)
+    python benchmark.py --only single_day    run only benchmarks whose name
+                                             contains "single_day"
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import statistics
+import tracemalloc
+import contextlib
+import io
+import subprocess
+import importlib.util
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+
+SEED = 1234
+RESULTS_FILE = 'benchmark_results.json'
+BASELINE_FILE = 'benchmark_baseline.json'
+# relative slowdown that counts as a regression
+THRESHOLD = 0.25
+# how many times each latency benchmark is repeated, the median is reported
+REPEATS = 3
+
+# (interactions, agent starts) for the single day latency benchmarks
+SINGLE_DAY_CASES = [(800, 18), (1000, 20), (1200, 24)]
+# a day with far more work than staff, so the backlog builds all day
+SATURATED_CASE = {'interactions': 1400, 'starts': 12, 'handle_minutes': 12.0}
+# small grid for the sweep throughput benchmark
+SWEEP_CASE = {'handle_minutes_min': 9.0, 'handle_minutes_max': 10.0,
+              'step_minutes': .5,
+              'interactions_min': 900, 'interactions_max': 1000,
+              'interactions_step': 100, 'agent_starts_min': 19,
+              'agent_starts_max': 21}
+LOG_ROWS = 2000
+# consolidated multi-site day for the scale mode (ENGINE = 'queue') stress test
+SCALE_CASE = {'interactions': 50000, 'starts': 1000, 'handle_minutes': 9.91}
+# the scale day should take a few seconds at most
+SCALE_BUDGET_SECONDS = 5.0
+# modules that must not be loaded just by starting the GUI or importing the
+#   sim, they are only needed for the data pull and forecast mode
+HEAVY_MODULES = ('sklearn', 'matplotlib', 'snowflake')
+# how many of them may be loaded at startup
+MAX_HEAVY_MODULES = 0
+# seconds to import the GUI module, or the sim modules, in a fresh interpreter
+STARTUP_BUDGET_SECONDS = 1.0
+STARTUP_SNIPPET = '''
+import sys, time, json
+start = time.perf_counter()
+import {modules}
+seconds = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'seconds': seconds, 'heavy': heavy}}))
+'''
+
+
+def seed(n: int = SEED) -> None:
+    """Fixes every random number generator that the sim uses."""
+    import simulate as sm
+    sm.set_seed(n)
+
+
+"""
+---- Mocked Snowflake data
+"""
+
+
+def fixture_interactions(days: int = 90) -> pd.DataFrame:
+    rng = np.random.RandomState(SEED)
+    dates = pd.bdate_range(end='2023-12-15', periods=days)
+    counts = rng.normal(980, 60, days).round().astype(int)
+    return pd.DataFrame({'DATE': dates.date, 'DAILYINTERACTIONCOUNT': counts})
+
+
+def fixture_agent_starts(days: int = 90) -> pd.DataFrame:
+    rng = np.random.RandomState(SEED + 1)
+    dates = pd.bdate_range(end='2023-12-15', periods=days)
+    starts = rng.normal(20, 2, days).round().astype(int)
+    return pd.DataFrame({'DATE': dates.date, 'NUMBEROFUSERS': starts})
+
+
+def mock_get_data(query=None) -> pd.DataFrame:
+    """Stands in for connector.get_data(), picks a fixture based on the query."""
+    if query is not None and 'NumberOfUsers' in query:
+        return fixture_agent_starts()
+    return fixture_interactions()
+
+
+def install_mock_connector() -> None:
+    """Puts a fake "connector" module in place before vsc_data imports it."""
+    mock = types.ModuleType('connector')
+    mock.get_data = mock_get_data
+    mock.QUERY = ''
+    sys.modules['connector'] = mock
+
+
+"""
+---- Benchmarks
+    Each benchmark returns a list of results, where a result is a dict with
+    the name, value, unit and whether 'lower' or 'higher' is better.
+"""
+
+
+def result(name: str, value: float, unit: str, better: str = 'lower',
+           limit: Optional[float] = None) -> dict:
+    """
+    limit is an absolute budget, the run fails if the value is over it (or
+        under it, if better is 'higher').
+    """
+    doc = {'name': name, 'value': float(value), 'unit': unit, 'better': better}
+    if limit is not None:
+        doc['limit'] = float(limit)
+    return doc
+
+
+def time_call(func, repeats: int = REPEATS) -> float:
+    """Returns the median wall time of func() in seconds."""
+    timings = []
+    for i in range(repeats):
+        seed(SEED + i)
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def set_scenario(sm, interactions: int, starts: int, handle_minutes: float = 9.91) -> None:
+    sm.ENABLE_DISTRIBUTIONS = False
+    sm.INTERACTIONS_MEAN = interactions
+    sm.AGENT_STARTS = starts
+    sm.HANDLE_TIME_MEAN = handle_minutes
+
+
+def bench_single_day(sm) -> list:
+    results = []
+    for interactions, starts in SINGLE_DAY_CASES:
+        set_scenario(sm, interactions, starts)
+        seconds = time_call(sm.simulate_day)
+        results.append(result('single_day_{}i_{}a'.format(interactions, starts),
+                              seconds, 's'))
+    return results
+
+
+def bench_saturated_day(sm) -> list:
+    set_scenario(sm, SATURATED_CASE['interactions'], SATURATED_CASE['starts'],
+                 SATURATED_CASE['handle_minutes'])
+    seconds = time_call(sm.simulate_day)
+    return [result('saturated_day', seconds, 's')]
+
+
+def bench_scale_day(sm) -> list:
+    set_scenario(sm, SCALE_CASE['interactions'], SCALE_CASE['starts'],
+                 SCALE_CASE['handle_minutes'])
+    engine = sm.ENGINE
+    sm.ENGINE = 'queue'
+    try:
+        seconds = time_call(sm.simulate_day)
+        seed()
+        tracemalloc.start()
+        sm.simulate_day()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        sm.ENGINE = engine
+    return [result('scale_day_50000i_1000a', seconds, 's', limit=SCALE_BUDGET_SECONDS),
+            result('memory_peak_scale_day', peak / 2**20, 'MiB')]
+
+
+def time_startup(modules: str) -> tuple:
+    """
+    Imports the modules in a fresh interpreter, from the repo folder.
+
+    Returns: (median seconds, heavy modules that got loaded)
+    """
+    code = STARTUP_SNIPPET.format(modules=modules, heavy=HEAVY_MODULES)
+    repo = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for i in range(REPEATS):
+        out = subprocess.run([sys.executable, '-c', code], cwd=repo, capture_output=True,
+                             text=True, check=True)
+        doc = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(doc['seconds'])
+    return statistics.median(timings), doc['heavy']
+
+
+def bench_startup(sm) -> list:
+    """Import time of the sim modules, and of the GUI when PySimpleGUI is installed."""
+    results = []
+    seconds, heavy = time_startup('simulate, forecast, vsc_data')
+    results.append(result('startup_sim_imports', seconds, 's', limit=STARTUP_BUDGET_SECONDS))
+    results.append(result('startup_heavy_modules', len(heavy), 'modules',
+                          limit=MAX_HEAVY_MODULES))
+    if heavy:
+        print("Importing the sim loaded", ', '.join(heavy), file=sys.stderr)
+    if importlib.util.find_spec('PySimpleGUI') is not None:
+        seconds, heavy = time_startup('gui')
+        results.append(result('startup_gui_import', seconds, 's', limit=STARTUP_BUDGET_SECONDS))
+        results.append(result('startup_gui_heavy_modules', len(heavy), 'modules',
+                              limit=MAX_HEAVY_MODULES))
+    else:
+        print("PySimpleGUI is not installed, the GUI startup budget was not checked.",
+              file=sys.stderr)
+    return results
+
+
+def bench_sweep(sm) -> list:
+    seed()
+    scenarios = 0
+    for i in range(int(SWEEP_CASE['handle_minutes_min'] * 60),
+                   int(SWEEP_CASE['handle_minutes_max'] * 60) + 1,
+                   int(SWEEP_CASE['step_minutes'] * 60)):
+        for j in range(SWEEP_CASE['interactions_min'],
+                       SWEEP_CASE['interactions_max'] + 1,
+                       SWEEP_CASE['interactions_step']):
+            scenarios += SWEEP_CASE['agent_starts_max'] - SWEEP_CASE['agent_starts_min'] + 1
+    start = time.perf_counter()
+    sm.full_spectrum(resume=False, **SWEEP_CASE)
+    seconds = time.perf_counter() - start
+    return [result('sweep_throughput', scenarios / seconds, 'scenarios/s', 'higher')]
+
+
+def bench_memory(sm) -> list:
+    set_scenario(sm, SATURATED_CASE['interactions'], SATURATED_CASE['starts'],
+                 SATURATED_CASE['handle_minutes'])
+    seed()
+    tracemalloc.start()
+    sm.simulate_day()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return [result('memory_peak_saturated_day', peak / 2**20, 'MiB')]
+
+
+def bench_log(sm) -> list:
+    set_scenario(sm, 1000, 20)
+    seed()
+    sm.simulate_day()
+    df = sm.day_to_df()
+    if os.path.exists('log.csv'):
+        os.remove('log.csv')
+
+    start = time.perf_counter()
+    for i in range(LOG_ROWS):
+        sm.log_data(df)
+    write_seconds = time.perf_counter() - start
+    sm.LOG_BUFFER = ""
+
+    start = time.perf_counter()
+    read_df = pd.read_csv('log.csv', header=None)
+    read_seconds = time.perf_counter() - start
+    assert len(read_df) == LOG_ROWS
+
+    return [result('log_write_throughput', LOG_ROWS / write_seconds, 'rows/s', 'higher'),
+            result('log_read_throughput', LOG_ROWS / read_seconds, 'rows/s', 'higher')]
+
+
+def bench_fetch(sm) -> list:
+    import vsc_data as vd
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds = time_call(vd.fetch)
+    return [result('vsc_data_fetch', seconds, 's')]
+
+
+BENCHMARKS = [
+    ('single_day', bench_single_day),
+    ('saturated_day', bench_saturated_day),
+    ('scale_day', bench_scale_day),
+    ('sweep', bench_sweep),
+    ('memory', bench_memory),
+    ('log', bench_log),
+    ('fetch', bench_fetch),
+    ('startup', bench_startup),
+]
+
+
+"""
+---- Running, storing and comparing
+"""
+
+
+def run(only: str = None) -> dict:
+    """Runs the suite in a temporary folder and returns the results document."""
+    install_mock_connector()
+    import simulate as sm
+    sm.CONSOLE_LOGGING_LEVEL = 'minimal'
+
+    results = {}
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='vsc_bench_')
+    try:
+        os.chdir(workdir)
+        for name, bench in BENCHMARKS:
+            if only and only not in name:
+                continue
+            print("Running benchmark:", name)
+            with contextlib.redirect_stdout(io.StringIO()):
+                outcome = bench(sm)
+            for r in outcome:
+                results[r['name']] = r
+                print('    {:<32}{:>14.4f} {}'.format(r['name'], r['value'], r['unit']))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': SEED,
+        },
+        'results': results,
+    }
+
+
+def save(doc: dict, path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(doc, f, indent=2)
+
+
+def load(path: str) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare(current: dict, baseline: dict, threshold: float = THRESHOLD) -> list:
+    """
+    Compares two results documents.
+
+    Returns: list of (name, baseline value, current value, relative change,
+        regressed) tuples. Relative change is positive when things got worse.
+    """
+    rows = []
+    for name, base in baseline['results'].items():
+        if name not in current['results']:
+            continue
+        now = current['results'][name]['value']
+        if base['value'] == 0:
+            # nothing to scale by, e.g. heavy modules loaded at startup, any
+            #   move the wrong way is a regression
+            worse = now > 0 if base['better'] == 'lower' else now < 0
+            rows.append((name, base['value'], now, float('inf') if worse else 0.0, worse))
+            continue
+        if base['better'] == 'lower':
+            change = (now - base['value']) / base['value']
+        else:
+            change = (base['value'] - now) / base['value']
+        rows.append((name, base['value'], now, change, change > threshold))
+    return rows
+
+
+def over_limit(doc: dict) -> list:
+    """Results outside their absolute limit. Returns: list of result dicts."""
+    failed = []
+    for r in doc['results'].values():
+        if 'limit' not in r:
+            continue
+        if r['value'] > r['limit'] if r['better'] == 'lower' else r['value'] < r['limit']:
+            failed.append(r)
+    return failed
+
+
+def print_comparison(rows: list) -> None:
+    print('\n{:<32}{:>14}{:>14}{:>10}'.format('benchmark', 'baseline', 'current', 'worse by'))
+    for name, base, now, change, regressed in rows:
+        print('{:<32}{:>14.4f}{:>14.4f}{:>9.1f}%{}'.format(
+            name, base, now, change * 100, '  REGRESSION' if regressed else ''))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=RESULTS_FILE)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--only', default=None)
+    args = parser.parse_args()
+
+    doc = run(args.only)
+    save(doc, args.output)
+    print("\nResults written to", args.output)
+
+    # budgets fail the run whatever the baseline says
+    failed = over_limit(doc)
+    for r in failed:
+        print("Over budget: {} is {:.4f} {}, the limit is {:g}.".format(
+            r['name'], r['value'], r['unit'], r['limit']))
+    if failed:
+        if args.save_baseline:
+            print("Baseline not saved.")
+        return 1
+
+    if args.save_baseline:
+        save(doc, BASELINE_FILE if not args.baseline else args.baseline)
+        print("Baseline saved.")
+        return 0
+
+    baseline_path = args.baseline if args.baseline else BASELINE_FILE
+    if not os.path.exists(baseline_path):
+        print("No baseline found at", baseline_path, "- nothing to compare against.")
+        return 0
+
+    rows = compare(doc, load(baseline_path), args.threshold)
+    print_comparison(rows)
+    if any(row[4] for row in rows):
+        print("\nPerformance regressed by more than {:.0f}%.".format(args.threshold * 100))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
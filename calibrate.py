@@ -0,0 +1,391 @@
+"""
+Calibration of the sim's correction factors against historical days.
+
+The sim has a few factors that were set by hand until its output looked
+right: the volume correction (1.0112 in the old interval-based arrivals), the
+utilization correction and clamp in get_utilization(), and how much of
+AGENT_PORTIONS is really worked. This fits them to real days instead, so they
+can be refit after every data pull.
+
+The history is a CSV with one row per day and the columns
+    Agent Starts, Interactions Today, Handle Time (EHT in minutes), ASR
+and optionally Utilization and Date. These are the column names of the day
+rows in log.csv, so observed days can be kept in the same layout as
+simulated ones.
+
+VOLUME_CORRECTION and STAFFING_SCALE both change the work per agent, so days
+of (starts, interactions, ASR) can't tell them apart: more volume or fewer
+agents give the same ASR, and fitting both lands anywhere along that ridge.
+Only one of them is fitted to the observed ASR (--factor, STAFFING_SCALE by
+default), the other is held at the sim's current value. Every historical day
+is replayed REPLICATIONS times on the same random numbers for every
+candidate, and the fit minimizes the root mean squared ASR error.
+
+The days are replayed on the sim's ENGINE, since the two engines give
+different ASRs for the same day and factors fitted on one are off on the
+other: 'queue' uses the fast evaluator (queue_engine.py) directly, with the
+sim's agent rates (AGENT_RATE_DIST), 'simpy' runs simulate_day() and is much
+slower, so give it a bigger --budget. The result records the engine the
+factors were fitted on.
+
+The search is a derivative free pattern search: each iteration scores one
+step up and one step down, in parallel, moves to the better one, and halves
+the step when neither improves. UTILIZATION_CORRECTION and UTILIZATION_CLAMP
+only change the reported utilization, so once the simulated days are fixed
+they are fitted to the observed utilization with a grid search, without
+simulating again. A factor that ends on the edge of its search range is
+reported, and left out of the recommended settings.
+
+Usage:
+    python calibrate.py --history observed_days.csv
+"""
+
+import os
+import sys
+import csv
+import time
+import argparse
+import concurrent.futures
+from typing import Optional, List
+import numpy as np
+import simulate as sm
+import arrivals
+import handle_times
+import staffing
+import queue_engine
+
+
+HISTORY_COLUMNS = ('Agent Starts', 'Interactions Today', 'Handle Time', 'ASR')
+# factors fitted to the ASR, one at a time, and the range each one is searched in
+BOUNDS = {
+    'volume_correction': (.8, 1.25),
+    'staffing_scale': (.7, 1.3),
+}
+FIRST_STEP = .04
+MIN_STEP = .0025
+REPLICATIONS = 3
+TIME_BUDGET_SECONDS = 5 * 60
+SEED = 42
+UTILIZATION_CORRECTIONS = np.round(np.arange(.8, 1.1001, .005), 3)
+UTILIZATION_CLAMPS = np.round(np.arange(.8, 1.0001, .01), 2)
+
+# history, set in each worker process by _init_worker()
+_HISTORY = []
+_SETTINGS = {}
+
+
+def load_history(path: str) -> List[dict]:
+    """Reads the historical days, rows with a missing value are skipped."""
+    days = []
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f, skipinitialspace=True)
+        missing = [c for c in HISTORY_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError("{} is missing the column(s) {}.".format(path, ', '.join(missing)))
+        for row in reader:
+            try:
+                day = {
+                    'date': row.get('Date', ''),
+                    'starts': int(float(row['Agent Starts'])),
+                    'interactions': float(row['Interactions Today']),
+                    'eht': float(row['Handle Time']),
+                    'asr': float(row['ASR']),
+                    'utilization': float(row['Utilization']) if row.get('Utilization') else None,
+                }
+            except ValueError:
+                continue
+            days.append(day)
+    if not days:
+        raise ValueError("No usable days in {}.".format(path))
+    return days
+
+
+def current_factors() -> dict:
+    return {'volume_correction': sm.VOLUME_CORRECTION, 'staffing_scale': sm.STAFFING_SCALE,
+            'utilization_correction': sm.UTILIZATION_CORRECTION,
+            'utilization_clamp': sm.UTILIZATION_CLAMP}
+
+
+def _init_worker(history: list, settings: dict) -> None:
+    global _HISTORY, _SETTINGS
+    _HISTORY = history
+    _SETTINGS = settings
+    # the sim's own settings, for replays on simulate_day()
+    sm.CONSOLE_LOGGING_LEVEL = 'minimal'
+    sm.LOG_TO_FILE = False
+    sm.ENGINE = settings['engine']
+    sm.ENABLE_DISTRIBUTIONS = False
+    sm.AGENT_PORTIONS = settings['agent_portions']
+    sm.WORK_PORTIONS = settings['work_portions']
+    sm.ARRIVAL_MODE = settings['arrival_mode']
+    sm.SUB_HOUR_PROFILE = settings['sub_hour_profile']
+    sm.HANDLE_TIME_DIST = settings['handle_dist']
+    sm.HANDLE_TIME_CV = settings['handle_cv']
+    sm.AGENT_RATE_DIST = settings['rate_dist']
+    sm.AGENT_RATE_CV = settings['rate_cv']
+
+
+def replay(factors: tuple) -> np.ndarray:
+    """
+    Replays every historical day with the given (volume_correction,
+        staffing_scale), on the engine in the settings.
+
+    Returns: (days, 2) array of the mean simulated ASR and interactions
+        handled per day.
+    """
+    if _SETTINGS['engine'] != 'queue':
+        return replay_sim(factors)
+    volume_correction, staffing_scale = factors
+    portions = sm.scaled_portions(_SETTINGS['agent_portions'], staffing_scale)
+    out = np.empty((len(_HISTORY), 2))
+    for d, day in enumerate(_HISTORY):
+        plan = staffing.compile_staffing(day['starts'], portions)
+        asr, handled = [], []
+        for r in range(_SETTINGS['replications']):
+            # same random numbers for every candidate
+            rng = np.random.default_rng([_SETTINGS['seed'], d, r])
+            arrival_times = arrivals.day_arrivals(
+                day['interactions'] * volume_correction, _SETTINGS['work_portions'],
+                _SETTINGS['arrival_mode'], _SETTINGS['sub_hour_profile'], rng)
+            service = handle_times.sample(len(arrival_times), int(day['eht'] * 60),
+                                          _SETTINGS['handle_dist'], _SETTINGS['handle_cv'],
+                                          rng=rng)
+            # drawn after the service times, like the sim
+            rates = sm.draw_agent_rates(plan.on_shift, rng, _SETTINGS['rate_dist'],
+                                        _SETTINGS['rate_cv'])
+            result = queue_engine.evaluate(arrival_times, service, plan.on_shift, rates=rates)
+            asr.append(result['asr'])
+            handled.append(result['handled'])
+        out[d] = np.nanmean(asr), np.mean(handled)
+    return out
+
+
+def replay_sim(factors: tuple) -> np.ndarray:
+    """replay() with simulate_day(), for the simpy engine."""
+    sm.VOLUME_CORRECTION, sm.STAFFING_SCALE = factors
+    out = np.empty((len(_HISTORY), 2))
+    for d, day in enumerate(_HISTORY):
+        sm.AGENT_STARTS = day['starts']
+        sm.INTERACTIONS_MEAN = int(round(day['interactions']))
+        sm.HANDLE_TIME_MEAN = day['eht']
+        asr, handled = [], []
+        for r in range(_SETTINGS['replications']):
+            # same random numbers for every candidate
+            sm.set_seed(int(np.random.SeedSequence([_SETTINGS['seed'], d, r]).generate_state(1)[0]))
+            day_df = sm.simulate_day()
+            asr.append(float(day_df['ASR'][0]))
+            handled.append(int(day_df['Interactions Handled'][0]))
+        out[d] = np.nanmean(asr), np.mean(handled)
+    return out
+
+
+def asr_errors(history: list, simulated: np.ndarray) -> np.ndarray:
+    return simulated[:, 0] - np.array([day['asr'] for day in history])
+
+
+def rmse(errors: np.ndarray) -> float:
+    return float(np.sqrt(np.nanmean(errors ** 2)))
+
+
+def utilization(history: list, handled: np.ndarray, correction: np.ndarray,
+                clamp: np.ndarray) -> np.ndarray:
+    """
+    get_utilization() for every day, broadcast over arrays of corrections and
+        clamps (the day is the last axis).
+    """
+    starts = np.array([day['starts'] for day in history])
+    handle_seconds = np.array([int(day['eht'] * 60) for day in history])
+    possible = (60 * 60 * 8 * starts / handle_seconds).astype(int)
+    util = handled / (possible * correction[..., None])
+    return np.where(util > clamp[..., None], 1.0, util)
+
+
+def fit_utilization(history: list, handled: np.ndarray, correction_now: float,
+                    clamp_now: float) -> Optional[tuple]:
+    """
+    Grid search for the utilization correction and clamp that best match the
+        observed utilization. Of equally good pairs the one closest to the
+        current values wins, e.g. when every day is over the clamp.
+
+    Returns: (correction, clamp, rmse), or None if no day has a utilization.
+    """
+    observed = np.array([np.nan if day['utilization'] is None else day['utilization']
+                         for day in history])
+    if np.isnan(observed).all():
+        return None
+    correction, clamp = np.meshgrid(UTILIZATION_CORRECTIONS, UTILIZATION_CLAMPS, indexing='ij')
+    errors = utilization(history, handled, correction, clamp) - observed
+    scores = np.sqrt(np.nanmean(errors ** 2, axis=-1))
+    distance = np.abs(correction - correction_now) + np.abs(clamp - clamp_now)
+    tied = scores <= scores.min() + 1e-9
+    i, j = np.unravel_index(np.argmin(np.where(tied, distance, np.inf)), scores.shape)
+    return float(correction[i, j]), float(clamp[i, j]), float(scores[i, j])
+
+
+def poll_points(center: float, step: float, factor: str) -> list:
+    """One step down and one step up from center, inside the factor's BOUNDS."""
+    low, high = BOUNDS[factor]
+    points = []
+    for move in (-step, step):
+        point = round(min(max(center + move, low), high), 4)
+        if point != center and point not in points:
+            points.append(point)
+    return points
+
+
+def at_bound(value: float, grid) -> bool:
+    """Whether a fitted value is on the edge of its search range."""
+    return bool(np.isclose(value, min(grid)) or np.isclose(value, max(grid)))
+
+
+def fit(history: list, replications: int = REPLICATIONS, workers: Optional[int] = None,
+        time_budget: float = TIME_BUDGET_SECONDS, seed: int = SEED,
+        engine: Optional[str] = None, factor: str = 'staffing_scale') -> dict:
+    """
+    Fits factor (a key of BOUNDS) to the historical days, starting from the
+        sim's current value, with the other BOUNDS factor held where it is.
+        The utilization correction and clamp are fitted after it. The days
+        are replayed on engine, which defaults to the sim's ENGINE.
+
+    Returns: dict with the 'engine' the factors are fitted for, the fitted
+        'factor', the 'before' and 'after' factors, 'at_bound' (the fitted
+        factors on the edge of their search range), ASR 'rmse_before',
+        'rmse_after', the per-day 'errors' after the fit, 'utilization_rmse'
+        (None if the history has no utilization), and how many 'evaluations'
+        and 'seconds' it took.
+    """
+    if factor not in BOUNDS:
+        raise ValueError("Factor must be one of {}, not '{}'.".format(tuple(BOUNDS), factor))
+    _engine = sm.ENGINE if not engine else engine
+    if _engine not in sm.ENGINES:
+        raise ValueError("Engine must be one of {}, not '{}'.".format(sm.ENGINES, _engine))
+    started = time.perf_counter()
+    settings = {
+        'engine': _engine, 'replications': replications, 'seed': seed,
+        'agent_portions': sm.AGENT_PORTIONS,
+        'work_portions': sm.WORK_PORTIONS, 'arrival_mode': sm.ARRIVAL_MODE,
+        'sub_hour_profile': sm.SUB_HOUR_PROFILE, 'handle_dist': sm.HANDLE_TIME_DIST,
+        'handle_cv': sm.HANDLE_TIME_CV, 'rate_dist': sm.AGENT_RATE_DIST,
+        'rate_cv': sm.AGENT_RATE_CV,
+    }
+    before = current_factors()
+    _workers = os.cpu_count() if not workers else workers
+
+    def factors(value: float) -> tuple:
+        """(volume_correction, staffing_scale) with the fitted one set to value."""
+        return tuple(value if name == factor else before[name] for name in BOUNDS)
+
+    best = before[factor]
+    step = FIRST_STEP
+    evaluations = 1
+    with concurrent.futures.ProcessPoolExecutor(_workers, initializer=_init_worker,
+                                                initargs=(history, settings)) as pool:
+        best_sim = pool.submit(replay, factors(best)).result()
+        first_sim = best_sim
+        best_score = rmse(asr_errors(history, best_sim))
+        while step >= MIN_STEP and time.perf_counter() - started < time_budget:
+            candidates = poll_points(best, step, factor)
+            if not candidates:
+                break
+            simulated = list(pool.map(replay, [factors(c) for c in candidates]))
+            evaluations += len(candidates)
+            scores = [rmse(asr_errors(history, s)) for s in simulated]
+            i = int(np.argmin(scores))
+            if scores[i] < best_score - 1e-9:
+                best, best_sim, best_score = candidates[i], simulated[i], scores[i]
+            else:
+                step /= 2
+
+    after = dict(before, **{factor: best})
+    bounded = [factor] if at_bound(best, BOUNDS[factor]) else []
+    util_fit = fit_utilization(history, best_sim[:, 1], before['utilization_correction'],
+                               before['utilization_clamp'])
+    if util_fit is not None:
+        after['utilization_correction'], after['utilization_clamp'] = util_fit[:2]
+        for name, grid in (('utilization_correction', UTILIZATION_CORRECTIONS),
+                           ('utilization_clamp', UTILIZATION_CLAMPS)):
+            if at_bound(after[name], grid):
+                bounded.append(name)
+    return {
+        'engine': _engine,
+        'factor': factor,
+        'at_bound': bounded,
+        'days': len(history),
+        'before': before,
+        'after': after,
+        'rmse_before': rmse(asr_errors(history, first_sim)),
+        'rmse_after': best_score,
+        'errors': asr_errors(history, best_sim),
+        'utilization_rmse': None if util_fit is None else util_fit[2],
+        'evaluations': evaluations,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def recommended(result: dict) -> dict:
+    """The fitted factors, without the ones that ended on a search bound."""
+    return {name: value for name, value in result['after'].items()
+            if name not in result['at_bound']}
+
+
+def apply(result: dict) -> None:
+    """Sets the recommended factors on the sim."""
+    for name, value in recommended(result).items():
+        setattr(sm, name.upper(), value)
+
+
+def report(result: dict, history: list, worst: int = 5) -> str:
+    errors = result['errors']
+    lines = ['Calibrated on {} days with the {} engine ({} evaluations in {:.1f} s)'.format(
+                 result['days'], result['engine'], result['evaluations'], result['seconds']),
+             'ASR RMSE: {:.2f} -> {:.2f} minutes    MAE: {:.2f}    bias: {:+.2f}'.format(
+                 result['rmse_before'], result['rmse_after'], float(np.nanmean(np.abs(errors))),
+                 float(np.nanmean(errors)))]
+    if result['utilization_rmse'] is not None:
+        lines.append('Utilization RMSE: {:.3f}'.format(result['utilization_rmse']))
+    held = [name for name in BOUNDS if name != result['factor']]
+    lines.append('Fitted {} with {} held, the two are confounded in ASR.'.format(
+        result['factor'], ', '.join(held)))
+    lines.append('{:<24}{:>10}{:>10}'.format('factor', 'before', 'after'))
+    for name, value in result['after'].items():
+        lines.append('{:<24}{:>10.4g}{:>10.4g}'.format(name, result['before'][name], value))
+    lines.append('Worst days:')
+    lines.append('{:<12}{:>8}{:>14}{:>8}{:>12}{:>12}'.format(
+        'date', 'starts', 'interactions', 'EHT', 'observed', 'simulated'))
+    for d in np.argsort(-np.abs(np.nan_to_num(errors)))[:worst]:
+        day = history[d]
+        lines.append('{:<12}{:>8}{:>14.0f}{:>8.2f}{:>12.2f}{:>12.2f}'.format(
+            day['date'] or str(d), day['starts'], day['interactions'], day['eht'],
+            day['asr'], day['asr'] + errors[d]))
+    for name in result['at_bound']:
+        lines.append('Warning: {} ended on the edge of its search range, it is not '
+                     'recommended.'.format(name))
+    lines.append("Settings for simulate.py, with ENGINE = '{}':".format(result['engine']))
+    for name, value in recommended(result).items():
+        lines.append('{} = {:.4g}'.format(name.upper(), value))
+    return '\n'.join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', required=True, help='CSV of observed days')
+    parser.add_argument('--replications', type=int, default=REPLICATIONS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--budget', type=float, default=TIME_BUDGET_SECONDS)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--engine', choices=sm.ENGINES, default=None,
+                        help="defaults to the sim's ENGINE")
+    parser.add_argument('--factor', choices=tuple(BOUNDS), default='staffing_scale',
+                        help='the factor fitted to the ASR, the other one is held')
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    result = fit(history, args.replications, args.workers, args.budget, args.seed, args.engine,
+                 args.factor)
+    print(report(result, history))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Multi-channel days: phone calls and cases share the same agents.
+
+Each channel has its own daily volume, arrival profile over the day,
+handle time distribution and priority. The channels' arrivals are merged
+into one day and run through queue_engine.run_priority(), so a free agent
+always takes the highest priority customer waiting (lowest number), first
+come first served within a channel. ASR and service level are reported per
+channel and for the day as a whole.
+
+default_channels() splits the day's interactions into calls and cases. The
+cases are a fixed daily count from the Case Growth sheet of Forecast.xlsx
+(69,596 cases in 2022, about 190 a day), so their share is worked out from
+the interactions the day is simulated with; the rest are treated as calls.
+Set the profiles and handle times from the channel's own data when it's
+available.
+
+Usage:
+    python channels.py --starts 20
+"""
+
+import sys
+import argparse
+from typing import Optional, Union, List
+import numpy as np
+import simulate as sm
+import arrivals
+import handle_times
+import staffing
+import queue_engine
+
+
+class Channel:
+    """
+    One kind of interaction.
+
+    name - label for the report
+    share - portion of the day's interactions that come in on this channel
+    priority - 0 is served first
+    work_portions - arrival profile over the day, keyed like WORK_PORTIONS
+        (None uses WORK_PORTIONS)
+    handle_minutes - mean handle time (None uses HANDLE_TIME_MEAN)
+    handle_dist, handle_cv - handle time distribution, see handle_times.py
+    sub_hour_profile - optional sub-hour weights, see arrivals.py
+    """
+
+    def __init__(self, name: str, share: float, priority: int = 0,
+                 work_portions: Optional[dict] = None, handle_minutes: Optional[float] = None,
+                 handle_dist: str = 'fixed', handle_cv: float = .5,
+                 sub_hour_profile: Union[None, list, dict] = None):
+        self.name = name
+        self.share = share
+        self.priority = priority
+        self.work_portions = work_portions
+        self.handle_minutes = handle_minutes
+        self.handle_dist = handle_dist
+        self.handle_cv = handle_cv
+        self.sub_hour_profile = sub_hour_profile
+
+
+CASES_PER_DAY = 69596 / 365
+
+
+def default_channels(interactions: Optional[float] = None) -> List[Channel]:
+    """
+    Calls and cases for a day of interactions (defaults to INTERACTIONS_MEAN),
+        CASES_PER_DAY of them are cases, or all of them on a smaller day.
+    """
+    _interactions = sm.INTERACTIONS_MEAN if not interactions else interactions
+    case_share = min(CASES_PER_DAY / _interactions, 1.0)
+    return [
+        Channel('calls', 1 - case_share, priority=0, handle_dist='lognormal'),
+        Channel('cases', case_share, priority=1, handle_dist='gamma'),
+    ]
+
+
+def sample_day(channels: List[Channel], interactions: float,
+               rng: Optional[np.random.Generator] = None) -> tuple:
+    """
+    Draws every channel's arrivals and handle times and merges them into one
+        day, sorted by arrival time.
+
+    Returns: (arrival_times, service_times, priorities, channel index) arrays
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    parts = []
+    for c, channel in enumerate(channels):
+        portions = sm.WORK_PORTIONS if channel.work_portions is None else channel.work_portions
+        minutes = sm.HANDLE_TIME_MEAN if channel.handle_minutes is None else channel.handle_minutes
+        arrival_times = arrivals.day_arrivals(interactions * channel.share, portions,
+                                              sm.ARRIVAL_MODE, channel.sub_hour_profile, rng)
+        service = handle_times.sample(len(arrival_times), minutes * 60, channel.handle_dist,
+                                      channel.handle_cv, rng=rng)
+        parts.append((arrival_times, service, np.full(len(arrival_times), channel.priority),
+                      np.full(len(arrival_times), c)))
+    merged = [np.concatenate(arrays) for arrays in zip(*parts)]
+    order = np.argsort(merged[0], kind='stable')
+    return tuple(array[order] for array in merged)
+
+
+def evaluate(channels: List[Channel], on_shift, interactions: float,
+             rng: Optional[np.random.Generator] = None,
+             service_level_seconds: float = 60 * 60) -> dict:
+    """
+    Simulates one day of the channels with the given agents working per hour.
+
+    Returns: dict of metrics (see queue_engine.summarize()) keyed by channel
+        name, plus 'all' for the whole day.
+    """
+    arrival_times, service, priorities, channel_index = sample_day(channels, interactions, rng)
+    starts, ends = queue_engine.run_priority(arrival_times, service, priorities, on_shift)
+    results = {}
+    for c, channel in enumerate(channels):
+        mask = channel_index == c
+        results[channel.name] = queue_engine.summarize(
+            arrival_times[mask], starts[mask], ends[mask],
+            service_level_seconds=service_level_seconds)
+    results['all'] = queue_engine.summarize(arrival_times, starts, ends,
+                                            service_level_seconds=service_level_seconds)
+    return results
+
+
+def report(results: dict) -> str:
+    lines = ['{:<8}{:>14}{:>10}{:>12}{:>10}{:>10}'.format(
+        'channel', 'interactions', 'handled', 'ASR (min)', 'SL', 'backlog')]
+    for name, r in results.items():
+        lines.append('{:<8}{:>14}{:>10}{:>12.2f}{:>10.1%}{:>10}'.format(
+            name, r['interactions'], r['handled'], r['asr'], r['service_level'], r['backlog']))
+    return '\n'.join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--starts', type=int, default=None)
+    parser.add_argument('--interactions', type=float, default=None)
+    parser.add_argument('--sl-minutes', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    _starts = sm.AGENT_STARTS if not args.starts else args.starts
+    _interactions = sm.INTERACTIONS_MEAN if not args.interactions else args.interactions
+    plan = staffing.compile_staffing(_starts, sm.scaled_portions(sm.AGENT_PORTIONS))
+    results = evaluate(default_channels(_interactions), plan.on_shift, _interactions,
+                       np.random.default_rng(args.seed), args.sl_minutes * 60)
+    print(report(results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
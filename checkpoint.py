@@ -0,0 +1,163 @@
+"""
+Durable checkpoints for long spectrum sweeps.
+
+A sweep is identified by a sweep ID. Unless one is given, the ID is derived
+from the sweep's parameters, so re-running the same sweep after a crash (GUI
+closed, laptop went to sleep) picks up the checkpoint automatically.
+
+The checkpoint is a small file in CHECKPOINT_DIR that lists the grid points
+which have already been simulated: a JSON header line with the sweep's
+parameters, then one JSON line per finished point. The header is written to
+a temporary file, fsync'd and then swapped in with os.replace(), and every
+finished point is appended and fsync'd, so saving a scenario costs the same
+however far the sweep has got. A crash can only leave the last line half
+written, and a line that does not parse is ignored when loading.
+When the sweep finishes the checkpoint is removed, so running the same sweep
+again later starts from scratch.
+"""
+
+import os
+import json
+import hashlib
+import datetime
+from typing import Optional
+
+
+# folder that holds the <sweep id>.json checkpoint files
+CHECKPOINT_DIR = 'checkpoints'
+
+
+def make_sweep_id(params: dict) -> str:
+    """
+    Builds a deterministic sweep ID from the sweep parameters.
+
+    Returns: str, 12 hex characters.
+    """
+    blob = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:12]
+
+
+class SweepCheckpoint:
+    """
+    Tracks which grid points of a sweep are complete, and persists them.
+
+    Grid points are tuples of plain numbers, e.g.
+        (handle seconds, interactions, agent starts, repetition)
+    """
+
+    def __init__(self, sweep_id: str, params: Optional[dict] = None,
+                 resume: bool = True, directory: Optional[str] = None):
+        self.sweep_id = sweep_id
+        self.params = params if params else {}
+        self.directory = directory if directory else CHECKPOINT_DIR
+        self.path = os.path.join(self.directory, '{}.json'.format(sweep_id))
+        self.completed = set()
+        self.created = datetime.datetime.now().isoformat(timespec='seconds')
+
+        if resume:
+            self.load()
+        else:
+            self.clear()
+
+    def load(self) -> None:
+        """
+        Reads the completed points from disk, if a checkpoint exists.
+
+        Raises: ValueError if the checkpoint was made with other parameters,
+            e.g. an explicit sweep ID reused for another sweep, so scenarios
+            run under different settings are never mixed.
+        """
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                header = json.loads(f.readline())
+                lines = f.readlines()
+        except (OSError, ValueError):
+            print("Warning: could not read checkpoint", self.path,
+                  "- the sweep will start over.")
+            return
+        stored = header.get('params')
+        if self.params and stored is not None and stored != _as_json(self.params):
+            changed = sorted(k for k in set(stored) | set(self.params)
+                             if stored.get(k) != _as_json(self.params).get(k))
+            raise ValueError(
+                "Checkpoint {} was made with other parameters ({}). Resume with the same "
+                "settings, or start the sweep over with resume off.".format(
+                    self.path, ', '.join(changed)))
+        self.created = header.get('created', self.created)
+        # checkpoints from before the journal kept every point in the header
+        self.completed = set(tuple(point) for point in header.get('completed', []))
+        for line in lines:
+            try:
+                self.completed.add(tuple(json.loads(line)))
+            except ValueError:
+                # the last point was being written when the sweep stopped
+                continue
+        if lines and not lines[-1].endswith('\n'):
+            # start the next append on a fresh line
+            self.save()
+
+    def is_done(self, point: tuple) -> bool:
+        return tuple(point) in self.completed
+
+    def mark_done(self, point: tuple) -> None:
+        """Records a finished grid point and appends it to the checkpoint."""
+        point = tuple(point)
+        if point in self.completed:
+            return
+        if not os.path.exists(self.path):
+            self.save()
+        self.completed.add(point)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(point, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def save(self) -> None:
+        """Atomically rewrites the whole checkpoint, header and points, to disk."""
+        os.makedirs(self.directory, exist_ok=True)
+        header = {
+            'sweep_id': self.sweep_id,
+            'params': self.params,
+            'created': self.created,
+            'updated': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(header, default=str) + '\n')
+            for point in sorted(self.completed):
+                f.write(json.dumps(point, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        _fsync_dir(self.directory)
+
+    def clear(self) -> None:
+        """Deletes the checkpoint, e.g. once the sweep has completed."""
+        self.completed = set()
+        for path in (self.path, self.path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __len__(self) -> int:
+        return len(self.completed)
+
+
+def _as_json(params: dict) -> dict:
+    """The parameters as they read back from the checkpoint file."""
+    return json.loads(json.dumps(params, default=str))
+
+
+def _fsync_dir(directory: str) -> None:
+    """Makes the rename durable. Not supported on Windows, where it is skipped."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -1,5 +1,4 @@
 import pandas as pd
-import snowflake.connector as sc
 import os
 
 """ This tool connects to snowflake and can be used to query and store results in a dataframe. Pandas can then be used to create needed views/manipulations. 
@@ -17,6 +16,10 @@ LIMIT 20
 def snowflake_connection():
     """Connects to Snowflake
         returns: Snowflake connection object"""
+    # imported here so that loading this module doesn't pull in the whole 
+    #   Snowflake stack until a query is actually run
+    import snowflake.connector as sc
+
     myAcc = os.getlogin() + "@PACCAR.com"
     snowflake_conn = sc.connect(account='paccar',
                                 user=myAcc,
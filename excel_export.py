@@ -0,0 +1,227 @@
+"""
+Exports sweep results straight into an .xlsx workbook.
+
+log.csv keeps every run as a row of label and value pairs
+(' AgntStrts: ,17, EstInteractns: ,800, ...', see simulate.day_to_df()), so
+getting a sweep into the team's workbooks meant pasting the log into a
+sheet and cleaning the labels out by hand. This writes, in one pass:
+
+    Results               one typed row per run, with a header, ready for a
+                          pivot table: whole numbers as numbers, the
+                          timestamp as a date
+    <eht>min EHT          per handle time, the mean ASR of every agent starts
+                          (rows) x interactions (columns) cell, in the
+                          layout of the sheets in
+                          VSC Operational Envelope Vis.xlsx
+
+The source can be a log.csv style file or a CSV with a header that has the
+same column names as the log (e.g. the output of shard.py merge).
+
+The workbook is written with openpyxl's write-only mode, which streams rows
+to disk as they are appended instead of building every cell in memory, and
+the source is read a line at a time. openpyxl serializes the sheets with
+lxml when it is installed, which is most of the export's time without it.
+Memory is bounded by the ASR matrices, which have one entry per grid cell
+however many runs there are. With distributions on, handle times and
+interactions vary from run to run, so the matrices snap them to the sweep's
+steps (EHT_STEP and INTERACTIONS_STEP, the full_spectrum() defaults).
+
+Usage:
+    python excel_export.py log.csv --output envelope.xlsx
+    python excel_export.py logs/my_spectrum_log.csv --eht-step .25 --interactions-step 25
+"""
+
+import os
+import sys
+import csv
+import time
+import argparse
+import datetime
+from typing import Iterator
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+
+# the value columns of simulate.day_to_df(), in log order
+LOG_COLUMNS = ('Agent Starts', 'Interactions Today', 'Interactions Handled', 'Handle Time',
+               'ASR', 'Utilization', 'Timestamp')
+LOG_FIRST_LABEL = 'AgntStrts:'
+TIMESTAMP_FORMAT = '%m/%d/%Y %H:%M:%S'
+RESULTS_SHEET = 'Results'
+EHT_STEP = .5
+INTERACTIONS_STEP = 50
+COLUMN_WIDTH = 18
+
+
+def parse_value(text: str):
+    """A log value as int, float, datetime, or the stripped text."""
+    text = text.strip()
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    try:
+        return datetime.datetime.strptime(text, TIMESTAMP_FORMAT)
+    except ValueError:
+        return text
+
+
+def parse_timestamp(text: str) -> datetime.datetime:
+    """A log timestamp, '12/20/2023 15:17:15'. Splitting is faster than strptime()."""
+    day, clock = text.split()
+    month, day, year = day.split('/')
+    hour, minute, second = clock.split(':')
+    return datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+
+
+LOG_TYPES = (int, int, int, float, float, float, parse_timestamp)
+
+
+def read_log(f) -> Iterator[list]:
+    """Values of every log.csv line, the labels are at the even indices."""
+    for line in f:
+        values = line.rstrip('\n').split(',')[1::2]
+        if len(values) != len(LOG_TYPES):
+            continue
+        try:
+            yield [kind(x.strip()) for kind, x in zip(LOG_TYPES, values)]
+        except ValueError:
+            # a line from another version of the log, typed value by value
+            yield [parse_value(x) for x in values]
+
+
+def read_rows(path: str) -> tuple:
+    """
+    Opens a log.csv style file, or a CSV with a header.
+
+    Returns: (column names, iterator of typed rows), read lazily.
+    """
+    f = open(path, newline='')
+    first = f.readline()
+    f.seek(0)
+
+    def rows(reader) -> Iterator[list]:
+        with f:
+            yield from reader
+
+    if first.lstrip().startswith(LOG_FIRST_LABEL):
+        return list(LOG_COLUMNS), rows(read_log(f))
+    reader = csv.reader(f)
+    columns = next(reader)
+    return columns, rows([parse_value(x) for x in row] for row in reader)
+
+
+def snap(value: float, step: float) -> float:
+    """Nearest multiple of step, or the value to 2 places when step is 0."""
+    if not step:
+        return round(value, 2)
+    return round(round(value / step) * step, 4)
+
+
+class AsrMatrix:
+    """Running mean ASR per (eht, starts, interactions) cell."""
+
+    def __init__(self, eht_step: float = EHT_STEP, interactions_step: int = INTERACTIONS_STEP):
+        self.eht_step = eht_step
+        self.interactions_step = interactions_step
+        # (eht, starts, interactions) -> [ASR total, count]
+        self.cells = {}
+
+    def add(self, eht: float, interactions: float, starts: int, asr: float) -> None:
+        key = (snap(eht, self.eht_step), int(starts), int(snap(interactions, self.interactions_step)))
+        total = self.cells.setdefault(key, [0.0, 0])
+        total[0] += asr
+        total[1] += 1
+
+    def sheets(self) -> Iterator[tuple]:
+        """(eht, interactions, starts, rows of mean ASR) for every handle time."""
+        for eht in sorted({key[0] for key in self.cells}):
+            keys = [key for key in self.cells if key[0] == eht]
+            interactions = sorted({key[2] for key in keys})
+            starts = sorted({key[1] for key in keys})
+            rows = []
+            for k in starts:
+                row = []
+                for j in interactions:
+                    total = self.cells.get((eht, k, j))
+                    row.append(round(total[0] / total[1], 2) if total else None)
+                rows.append(row)
+            yield eht, interactions, starts, rows
+
+
+def write_matrix(wb: Workbook, eht: float, interactions: list, starts: list, rows: list) -> None:
+    ws = wb.create_sheet('{:g}min EHT'.format(eht))
+    ws.column_dimensions['A'].width = COLUMN_WIDTH
+    ws.append([])
+    ws.append([None, 'Interactions count:'] + interactions)
+    ws.append(['EHT Minutes:', eht])
+    ws.append(['Count of agents that worked a full shift:'])
+    for k, row in zip(starts, rows):
+        ws.append([k, None] + row)
+
+
+def export(source: str, output: str, eht_step: float = EHT_STEP,
+           interactions_step: int = INTERACTIONS_STEP) -> int:
+    """
+    Writes the results and ASR matrix sheets of a log to an .xlsx file.
+
+    Returns: int, the number of runs exported.
+    """
+    columns, rows = read_rows(source)
+    missing = [c for c in ('Agent Starts', 'Interactions Today', 'Handle Time', 'ASR')
+               if c not in columns]
+    if missing:
+        raise ValueError("{} has no {} column.".format(source, ', '.join(missing)))
+    starts_at, interactions_at, eht_at, asr_at = (columns.index(c) for c in (
+        'Agent Starts', 'Interactions Today', 'Handle Time', 'ASR'))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(RESULTS_SHEET)
+    for n in range(1, len(columns) + 1):
+        ws.column_dimensions[get_column_letter(n)].width = COLUMN_WIDTH
+    ws.freeze_panes = 'A2'
+    ws.append(columns)
+
+    matrix = AsrMatrix(eht_step, interactions_step)
+    count = 0
+    for row in rows:
+        if len(row) != len(columns):
+            continue
+        ws.append(row)
+        try:
+            matrix.add(float(row[eht_at]), float(row[interactions_at]), int(row[starts_at]),
+                       float(row[asr_at]))
+        except (TypeError, ValueError):
+            pass
+        count += 1
+
+    for eht, interactions, starts, asr_rows in matrix.sheets():
+        write_matrix(wb, eht, interactions, starts, asr_rows)
+    # the target is only replaced once the workbook is complete, like checkpoint.py
+    tmp_path = output + '.tmp'
+    wb.save(tmp_path)
+    os.replace(tmp_path, output)
+    return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', nargs='?', default='log.csv')
+    parser.add_argument('--output', default=None, help='defaults to the source name with .xlsx')
+    parser.add_argument('--eht-step', type=float, default=EHT_STEP,
+                        help='minutes, 0 keeps every handle time')
+    parser.add_argument('--interactions-step', type=int, default=INTERACTIONS_STEP,
+                        help='0 keeps every interaction count')
+    args = parser.parse_args()
+
+    output = args.output if args.output else os.path.splitext(args.source)[0] + '.xlsx'
+    started = time.perf_counter()
+    count = export(args.source, output, args.eht_step, args.interactions_step)
+    print('{} runs exported to {} in {:.1f} s'.format(count, output, time.perf_counter() - started))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
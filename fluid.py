@@ -0,0 +1,250 @@
+"""
+Fluid approximation of the day, for a whole spectrum grid at once.
+
+With ENABLE_DISTRIBUTIONS off, a day's ASR mostly comes from the backlog that
+builds up in the hours where the arrivals from WORK_PORTIONS are more than
+the agents from AGENT_PORTIONS can handle. This treats the customers as a
+fluid instead of simulating them one by one: in every STEP_MINUTES step the
+queue takes in the step's share of the hour's arrivals and the agents on
+shift drain it at one customer per handle time each,
+
+    backlog' = backlog + arrivals - min(backlog + arrivals, capacity)
+
+Each customer's wait is the horizontal distance between the cumulative
+arrival and departure curves, so the waits of everyone finished by midnight
+add up to the area between min(arrived, finished by midnight) and departed.
+ASR is that over the number handled, plus the handle time. Utilization uses
+the sim's formula (see simulate.get_utilization()).
+
+The recursion runs with numpy arrays shaped (eht, interactions, starts),
+so the whole full_spectrum() grid is evaluated in one pass of
+24 * 60 / STEP_MINUTES steps, in milliseconds. It ignores the lumpiness of
+single customers and agents, so check it against the sim before trusting it
+near capacity: calibration_report() compares it with simpy runs on a sample
+of the grid, or with a full_spectrum() log. The GUI's spectrum run draws it
+on the heatmap before the sweep starts (see heatmap.Heatmap.preview()), and
+the simulated scenarios replace it as they finish.
+
+Usage:
+    python fluid.py --starts-min 20 --starts-max 30 --calibrate 40
+    python fluid.py --log logs/my_spectrum_log.csv
+"""
+
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+from typing import Optional
+import numpy as np
+import simulate as sm
+import arrivals
+import staffing
+
+
+STEP_MINUTES = 5
+CALIBRATION_POINTS = 40
+SEED = 42
+
+
+def grid_axes(handle_minutes_min: float = 8.5, handle_minutes_max: float = 12,
+              step_minutes: float = .5, interactions_min: int = 800,
+              interactions_max: int = 1400, interactions_step: int = 50,
+              agent_starts_min: int = 20, agent_starts_max: int = 30) -> tuple:
+    """The full_spectrum() grid, with the same defaults. Returns: (ehts, interactions, starts)"""
+    ehts = np.array([s / 60 for s in range(int(handle_minutes_min * 60),
+                                           int(handle_minutes_max * 60) + 1,
+                                           int(step_minutes * 60))])
+    interactions = np.arange(interactions_min, interactions_max + 1, interactions_step)
+    starts = np.arange(agent_starts_min, agent_starts_max + 1)
+    return ehts, interactions, starts
+
+
+def on_shift_matrix(starts: np.ndarray, agent_portions: Optional[dict] = None) -> np.ndarray:
+    """Agents working each hour for each number of starts, (starts, 24)."""
+    _portions = sm.scaled_portions(sm.AGENT_PORTIONS if agent_portions is None else agent_portions)
+    # an hour with nobody scheduled still has one agent, like the sim
+    return np.array([np.maximum(staffing.compile_staffing(int(k), _portions).on_shift, 1)
+                     for k in starts])
+
+
+def evaluate_grid(ehts, interactions, starts, work_portions: Optional[dict] = None,
+                  agent_portions: Optional[dict] = None,
+                  step_minutes: float = STEP_MINUTES) -> dict:
+    """
+    Fluid ASR and utilization for every combination of the three axes.
+        Portions default to the sim's WORK_PORTIONS and AGENT_PORTIONS.
+
+    Returns: dict of (eht, interactions, starts) arrays: 'asr' (minutes),
+        'utilization', 'handled', and the 'backlog' left at midnight.
+    """
+    ehts = np.asarray(ehts, dtype=float)
+    interactions = np.asarray(interactions, dtype=float)
+    starts = np.asarray(starts)
+    portions = arrivals.portions_array(sm.WORK_PORTIONS if work_portions is None else work_portions)
+    on_shift = on_shift_matrix(starts, agent_portions)
+
+    steps = int(round(60 / step_minutes))
+    dt = 60 * 60 / steps
+    handle_seconds = (ehts * 60).astype(int).astype(float)
+    # per step: arrivals (1, I, 1, hour), capacity (E, 1, S, hour)
+    arriving = (interactions * sm.VOLUME_CORRECTION)[None, :, None, None] * portions / steps
+    capacity = on_shift[None, :, :] * dt / handle_seconds[:, None, None, None]
+    shape = (len(ehts), len(interactions), len(starts))
+
+    def run(finished_by_midnight: Optional[np.ndarray] = None) -> tuple:
+        backlog = np.zeros(shape)
+        arrived = np.zeros(shape)
+        departed = np.zeros(shape)
+        area = np.zeros(shape)
+        for h in range(24):
+            a = arriving[..., h]
+            c = capacity[..., h]
+            for step in range(steps):
+                served = np.minimum(backlog + a, c)
+                if finished_by_midnight is not None:
+                    # customers in the system who will be done by midnight,
+                    #   trapezoid over the step
+                    before = np.minimum(arrived, finished_by_midnight) - departed
+                    after = np.minimum(arrived + a, finished_by_midnight) - (departed + served)
+                    area += (before + after) / 2 * dt
+                backlog += a - served
+                arrived += a
+                departed += served
+        return departed, backlog, area
+
+    # the first pass finds how many are done by midnight, the second the wait area
+    handled, backlog, _ = run()
+    area = run(handled)[2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        wait = np.where(handled > 0, area / handled, 0.0)
+    asr = (wait + handle_seconds[:, None, None]) / 60
+
+    possible = (60 * 60 * 8 * starts[None, None, :] / handle_seconds[:, None, None]).astype(int)
+    util = handled / (possible * sm.UTILIZATION_CORRECTION)
+    util = np.where(util > sm.UTILIZATION_CLAMP, 1.0, util)
+    return {'asr': asr, 'utilization': util, 'handled': handled, 'backlog': backlog}
+
+
+"""
+---- Calibration against the sim
+"""
+
+
+def _init_worker() -> None:
+    sm.CONSOLE_LOGGING_LEVEL = 'minimal'
+
+
+def simulate_point(point: tuple) -> float:
+    """Simulated ASR of one (eht, interactions, starts) with distributions off."""
+    eht, interactions, starts = point
+    sm.ENGINE = 'simpy'
+    sm.ENABLE_DISTRIBUTIONS = False
+    sm.HANDLE_TIME_MEAN = eht
+    sm.INTERACTIONS_MEAN = int(interactions)
+    sm.AGENT_STARTS = int(starts)
+    sm.set_seed(SEED)
+    return float(sm.simulate_day()['ASR'][0])
+
+
+def sample_points(ehts, interactions, starts, count: int, seed: int = SEED) -> list:
+    rng = np.random.default_rng(seed)
+    grid = [(float(e), int(j), int(k)) for e in ehts for j in interactions for k in starts]
+    picks = rng.choice(len(grid), size=min(count, len(grid)), replace=False)
+    return [grid[p] for p in sorted(picks)]
+
+
+def reference_from_log(path: str) -> tuple:
+    """
+    (eht, interactions, starts) points and their ASR from a log.csv style file,
+        repeated points are averaged.
+    """
+    totals = {}
+    with open(path) as f:
+        for line in f:
+            fields = [x.strip() for x in line.split(',')]
+            try:
+                starts, interactions, eht, asr = (int(fields[1]), int(float(fields[3])),
+                                                  float(fields[7]), float(fields[9]))
+            except (IndexError, ValueError):
+                continue
+            total = totals.setdefault((eht, interactions, starts), [0.0, 0])
+            total[0] += asr
+            total[1] += 1
+    points = list(totals)
+    return points, np.array([totals[p][0] / totals[p][1] for p in points])
+
+
+def fluid_at(points: list) -> np.ndarray:
+    """Fluid ASR at scattered points, one vectorized grid over their unique values."""
+    ehts = sorted({p[0] for p in points})
+    interactions = sorted({p[1] for p in points})
+    starts = sorted({p[2] for p in points})
+    asr = evaluate_grid(ehts, interactions, starts)['asr']
+    return np.array([asr[ehts.index(e), interactions.index(j), starts.index(k)]
+                     for e, j, k in points])
+
+
+def calibration_report(points: list, simulated: np.ndarray, fluid: np.ndarray,
+                       worst: int = 5) -> str:
+    errors = fluid - simulated
+    lines = ['Fluid vs simulated ASR on {} points (minutes):'.format(len(points)),
+             'MAE {:.2f}    RMSE {:.2f}    bias {:+.2f}    max {:.2f}'.format(
+                 float(np.mean(np.abs(errors))), float(np.sqrt(np.mean(errors ** 2))),
+                 float(np.mean(errors)), float(np.max(np.abs(errors))))]
+    for label, mask in (('ASR under 30 in the sim', simulated < 30),
+                        ('ASR 30 and over', simulated >= 30)):
+        if mask.any():
+            lines.append('  {:<26} {:>4} points  MAE {:.2f}  bias {:+.2f}'.format(
+                label, int(mask.sum()), float(np.mean(np.abs(errors[mask]))),
+                float(np.mean(errors[mask]))))
+    lines.append('{:>8}{:>14}{:>8}{:>12}{:>8}'.format('EHT', 'interactions', 'starts',
+                                                     'simulated', 'fluid'))
+    for i in np.argsort(-np.abs(errors))[:worst]:
+        e, j, k = points[i]
+        lines.append('{:>8.2f}{:>14}{:>8}{:>12.2f}{:>8.2f}'.format(e, j, k, simulated[i], fluid[i]))
+    return '\n'.join(lines)
+
+
+def calibrate(points: list, workers: Optional[int] = None) -> str:
+    """Simulates the points with simpy in parallel and compares the fluid ASR."""
+    _workers = os.cpu_count() if not workers else workers
+    with concurrent.futures.ProcessPoolExecutor(_workers, initializer=_init_worker) as pool:
+        simulated = np.array(list(pool.map(simulate_point, points)))
+    return calibration_report(points, simulated, fluid_at(points))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--eht-min', type=float, default=8.5)
+    parser.add_argument('--eht-max', type=float, default=12)
+    parser.add_argument('--interactions-min', type=int, default=800)
+    parser.add_argument('--interactions-max', type=int, default=1400)
+    parser.add_argument('--starts-min', type=int, default=20)
+    parser.add_argument('--starts-max', type=int, default=30)
+    parser.add_argument('--calibrate', type=int, nargs='?', const=CALIBRATION_POINTS, default=0,
+                        metavar='POINTS', help='simulate this many grid points with simpy to compare')
+    parser.add_argument('--log', default=None, help='compare with a spectrum log instead')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    ehts, interactions, starts = grid_axes(args.eht_min, args.eht_max,
+                                           interactions_min=args.interactions_min,
+                                           interactions_max=args.interactions_max,
+                                           agent_starts_min=args.starts_min,
+                                           agent_starts_max=args.starts_max)
+    started = time.perf_counter()
+    result = evaluate_grid(ehts, interactions, starts)
+    print('Fluid ASR for {} scenarios in {:.1f} ms'.format(
+        result['asr'].size, (time.perf_counter() - started) * 1000))
+    if args.log:
+        points, simulated = reference_from_log(args.log)
+        print(calibration_report(points, simulated, fluid_at(points)))
+    elif args.calibrate:
+        print(calibrate(sample_points(ehts, interactions, starts, args.calibrate), args.workers))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,11 @@
 """This retrieves all of the data and does the ML regression for the forecast functionality
 in the GUI."""
 
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split 
-from sklearn.linear_model import LinearRegression
-from sklearn import metrics
 import vsc_data as vd
+# scikit-learn and matplotlib take seconds to import and only forecast mode
+#   uses them, so they are imported in the functions that need them.
 
 DAYS = 90
 
@@ -19,6 +17,9 @@ def get_data():
     return df
 
 def train_model(df):
+    from sklearn.model_selection import train_test_split
+    from sklearn.linear_model import LinearRegression
+
     X = df['date_delta'].values.reshape(-1,1)
     y = df['DAILYINTERACTIONCOUNT'].values.reshape(-1,1)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=0)
@@ -32,6 +33,8 @@ def train_model(df):
     return regressor, X_test, y_test
 
 def predict_model(regressor, X_test, y_test):
+    from sklearn import metrics
+
     y_pred = regressor.predict(X_test)
     
     # Compare the actual versus predicted values
@@ -57,6 +60,8 @@ def future_forecast(regressor, df):
     return future_df
 
 def plot_data(X, y, regressor, future_df):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(10,5))
     plt.scatter(X, y, color='gray', label='Past Actual')
     plt.plot(X, regressor.predict(X), color='blue', linewidth=2, label='Past Predicted')
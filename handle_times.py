@@ -0,0 +1,83 @@
+"""
+Per-interaction handle times, sampled in bulk for a whole day.
+
+A real mix of cases and calls has a skewed handle time distribution, and the
+variability is what drives queueing delay. The day's mean handle time still
+comes from HANDLE_TIME (EHT), the distribution only sets the spread around it.
+
+Distributions:
+    'fixed'     - every interaction takes exactly the mean (the original model)
+    'lognormal' - lognormal with the given coefficient of variation
+    'gamma'     - gamma with the given coefficient of variation
+    'empirical' - resampled from the agent EHTs in the "VSC statistics" EHT
+                  export, rescaled to the day's mean
+"""
+
+import functools
+from typing import Optional
+import numpy as np
+
+
+DISTRIBUTIONS = ('fixed', 'lognormal', 'gamma', 'empirical')
+# Salesforce report export with the interactions per agent per day
+EHT_EXPORT = 'VSC statistics/EHT Interaction Vols (Day agents only)-2023-09-18-08-49-16.xlsx'
+# agent-days with fewer interactions than this are partial shifts, and left out
+MIN_DAILY_INTERACTIONS = 10
+SHIFT_SECONDS = 8 * 60 * 60
+
+
+@functools.lru_cache(maxsize=4)
+def load_empirical(path: str = EHT_EXPORT) -> np.ndarray:
+    """
+    Reads the EHT export and returns one effective handle time per agent-day,
+        in seconds (8 hour shift / interactions that day).
+    """
+    import pandas as pd
+
+    sheet = pd.read_excel(path, header=None)
+    # the row that labels the columns, e.g. 'avg int per agent', 'Record Count'
+    label_row = next(i for i in range(len(sheet))
+                     if (sheet.iloc[i] == 'Record Count').any())
+    agent_row = sheet.iloc[label_row - 1].ffill()
+    columns = [c for c in sheet.columns
+               if sheet.iloc[label_row, c] == 'Record Count' and agent_row[c] != 'Total']
+
+    body = sheet.iloc[label_row + 1:]
+    # keep the per-day rows, the totals and footer rows have no date
+    dates = pd.to_datetime(body.iloc[:, 1], errors='coerce', format='%m/%d/%Y %I:%M %p')
+    counts = body.loc[dates.notna(), columns].apply(pd.to_numeric, errors='coerce').values.ravel()
+    counts = counts[~np.isnan(counts)]
+    counts = counts[counts >= MIN_DAILY_INTERACTIONS]
+    if len(counts) == 0:
+        raise ValueError("No agent-days found in the EHT export {}.".format(path))
+    return SHIFT_SECONDS / counts
+
+
+def sample(n: int, mean_seconds: float, dist: str = 'fixed', cv: float = 0.5,
+           empirical: Optional[np.ndarray] = None,
+           rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Draws n handle times with the given mean.
+
+    cv: coefficient of variation (stdev / mean) for 'lognormal' and 'gamma'.
+    empirical: samples for 'empirical', defaults to load_empirical().
+
+    Returns: float array of seconds.
+    """
+    if dist not in DISTRIBUTIONS:
+        raise ValueError("Handle time distribution must be one of {}, not '{}'.".format(
+            DISTRIBUTIONS, dist))
+    if dist == 'fixed' or n == 0:
+        return np.full(n, float(mean_seconds))
+
+    rng = np.random.default_rng() if rng is None else rng
+    if dist == 'lognormal':
+        sigma2 = np.log(1 + cv ** 2)
+        mu = np.log(mean_seconds) - sigma2 / 2
+        return rng.lognormal(mu, np.sqrt(sigma2), n)
+    if dist == 'gamma':
+        shape = 1 / cv ** 2
+        return rng.gamma(shape, mean_seconds / shape, n)
+
+    samples = load_empirical() if empirical is None else np.asarray(empirical, dtype=float)
+    return rng.choice(samples, n) * (mean_seconds / samples.mean())
@@ -0,0 +1,155 @@
+"""
+Progressive ASR heatmap for spectrum runs in the GUI.
+
+Draws a starts x interactions grid on a PySimpleGUI Graph and colors each
+cell by its ASR as the sweep's scenarios finish (see the on_result callback
+of simulate.full_spectrum()). A cell's color runs from green at 0 through
+yellow at the ASR goal to red at ASR_RED_FACTOR times the goal.
+
+Every cell is one rectangle, drawn once. A finished scenario only marks its
+cell dirty, and draw() recolors the dirty cells at most FPS times a second,
+so each frame costs the cells that changed since the last one, not the size
+of the sweep. A full spectrum sweeps handle times too, the grid shows the
+handle time the sweep is on and is recolored when it moves to the next one.
+Repetitions of a scenario are averaged.
+
+preview() fills the grid with estimates before the sweep starts, e.g. the
+fluid approximation's ASR (see fluid.py), which takes milliseconds for the
+whole grid. A cell shows its estimate until the sweep simulates it.
+"""
+
+import time
+
+
+FPS = 10
+ASR_GOAL = 30
+ASR_RED_FACTOR = 3
+BACKGROUND = '#1c2b3a'
+TEXT_COLOR = '#FFDEAD'
+GREEN, YELLOW, RED = (46, 125, 50), (253, 216, 53), (198, 40, 40)
+
+
+def asr_color(asr: float, goal: float = ASR_GOAL) -> str:
+    """Hex color for an ASR, green to yellow up to the goal, yellow to red after."""
+    if asr != asr:
+        return BACKGROUND
+    if asr <= goal:
+        low, high, t = GREEN, YELLOW, asr / goal
+    else:
+        low, high, t = YELLOW, RED, min((asr - goal) / (goal * (ASR_RED_FACTOR - 1)), 1.0)
+    return '#{:02x}{:02x}{:02x}'.format(*(int(a + (b - a) * t) for a, b in zip(low, high)))
+
+
+class Heatmap:
+    """
+    ASR heatmap on a PySimpleGUI Graph.
+
+    graph - the sg.Graph element, any size, its coordinates are set here
+    starts, interactions - the sweep's agent starts (x) and interactions (y)
+    """
+
+    def __init__(self, graph, starts: list, interactions: list, asr_goal: float = ASR_GOAL,
+                 fps: float = FPS):
+        self.graph = graph
+        self.asr_goal = asr_goal
+        self.frame_seconds = 1 / fps
+        self.last_draw = 0.0
+        self.reset(starts, interactions)
+
+    def reset(self, starts: list, interactions: list) -> None:
+        """Clears the graph and lays out an empty grid with its axis labels."""
+        self.starts = list(starts)
+        self.interactions = list(interactions)
+        self.column = {k: c for c, k in enumerate(self.starts)}
+        self.row = {j: r for r, j in enumerate(self.interactions)}
+        # (eht, interactions, starts) -> [ASR total, count]
+        self.values = {}
+        # (eht, interactions, starts) -> ASR, shown until the cell is simulated
+        self.estimates = {}
+        self.dirty = set()
+        self.eht = None
+        self.scenarios = 0
+
+        self.graph.erase()
+        self.graph.change_coordinates((-2.2, -1.2), (len(self.starts) + .2, len(self.interactions) + 1))
+        self.cells = {}
+        for j, r in self.row.items():
+            for k, c in self.column.items():
+                self.cells[(j, k)] = self.graph.draw_rectangle(
+                    (c, r + 1), (c + 1, r), fill_color=BACKGROUND, line_color='#2f4f6f')
+        for k, c in self.column.items():
+            self.graph.draw_text(str(k), (c + .5, -.5), color=TEXT_COLOR)
+        for j, r in self.row.items():
+            self.graph.draw_text(str(j), (-1.1, r + .5), color=TEXT_COLOR)
+        self.title = None
+
+    def preview(self, ehts: list, interactions: list, starts: list, asr) -> None:
+        """
+        Estimated ASR for the sweep, an (eht, interactions, starts) array
+            like fluid.evaluate_grid()'s, and draws the first handle time.
+        """
+        for e, eht in enumerate(ehts):
+            for r, j in enumerate(interactions):
+                for c, k in enumerate(starts):
+                    self.estimates[(round(float(eht), 4), int(j), int(k))] = float(asr[e, r, c])
+        self.eht = round(float(ehts[0]), 4)
+        self.dirty = set(self.cells)
+        self.draw(force=True)
+
+    def update(self, eht: float, interactions: int, starts: int, asr: float) -> None:
+        """Records a finished scenario and marks its cell dirty."""
+        key = (round(eht, 4), interactions, starts)
+        total = self.values.setdefault(key, [0.0, 0])
+        if asr == asr:
+            total[0] += asr
+            total[1] += 1
+        self.scenarios += 1
+        if key[0] != self.eht:
+            # on to the next handle time, every cell shows it now
+            self.eht = key[0]
+            self.dirty = set(self.cells)
+        else:
+            self.dirty.add((interactions, starts))
+
+    def draw(self, force: bool = False) -> bool:
+        """
+        Recolors the dirty cells, unless the last frame was less than a frame
+            time ago. Returns: True if anything was drawn, so the caller knows
+            to refresh the window.
+        """
+        now = time.perf_counter()
+        if not self.dirty or (not force and now - self.last_draw < self.frame_seconds):
+            return False
+        canvas = self.graph.TKCanvas
+        for j, k in self.dirty:
+            if (j, k) not in self.cells:
+                continue
+            total = self.values.get((self.eht, j, k))
+            if total and total[1]:
+                asr = total[0] / total[1]
+            else:
+                asr = self.estimates.get((self.eht, j, k), float('nan'))
+            canvas.itemconfig(self.cells[(j, k)], fill=asr_color(asr, self.asr_goal))
+        self.dirty.clear()
+        if self.title is not None:
+            self.graph.delete_figure(self.title)
+        self.title = self.graph.draw_text(
+            'ASR at {:g} min EHT, {} scenarios done{} (goal {:g} min)'.format(
+                self.eht, self.scenarios, ', the rest estimated' if self.estimates else '',
+                self.asr_goal),
+            (len(self.starts) / 2, len(self.interactions) + .5), color=TEXT_COLOR)
+        self.last_draw = now
+        return True
+
+    def on_result(self, window=None):
+        """
+        Callback for simulate.full_spectrum(on_result=...). Refreshes the
+            window when a frame was drawn, so the grid fills in while the
+            sweep runs on the GUI's thread.
+        """
+        def callback(point: tuple, day_df) -> None:
+            eht, interactions, starts, rep = point
+            self.update(eht, interactions, starts, float(day_df['ASR'][0]))
+            if self.draw() and window is not None:
+                window.refresh()
+        return callback
@@ -0,0 +1,33 @@
+"""
+Lazy module imports.
+
+lazy_import() returns a module object right away, but the module's code only
+runs the first time one of its attributes is used. The GUI uses it so the
+window can open before the simulation, data pull and forecasting stacks
+(simpy, pandas, Snowflake, scikit-learn, matplotlib) have been loaded, and
+each one is loaded when the feature that needs it is first used.
+"""
+
+import sys
+import importlib.util
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Imports the module lazily. If it has already been imported the real
+        module is returned.
+
+    Raises ModuleNotFoundError right away if the module doesn't exist.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named '{}'".format(name), name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,330 @@
+"""
+Shift-mix optimizer for AGENT_PORTIONS.
+
+AGENT_PORTIONS is hand tuned. This searches over how a fixed number of agent
+starts is spread over shift start hours, for a given WORK_PORTIONS demand
+curve, and reports the mix with the lowest mean time to respond (or the
+highest service level).
+
+Mixes follow the sim's staffing rules (staffing.py): one of the starts is the
+night agent, the others start in staffing.DAY_HOURS and work
+staffing.SHIFT_HOURS from their start hour. Every candidate is turned into
+AGENT_PORTIONS that staffing.compile_staffing() maps back to the same starts,
+and scored on the plan it compiles, so the portions the optimizer reports
+give the sim the staffing that was scored. A mix is feasible when at least
+MIN_AGENTS are working every hour of staffing.DAY_HOURS; the other hours only
+ever have the night agent.
+
+Each mix is scored on two copies of its day, so a backlog at midnight is
+worked off by the next morning's shifts instead of being dropped. The ASR it
+minimizes counts every customer, including the ones finished the next
+morning. The sim's ASR only counts the customers finished by midnight, and
+both are reported.
+
+Candidates are scored with the fast queue evaluator (queue_engine.py) on the
+same sampled arrivals and handle times (common random numbers), so two
+mixes are compared on identical days. The search starts from a greedy mix
+that follows the demand curve, then repeatedly tries moving one agent's
+start to every other hour, evaluating the candidates in parallel, and keeps
+the best move until nothing improves or the time budget runs out.
+
+Usage:
+    python optimize.py --starts 20 --interactions 1000 --eht 9.91
+    python optimize.py --starts 20 --objective service_level --sl-minutes 30
+"""
+
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+from typing import Optional
+import numpy as np
+import simulate as sm
+import arrivals
+import handle_times
+import queue_engine
+import staffing
+
+
+MIN_AGENTS = 1
+OBJECTIVES = ('asr', 'service_level')
+# days sampled per candidate, more is smoother but slower
+REPLICATIONS = 3
+TIME_BUDGET_SECONDS = 50
+# candidates scored together, sharing the hours they have in common
+BATCH_SIZE = 23
+SEED = 42
+INFEASIBLE = (float('inf'), float('nan'), float('nan'), float('nan'))
+
+# sampled days, set in each worker process by _init_worker()
+_DAYS = []
+_SETTINGS = {}
+
+
+def to_agent_portions(shift_starts: np.ndarray, agent_starts: int) -> dict:
+    """
+    AGENT_PORTIONS that staffing.compile_staffing() turns into these shift
+        starts. An hour's portion asks for the agents already working plus
+        the ones starting, as counted by the compiler, and sits in the middle
+        of the range int(agent_starts * portion) maps to that count, so
+        rounding can't change the plan.
+    shift_starts: agents starting each hour, only in staffing.DAY_HOURS, and
+        at most agent_starts - 1 of them (one is the night agent).
+    """
+    night = np.array([staffing.StaffingPlan.night_agent_working(h) for h in range(24)], dtype=int)
+    ideal = np.zeros(24, dtype=int)
+    for h in staffing.DAY_HOURS:
+        # the compiler's count of who is working before the hour's starts
+        previous = shift_starts[max(0, h - staffing.SHIFT_HOURS):h].sum() + night[h - 1]
+        staying = shift_starts[max(0, h - staffing.SHIFT_HOURS + 1):h].sum() + night[h]
+        ideal[h] = previous + shift_starts[h] if shift_starts[h] else staying
+    return {str(h): round(float(ideal[h] + .5) / agent_starts, 6) for h in range(24)}
+
+
+def coverage(shift_starts: np.ndarray, agent_starts: int) -> np.ndarray:
+    """Agents working each hour in the sim for the shifts starting each hour."""
+    return staffing.compile_staffing(agent_starts,
+                                     to_agent_portions(shift_starts, agent_starts)).on_shift
+
+
+def sample_days(interactions: float, handle_minutes: float, replications: int,
+                seed: int) -> list:
+    """
+    Arrival and handle time arrays for each replication, using the sim's
+        settings, and a seed for the day's agent rates (see day_rates()).
+    """
+    rng = np.random.default_rng(seed)
+    days = []
+    for r in range(replications):
+        arrival_times = arrivals.day_arrivals(interactions, sm.WORK_PORTIONS,
+                                              sm.ARRIVAL_MODE, sm.SUB_HOUR_PROFILE, rng)
+        service = handle_times.sample(len(arrival_times), handle_minutes * 60,
+                                      sm.HANDLE_TIME_DIST, sm.HANDLE_TIME_CV, rng=rng)
+        days.append((arrival_times, service, int(rng.integers(2 ** 32))))
+    return days
+
+
+def day_rates(on_shift: np.ndarray, rate_seed: int) -> Optional[np.ndarray]:
+    """
+    The agents' service rates for a mix on a sampled day, like the sim's
+        AGENT_RATES. Every mix draws from the day's seed, so the agents they
+        share get the same speeds.
+    """
+    return sm.draw_agent_rates(on_shift, np.random.default_rng(rate_seed),
+                               _SETTINGS['rate_dist'], _SETTINGS['rate_cv'])
+
+
+def feasible(on_shift: np.ndarray, min_agents: int) -> bool:
+    """At least min_agents working every hour the day shifts can work."""
+    return on_shift[staffing.DAY_HOURS.start:staffing.DAY_HOURS.stop].min() >= min_agents
+
+
+def _init_worker(days: list, settings: dict) -> None:
+    global _DAYS, _SETTINGS
+    _DAYS = days
+    _SETTINGS = settings
+
+
+def score(shift_starts: np.ndarray) -> tuple:
+    """
+    Scores one mix on the sampled days. Lower is better.
+
+    Returns: (score, mean ASR of every customer in minutes, mean service
+        level, mean ASR of the customers finished by midnight, as in the sim)
+    """
+    on_shift = coverage(shift_starts, _SETTINGS['agent_starts'])
+    if not feasible(on_shift, _SETTINGS['min_agents']):
+        return INFEASIBLE
+    # two copies of the day, so a backlog at midnight is worked off by the
+    #   next morning's shifts instead of being dropped
+    day_staffing = np.tile(on_shift, 2)
+    asr_all, service_level, asr = [], [], []
+    for arrival_times, service, rate_seed in _DAYS:
+        result = queue_engine.evaluate(arrival_times, service, day_staffing,
+                                       service_level_seconds=_SETTINGS['sl_seconds'],
+                                       rates=day_rates(day_staffing, rate_seed))
+        asr_all.append(result['asr_all'])
+        service_level.append(result['service_level'])
+        asr.append(result['asr'])
+    asr_all = float(np.mean(asr_all))
+    service_level = float(np.mean(service_level))
+    value = asr_all if _SETTINGS['objective'] == 'asr' else -service_level
+    return value, asr_all, service_level, float(np.mean(asr))
+
+
+def score_many(candidates: list) -> list:
+    """
+    score() for a batch of mixes. The batch's days are run with
+        queue_engine.run_staffing_sweep(), so the hours before two mixes
+        first differ are only simulated once. The sweep has no agent rates,
+        so with AGENT_RATE_DIST set every mix is scored on its own.
+    """
+    if _SETTINGS['rate_dist'] != 'fixed':
+        return [score(c) for c in candidates]
+    day_staffing = [np.tile(coverage(c, _SETTINGS['agent_starts']), 2) for c in candidates]
+    scored = [k for k, on_shift in enumerate(day_staffing)
+              if feasible(on_shift, _SETTINGS['min_agents'])]
+    asr_all = np.zeros(len(candidates))
+    service_level = np.zeros(len(candidates))
+    asr = np.zeros(len(candidates))
+    for arrival_times, service, rate_seed in _DAYS:
+        days = queue_engine.run_staffing_sweep(arrival_times, service,
+                                               [day_staffing[k] for k in scored])
+        for k, (starts, ends) in zip(scored, days):
+            result = queue_engine.summarize(arrival_times, starts, ends,
+                                            service_level_seconds=_SETTINGS['sl_seconds'])
+            asr_all[k] += result['asr_all'] / len(_DAYS)
+            service_level[k] += result['service_level'] / len(_DAYS)
+            asr[k] += result['asr'] / len(_DAYS)
+    scores = [INFEASIBLE] * len(candidates)
+    for k in scored:
+        value = asr_all[k] if _SETTINGS['objective'] == 'asr' else -service_level[k]
+        scores[k] = (float(value), float(asr_all[k]), float(service_level[k]), float(asr[k]))
+    return scores
+
+
+def greedy_mix(agent_starts: int, interactions: float, handle_minutes: float,
+               min_agents: int = MIN_AGENTS) -> np.ndarray:
+    """
+    Starting point: covers every hour of staffing.DAY_HOURS with min_agents,
+        then adds each agent where their shift covers the most unmet workload.
+    """
+    demand = arrivals.portions_array(sm.WORK_PORTIONS) * interactions * handle_minutes / 60
+    hours = list(staffing.DAY_HOURS)
+    # one of the starts is the night agent
+    day_agents = agent_starts - 1
+    shift_starts = np.zeros(24, dtype=int)
+    while shift_starts.sum() < day_agents:
+        on_shift = coverage(shift_starts, agent_starts)
+        short = [h for h in hours if on_shift[h] < min_agents]
+        if short:
+            # a shift starting at the first short hour covers it
+            shift_starts[short[0]] += 1
+            continue
+        unmet = np.maximum(demand - on_shift, 0)
+        gain = [unmet[h:h + staffing.SHIFT_HOURS].sum() for h in hours]
+        shift_starts[hours[int(np.argmax(gain))]] += 1
+    return shift_starts
+
+
+def neighbours(shift_starts: np.ndarray) -> list:
+    """
+    Every mix that moves one agent's start to a different hour. Moves from
+        the same hour are next to each other, and their staffing is the same
+        until the earlier of the two hours.
+    """
+    moves = []
+    for a in np.flatnonzero(shift_starts):
+        for b in staffing.DAY_HOURS:
+            if b != a:
+                candidate = shift_starts.copy()
+                candidate[a] -= 1
+                candidate[b] += 1
+                moves.append(candidate)
+    return moves
+
+
+def optimize(agent_starts: Optional[int] = None, interactions: Optional[float] = None,
+             handle_minutes: Optional[float] = None, objective: str = 'asr',
+             sl_minutes: float = 60, min_agents: int = MIN_AGENTS, replications: int = REPLICATIONS,
+             workers: Optional[int] = None, time_budget: float = TIME_BUDGET_SECONDS,
+             seed: int = SEED) -> dict:
+    """
+    Searches for the best shift start mix. Inputs default to the sim's
+        AGENT_STARTS, INTERACTIONS_MEAN and HANDLE_TIME_MEAN.
+
+    Returns: dict with the best 'shift_starts' (day agents starting each hour),
+        'on_shift', 'agent_portions' (in the AGENT_PORTIONS format, for
+        STAFFING_SCALE 1, they compile to on_shift), 'asr_all' (the ASR of
+        every customer, which the 'asr' objective minimizes), 'asr' (the
+        sim's ASR, customers finished by midnight), 'service_level', and
+        how many 'evaluations' and 'seconds' it took.
+
+    min_agents only applies to staffing.DAY_HOURS, the night agent works the
+        other hours alone.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError("Objective must be one of {}, not '{}'.".format(OBJECTIVES, objective))
+    _agent_starts = sm.AGENT_STARTS if not agent_starts else agent_starts
+    _interactions = sm.INTERACTIONS_MEAN if not interactions else interactions
+    _handle_minutes = sm.HANDLE_TIME_MEAN if not handle_minutes else handle_minutes
+    # agent hours needed on top of the night agent's
+    needed = sum(max(0, min_agents - staffing.StaffingPlan.night_agent_working(h))
+                 for h in staffing.DAY_HOURS)
+    if (_agent_starts - 1) * staffing.SHIFT_HOURS < needed:
+        raise ValueError("{} agent starts cannot cover every hour with {} agent(s).".format(
+            _agent_starts, min_agents))
+
+    started = time.perf_counter()
+    days = sample_days(_interactions, _handle_minutes, replications, seed)
+    settings = {'objective': objective, 'sl_seconds': sl_minutes * 60,
+                'agent_starts': _agent_starts, 'min_agents': min_agents,
+                'rate_dist': sm.AGENT_RATE_DIST, 'rate_cv': sm.AGENT_RATE_CV}
+    _workers = os.cpu_count() if not workers else workers
+
+    best = greedy_mix(_agent_starts, _interactions, _handle_minutes, min_agents)
+    evaluations = 1
+    with concurrent.futures.ProcessPoolExecutor(_workers, initializer=_init_worker,
+                                                initargs=(days, settings)) as pool:
+        best_score = pool.submit(score, best).result()
+        while time.perf_counter() - started < time_budget:
+            candidates = neighbours(best)
+            batches = [candidates[b:b + BATCH_SIZE] for b in range(0, len(candidates), BATCH_SIZE)]
+            scores = [s for batch in pool.map(score_many, batches) for s in batch]
+            evaluations += len(candidates)
+            i = int(np.argmin([s[0] for s in scores]))
+            if scores[i][0] >= best_score[0] - 1e-9:
+                break
+            best, best_score = candidates[i], scores[i]
+
+    on_shift = coverage(best, _agent_starts)
+    return {
+        'shift_starts': best.tolist(),
+        'on_shift': on_shift.tolist(),
+        'agent_portions': to_agent_portions(best, _agent_starts),
+        'asr_all': best_score[1],
+        'asr': best_score[3],
+        'service_level': best_score[2],
+        'objective': objective,
+        'evaluations': evaluations,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def report(result: dict) -> str:
+    lines = ['Best shift mix ({} evaluations in {:.1f} s, objective: {})'.format(
+                 result['evaluations'], result['seconds'], result['objective']),
+             'ASR of every customer: {:.2f} minutes    Service level: {:.1%}'.format(
+                 result['asr_all'], result['service_level']),
+             'ASR handled by midnight, as in the sim: {:.2f} minutes'.format(result['asr']),
+             '{:<6}{:>8}{:>10}'.format('hour', 'starts', 'working')]
+    for h in range(24):
+        lines.append('{:<6}{:>8}{:>10}'.format(h, result['shift_starts'][h], result['on_shift'][h]))
+    lines.append('AGENT_PORTIONS = {}'.format(result['agent_portions']))
+    return '\n'.join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--starts', type=int, default=None)
+    parser.add_argument('--interactions', type=float, default=None)
+    parser.add_argument('--eht', type=float, default=None, help='handle time in minutes')
+    parser.add_argument('--objective', choices=OBJECTIVES, default='asr')
+    parser.add_argument('--sl-minutes', type=float, default=60)
+    parser.add_argument('--min-agents', type=int, default=MIN_AGENTS,
+                        help='agents working every day shift hour')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--budget', type=float, default=TIME_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    result = optimize(args.starts, args.interactions, args.eht, args.objective,
+                      args.sl_minutes, args.min_agents, workers=args.workers,
+                      time_budget=args.budget)
+    print(report(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Opt-in, phase-level profiling of simulation runs.
+
+When enabled, simulate_day() records the wall time, call count and net
+allocated memory blocks for each phase of a run:
+    staffing   - setting the agents working for the hour
+    env_build  - creating the simpy environment, call center and processes
+    env_run    - env.run() for the hour
+    metrics    - ASR, utilization and dataframe building
+    logging    - writing the day's row to "log.csv"
+It also counts the simpy events processed per day, and with
+trace_malloc=True the peak traced memory of each run.
+
+When it is disabled (the default) ACTIVE is None and simulate_day() takes
+its normal path, so there is no measurement overhead.
+
+Usage:
+    import profiler
+    prof = profiler.enable()
+    sm.full_spectrum(...)
+    print(prof.report())        # last run
+    print(prof.sweep_report())  # every run since enable()
+    profiler.disable()
+"""
+
+import sys
+import time
+import statistics
+import tracemalloc
+import contextlib
+from typing import Optional
+import simpy
+
+
+# the profiler that simulate_day() reports to, None when profiling is off
+ACTIVE = None
+
+PHASES = ['staffing', 'env_build', 'env_run', 'metrics', 'logging']
+
+
+class CountingEnvironment(simpy.Environment):
+    """simpy Environment that counts the events it processes."""
+
+    def __init__(self, initial_time: float = 0):
+        super().__init__(initial_time)
+        self.events_processed = 0
+
+    def step(self) -> None:
+        self.events_processed += 1
+        super().step()
+
+
+class RunProfile:
+    """Phase timings and counters for one simulated day."""
+
+    def __init__(self, label: str = ''):
+        self.label = label
+        # phase name -> [seconds, calls, allocated blocks]
+        self.phases = {}
+        self.counters = {}
+        self.wall_time = 0.0
+        self.peak_memory = 0
+
+    def add_phase(self, name: str, seconds: float, blocks: int) -> None:
+        entry = self.phases.setdefault(name, [0.0, 0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+        entry[2] += blocks
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self) -> dict:
+        return {
+            'label': self.label,
+            'wall_time': self.wall_time,
+            'peak_memory': self.peak_memory,
+            'phases': {name: {'seconds': v[0], 'calls': v[1], 'alloc_blocks': v[2]}
+                       for name, v in self.phases.items()},
+            'counters': dict(self.counters),
+        }
+
+
+class Profiler:
+    """Collects a RunProfile per simulated day."""
+
+    def __init__(self, trace_malloc: bool = False):
+        self.trace_malloc = trace_malloc
+        self.runs = []
+        self.current = None
+        self._run_start = 0.0
+
+    def start_run(self, label: str = '') -> None:
+        self.current = RunProfile(label)
+        if self.trace_malloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self._run_start = time.perf_counter()
+
+    def end_run(self) -> None:
+        run = self.current
+        if run is None:
+            return
+        run.wall_time = time.perf_counter() - self._run_start
+        if self.trace_malloc and tracemalloc.is_tracing():
+            run.peak_memory = tracemalloc.get_traced_memory()[1]
+        self.runs.append(run)
+        self.current = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.current is not None:
+                self.current.add_phase(name, time.perf_counter() - start,
+                                       sys.getallocatedblocks() - blocks)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.current is not None:
+            self.current.count(name, n)
+
+    def report(self, run: Optional[RunProfile] = None) -> str:
+        """Text report for one run, defaults to the most recent one."""
+        if run is None:
+            if not self.runs:
+                return "No runs have been profiled."
+            run = self.runs[-1]
+
+        lines = ['Profile for run {}'.format(run.label).rstrip(),
+                 '{:<12}{:>12}{:>9}{:>8}{:>14}'.format(
+                     'phase', 'seconds', '% run', 'calls', 'alloc blocks')]
+        for name in _ordered(run.phases):
+            seconds, calls, blocks = run.phases[name]
+            share = 100 * seconds / run.wall_time if run.wall_time else 0.0
+            lines.append('{:<12}{:>12.4f}{:>8.1f}%{:>8}{:>14}'.format(
+                name, seconds, share, calls, blocks))
+        lines.append('{:<12}{:>12.4f}'.format('total', run.wall_time))
+        for name, value in run.counters.items():
+            lines.append('{}: {}'.format(name, value))
+        if run.peak_memory:
+            lines.append('peak traced memory: {:.2f} MiB'.format(run.peak_memory / 2**20))
+        return '\n'.join(lines)
+
+    def sweep_report(self) -> str:
+        """Aggregated text report over every profiled run."""
+        if not self.runs:
+            return "No runs have been profiled."
+
+        total = sum(run.wall_time for run in self.runs)
+        lines = ['Sweep profile: {} runs, {:.2f} s total, {:.4f} s mean per run'.format(
+                     len(self.runs), total, total / len(self.runs)),
+                 '{:<12}{:>12}{:>9}{:>12}{:>12}'.format(
+                     'phase', 'total s', '% sweep', 'median s', 'max s')]
+        names = _ordered(set(name for run in self.runs for name in run.phases))
+        for name in names:
+            per_run = [run.phases[name][0] for run in self.runs if name in run.phases]
+            phase_total = sum(per_run)
+            lines.append('{:<12}{:>12.4f}{:>8.1f}%{:>12.4f}{:>12.4f}'.format(
+                name, phase_total, 100 * phase_total / total if total else 0.0,
+                statistics.median(per_run), max(per_run)))
+
+        counters = {}
+        for run in self.runs:
+            for name, value in run.counters.items():
+                counters.setdefault(name, []).append(value)
+        for name, values in counters.items():
+            lines.append('{}: {} total, {:.1f} mean per run'.format(
+                name, sum(values), sum(values) / len(values)))
+        if self.trace_malloc:
+            lines.append('peak traced memory: {:.2f} MiB'.format(
+                max(run.peak_memory for run in self.runs) / 2**20))
+        return '\n'.join(lines)
+
+    def to_dict(self) -> dict:
+        return {'runs': [run.to_dict() for run in self.runs]}
+
+
+def _ordered(names) -> list:
+    """Known phases first in run order, then anything else alphabetically."""
+    return [p for p in PHASES if p in names] + sorted(n for n in names if n not in PHASES)
+
+
+def enable(trace_malloc: bool = False) -> Profiler:
+    """Turns profiling on for every following simulate_day() call."""
+    global ACTIVE
+    ACTIVE = Profiler(trace_malloc)
+    return ACTIVE
+
+
+def disable() -> Optional[Profiler]:
+    """Turns profiling off and returns the profiler with the collected runs."""
+    global ACTIVE
+    prof = ACTIVE
+    ACTIVE = None
+    if prof is not None and prof.trace_malloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return prof
@@ -0,0 +1,387 @@
+"""
+Fast queue evaluator for a simulated day.
+
+Runs the same day as simulate_day() (arrival times, per-interaction handle
+times and agents working per hour), but without simpy: customers are served
+first come first served, and each one is given to the agent that frees up
+first, kept in a heap of agent free times. That makes a day O(n log agents)
+for n interactions, roughly 10-100x faster than the simpy engine, which is
+what optimizers and calibration need when they evaluate thousands of days.
+
+Complexity, for n interactions and a agents:
+    time   - O(n log a) for the FIFO day, O(n log n) with priorities (the
+             waiting heap can hold every customer)
+    memory - O(n) for the per-interaction arrays, and one (free time, agent)
+             heap entry per agent on shift, O(1) per agent
+No per-customer objects or processes are created, so a 50,000 interaction
+day with 1,000 agents takes well under a second.
+
+Staffing changes on the hour. When more agents come on shift they are free
+from the top of the hour. When agents go off shift, the ones that free up
+first leave; anyone still helping a customer finishes with them first.
+After the last hour of on_shift the last hour's staffing carries on, so
+every customer is eventually helped.
+
+Agents can work at different speeds. With rates, agent k (numbered in the
+order agents come on shift) takes service_time / rates[k] for a customer,
+and customers still go to whoever frees up first, so the cost per customer
+stays O(log a). shifts records when each agent came on and went off shift,
+and agent_utilization() turns that and the agent of every customer into
+each agent's share of their shift spent helping customers.
+
+A day's state at an hour boundary fits in a Snapshot (the next customer and
+the heap of agent free times). Days with the same customers whose staffing
+only differs from some hour on can fork from the snapshot at that hour
+instead of simulating the shared hours again, see run_staffing_sweep().
+"""
+
+import heapq
+from typing import Optional
+import numpy as np
+
+
+HOUR_SECONDS = 60 * 60
+DAY_SECONDS = 24 * HOUR_SECONDS
+
+
+class Snapshot:
+    """
+    State of a run_day() day at an hour boundary, just before the staffing
+        for `hour` is applied: the index of the next customer to serve, the
+        heap of agent free times and the next agent number. Everything before
+        it depends only on the arrivals, handle times and on_shift[:hour], so
+        a day with the same inputs up to that hour can carry on from here.
+        About 16 bytes per agent on shift, and it pickles.
+    """
+
+    __slots__ = ('hour', 'index', 'free', 'next_agent')
+
+    def __init__(self, hour: int, index: int, free: list, next_agent: int):
+        self.hour = hour
+        self.index = index
+        self.free = free
+        self.next_agent = next_agent
+
+
+def run_day(arrival_times: np.ndarray, service_times: np.ndarray, on_shift,
+            hour_seconds: float = HOUR_SECONDS, agents: Optional[np.ndarray] = None,
+            snapshots: Optional[dict] = None, snapshot_hours=None,
+            rates: Optional[np.ndarray] = None, shifts: Optional[list] = None) -> tuple:
+    """
+    Serves every customer and returns when each one's service started and ended.
+
+    arrival_times: sorted seconds since midnight.
+    service_times: seconds each customer takes to help.
+    on_shift: agents working each hour (at least 1 is always working).
+    agents: optional int array of length n, filled in with the number of the
+        agent that helped each customer.
+    snapshots: optional dict, filled in with a Snapshot keyed by the hour for
+        every hour boundary the day reaches (see fork_day()), or only for the
+        hours in snapshot_hours if given.
+    rates: optional service rate of every agent number, at least
+        agents_needed(on_shift) of them. A customer takes service_time / rate.
+    shifts: optional list, filled in with [on, off] seconds for every agent
+        number, off is None for the agents still on shift at the end.
+
+    Returns: (starts, ends) float arrays in seconds since midnight.
+    """
+    n = len(arrival_times)
+    starts = np.empty(n)
+    ends = np.empty(n)
+    if n == 0:
+        return starts, ends
+
+    on_shift = [max(1, int(c)) for c in on_shift]
+    # heap of (time the agent is free, agent number)
+    free = [(0.0, agent) for agent in range(on_shift[0])]
+    if shifts is not None:
+        shifts.extend([0.0, None] for agent in range(on_shift[0]))
+    _serve(arrival_times.tolist(), service_times.tolist(), on_shift, hour_seconds,
+           starts, ends, agents, 0, 0, free, on_shift[0], snapshots,
+           range(len(on_shift)) if snapshot_hours is None else snapshot_hours,
+           None if rates is None else np.asarray(rates, dtype=float).tolist(), shifts)
+    return starts, ends
+
+
+def agents_needed(on_shift) -> int:
+    """Number of agent numbers run_day() gives out for this staffing."""
+    on_shift = [max(1, int(c)) for c in on_shift]
+    return on_shift[0] + sum(max(0, b - a) for a, b in zip(on_shift, on_shift[1:]))
+
+
+def fork_day(arrival_times: np.ndarray, service_times: np.ndarray, on_shift,
+             snapshot: Snapshot, starts: np.ndarray, ends: np.ndarray,
+             hour_seconds: float = HOUR_SECONDS, snapshots: Optional[dict] = None,
+             snapshot_hours=None) -> tuple:
+    """
+    Carries on a day from a snapshot of another day with the same arrivals,
+        handle times and on_shift[:snapshot.hour], with this on_shift from
+        there on. Only the customers served from that hour on are simulated.
+
+    starts, ends: the other day's results, the customers before the snapshot
+        are copied from them.
+    snapshots: optional dict, filled in like run_day() for the hours after
+        the snapshot, or only for snapshot_hours if given.
+
+    Returns: (starts, ends) float arrays in seconds since midnight.
+    """
+    starts = starts.copy()
+    ends = ends.copy()
+    on_shift = [max(1, int(c)) for c in on_shift]
+    _serve(arrival_times.tolist(), service_times.tolist(), on_shift, hour_seconds,
+           starts, ends, None, snapshot.index, snapshot.hour - 1, list(snapshot.free),
+           snapshot.next_agent, snapshots,
+           range(len(on_shift)) if snapshot_hours is None else snapshot_hours)
+    return starts, ends
+
+
+def _serve(arrival_list: list, service_list: list, on_shift: list, hour_seconds: float,
+           starts: np.ndarray, ends: np.ndarray, agents: Optional[np.ndarray], first: int,
+           hour: int, free: list, next_agent: int, snapshots: Optional[dict],
+           snapshot_hours, rates: Optional[list] = None, shifts: Optional[list] = None) -> None:
+    """
+    The FIFO loop behind run_day() and fork_day(), from customer `first` on.
+        Snapshots are taken at the boundaries in snapshot_hours.
+    """
+    last_hour = len(on_shift) - 1
+    boundary = (hour + 1) * hour_seconds
+
+    for i in range(first, len(arrival_list)):
+        arrival = arrival_list[i]
+        # move the staffing forward to the hour this customer would start in
+        while hour < last_hour:
+            first_free = free[0][0]
+            start = arrival if arrival > first_free else first_free
+            if start < boundary:
+                break
+            if snapshots is not None and hour + 1 in snapshot_hours:
+                snapshots[hour + 1] = Snapshot(hour + 1, i, list(free), next_agent)
+            hour += 1
+            change = on_shift[hour] - len(free)
+            if change > 0:
+                for k in range(change):
+                    heapq.heappush(free, (boundary, next_agent))
+                    next_agent += 1
+                    if shifts is not None:
+                        shifts.append([boundary, None])
+            else:
+                for k in range(-change):
+                    gone, agent = heapq.heappop(free)
+                    if shifts is not None:
+                        # anyone still helping a customer finishes first
+                        shifts[agent][1] = gone if gone > boundary else boundary
+            boundary += hour_seconds
+
+        first_free, agent = free[0]
+        start = arrival if arrival > first_free else first_free
+        end = start + (service_list[i] if rates is None else service_list[i] / rates[agent])
+        heapq.heapreplace(free, (end, agent))
+        starts[i] = start
+        ends[i] = end
+        if agents is not None:
+            agents[i] = agent
+
+
+def agent_utilization(starts: np.ndarray, ends: np.ndarray, agents: np.ndarray, shifts: list,
+                      horizon: float = DAY_SECONDS) -> tuple:
+    """
+    Seconds each agent number spent helping customers and on shift, both cut
+        off at the horizon, from run_day()'s agents and shifts.
+
+    Returns: (busy, on_shift) float arrays, one entry per agent number.
+    """
+    count = len(shifts)
+    busy = np.bincount(agents, weights=np.clip(ends, None, horizon) - np.clip(starts, None, horizon),
+                       minlength=count)
+    on = np.array([shift[0] for shift in shifts], dtype=float)
+    off = np.array([horizon if shift[1] is None else shift[1] for shift in shifts], dtype=float)
+    return busy, np.clip(off, None, horizon) - np.clip(on, None, horizon)
+
+
+def common_hours(a: list, b: list) -> int:
+    """
+    Number of leading hours two staffing plans agree on. Plans of different
+        lengths have to be padded first (see run_staffing_sweep()), a plan
+        that is a prefix of a longer one keeps its last hour's staffing.
+    """
+    if len(a) != len(b):
+        raise ValueError("Staffing plans of {} and {} hours can't be compared.".format(
+            len(a), len(b)))
+    for h, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return h
+    return min(len(a), len(b))
+
+
+def run_staffing_sweep(arrival_times: np.ndarray, service_times: np.ndarray, plans: list,
+                       hour_seconds: float = HOUR_SECONDS) -> list:
+    """
+    run_day() for the same customers under several staffing plans. Each plan
+        carries on from the snapshot of the plan run before it that shares
+        the most leading hours with it, so hours the plans have in common are
+        only simulated once. Plans with the same staffing every hour share
+        their result arrays.
+
+    How much is saved depends on where the plans first differ. Plans that
+        only differ in the afternoon skip most of the day, while compiled
+        plans for neighbouring AGENT_STARTS usually differ by the early
+        morning, before most customers arrive.
+
+    plans: list of on_shift arrays. Shorter plans are padded with their last
+        hour, which is the staffing run_day() carries on with after them.
+
+    Returns: list of (starts, ends), one per plan.
+    """
+    plans = [[max(1, int(c)) for c in plan] for plan in plans]
+    length = max((len(plan) for plan in plans), default=0)
+    plans = [plan + plan[-1:] * (length - len(plan)) for plan in plans]
+    # each plan's parent (the earlier plan sharing the most hours) and the
+    #   number of hours they share, then the snapshots every plan has to keep
+    parents = []
+    for j, plan in enumerate(plans):
+        parent, shared = None, 0
+        for i in range(j):
+            hours = common_hours(plans[i], plan)
+            if hours > shared:
+                parent, shared = i, hours
+        parents.append((parent, shared))
+    wanted = [set() for plan in plans]
+    for j in reversed(range(len(plans))):
+        parent, shared = parents[j]
+        if parent is None:
+            continue
+        wanted[parent].add(shared)
+        # hours before the parent's own fork come from further up
+        hour = shared
+        while parent is not None and hour <= parents[parent][1]:
+            parent = parents[parent][0]
+            if parent is not None:
+                wanted[parent].add(hour)
+
+    # (starts, ends, snapshots) per plan, the snapshots include the ones
+    #   inherited from before the fork
+    runs = []
+    for j, plan in enumerate(plans):
+        parent, shared = parents[j]
+        snapshots = {}
+        if parent is None:
+            starts, ends = run_day(arrival_times, service_times, plan, hour_seconds,
+                                   snapshots=snapshots, snapshot_hours=wanted[j])
+        else:
+            parent_starts, parent_ends, parent_snapshots = runs[parent]
+            snapshot = parent_snapshots.get(shared)
+            if snapshot is None or shared >= len(plan):
+                # same plan, or every customer had started before the plans differ
+                starts, ends = parent_starts, parent_ends
+                snapshots.update(parent_snapshots)
+            else:
+                starts, ends = fork_day(arrival_times, service_times, plan, snapshot,
+                                        parent_starts, parent_ends, hour_seconds,
+                                        snapshots, wanted[j])
+                snapshots.update((h, snap) for h, snap in parent_snapshots.items()
+                                 if h <= shared)
+        runs.append((starts, ends, snapshots))
+    return [(starts, ends) for starts, ends, snapshots in runs]
+
+
+def summarize(arrival_times: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+              horizon: float = DAY_SECONDS, service_level_seconds: float = 60 * 60) -> dict:
+    """
+    Day-level metrics with vectorized reductions.
+
+    asr and handled only count customers finished within the horizon, the
+        same way the simpy engine does. asr_all counts everyone.
+    service_level is the share of customers who started being helped within
+        service_level_seconds of arriving.
+    """
+    n = len(arrival_times)
+    if n == 0:
+        return {'interactions': 0, 'handled': 0, 'asr': 0.0, 'asr_all': 0.0,
+                'wait': 0.0, 'service_level': 1.0, 'backlog': 0}
+    respond = ends - arrival_times
+    wait = starts - arrival_times
+    done = ends <= horizon
+    handled = int(done.sum())
+    return {
+        'interactions': n,
+        'handled': handled,
+        'asr': float(respond[done].mean() / 60) if handled else float('nan'),
+        'asr_all': float(respond.mean() / 60),
+        'wait': float(wait.mean() / 60),
+        'service_level': float((wait <= service_level_seconds).mean()),
+        'backlog': n - handled,
+    }
+
+
+def evaluate(arrival_times: np.ndarray, service_times: np.ndarray, on_shift,
+             horizon: float = DAY_SECONDS, service_level_seconds: float = 60 * 60,
+             rates: Optional[np.ndarray] = None) -> dict:
+    """run_day() followed by summarize()."""
+    starts, ends = run_day(arrival_times, service_times, on_shift, rates=rates)
+    return summarize(arrival_times, starts, ends, horizon, service_level_seconds)
+
+
+def run_priority(arrival_times: np.ndarray, service_times: np.ndarray, priorities: np.ndarray,
+                 on_shift, hour_seconds: float = HOUR_SECONDS) -> tuple:
+    """
+    Same as run_day(), but when an agent frees up they take the waiting
+        customer with the lowest priority number, first come first served
+        within a priority. Nobody is interrupted once they are being helped.
+
+    priorities: int priority of each customer, 0 is served first.
+
+    Returns: (starts, ends) float arrays in seconds since midnight.
+    """
+    n = len(arrival_times)
+    starts = np.empty(n)
+    ends = np.empty(n)
+    if n == 0:
+        return starts, ends
+
+    on_shift = [max(1, int(c)) for c in on_shift]
+    last_hour = len(on_shift) - 1
+    hour = 0
+    boundary = hour_seconds
+    free = [(0.0, agent) for agent in range(on_shift[0])]
+    next_agent = on_shift[0]
+    arrival_list = arrival_times.tolist()
+    service_list = service_times.tolist()
+    priority_list = priorities.tolist()
+    # heap of (priority, arrival, customer index) for the customers waiting
+    waiting = []
+    now = 0.0
+    i = 0
+
+    for served in range(n):
+        if not waiting and arrival_list[i] > now:
+            # nobody waiting, skip ahead to the next arrival
+            now = arrival_list[i]
+        while hour < last_hour:
+            first_free = free[0][0]
+            start = now if now > first_free else first_free
+            if start < boundary:
+                break
+            hour += 1
+            change = on_shift[hour] - len(free)
+            if change > 0:
+                for k in range(change):
+                    heapq.heappush(free, (boundary, next_agent))
+                    next_agent += 1
+            else:
+                for k in range(-change):
+                    heapq.heappop(free)
+            boundary += hour_seconds
+
+        first_free, agent = free[0]
+        now = now if now > first_free else first_free
+        # everyone who has arrived by the time the agent is free gets a chance
+        while i < n and arrival_list[i] <= now:
+            heapq.heappush(waiting, (priority_list[i], arrival_list[i], i))
+            i += 1
+        c = heapq.heappop(waiting)[2]
+        end = now + service_list[c]
+        heapq.heapreplace(free, (end, agent))
+        starts[c] = now
+        ends[c] = end
+
+    return starts, ends
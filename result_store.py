@@ -0,0 +1,178 @@
+"""
+Memory-mapped N-dimensional store for sweep results.
+
+log.csv keeps one day-level row per scenario, with label columns that have to
+be cleaned out and pivoted before the numbers can be plotted, and the hourly
+picture is lost. A result store keeps every scenario's hourly metrics (see
+simulate.HOURLY) in one array on disk, e.g. for full_spectrum():
+
+    (eht, interactions, starts, rep, hour, metric)
+
+The array is a .npy file opened with numpy's memmap, so opening a store is
+instant however big it is, and a slice only reads the pages it touches. The
+coordinate values of every axis live next to it in coords.json, so slices are
+asked for by value:
+
+    store = ResultStore.open('results/1a2b3c4d5e6f')
+    # ASR by hour for 22 starts across all volumes, first replication
+    store.sel(starts=22, rep=0, metric='asr')      # shape (eht, interactions, hour)
+
+Scenarios that haven't been simulated yet are NaN.
+
+Layout of a store, in <STORE_DIR>/<sweep id>/:
+    values.npy    float32 array, one axis per coordinate
+    coords.json   {"axes": [...], "coords": {axis: [values]}, "dtype": ...}
+"""
+
+import os
+import json
+from typing import Union
+import numpy as np
+
+
+STORE_DIR = 'results'
+VALUES_FILE = 'values.npy'
+COORDS_FILE = 'coords.json'
+DTYPE = 'float32'
+
+
+def store_path(sweep_id: str, directory: str = STORE_DIR) -> str:
+    return os.path.join(directory, sweep_id)
+
+
+def _key(value) -> Union[float, str]:
+    """Coordinate lookup key, so 9.5 and 9.50000001 find the same index."""
+    if isinstance(value, str):
+        return value
+    return round(float(value), 6)
+
+
+class ResultStore:
+    """
+    A memory-mapped array with named axes and coordinate values.
+
+    axes - axis names, in the array's order
+    coords - dict of axis name -> list of coordinate values
+    values - the np.memmap itself
+    """
+
+    def __init__(self, path: str, values: np.ndarray, axes: list, coords: dict):
+        self.path = path
+        self.values = values
+        self.axes = list(axes)
+        self.coords = coords
+        self._index = {axis: {_key(v): i for i, v in enumerate(coords[axis])} for axis in axes}
+
+    @classmethod
+    def create(cls, path: str, coords: dict, dtype: str = DTYPE) -> 'ResultStore':
+        """
+        Creates a store filled with NaN. The axes are the keys of coords, in
+            order.
+        """
+        os.makedirs(path, exist_ok=True)
+        axes = list(coords)
+        coords = {axis: [v if isinstance(v, str) else float(v) for v in coords[axis]]
+                  for axis in axes}
+        shape = tuple(len(coords[axis]) for axis in axes)
+        values = np.lib.format.open_memmap(os.path.join(path, VALUES_FILE), mode='w+',
+                                           dtype=dtype, shape=shape)
+        values.fill(np.nan)
+        values.flush()
+        # same tmp file and os.replace() pattern as checkpoint.py
+        target = os.path.join(path, COORDS_FILE)
+        tmp_path = target + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'axes': axes, 'coords': coords, 'dtype': dtype}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+        return cls(path, values, axes, coords)
+
+    @classmethod
+    def open(cls, path: str, mode: str = 'r') -> 'ResultStore':
+        """Opens an existing store, 'r' to read or 'r+' to keep writing it."""
+        with open(os.path.join(path, COORDS_FILE)) as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(path, VALUES_FILE), mmap_mode=mode)
+        return cls(path, values, meta['axes'], meta['coords'])
+
+    @classmethod
+    def open_or_create(cls, path: str, coords: dict, resume: bool = True) -> 'ResultStore':
+        """
+        Reopens the store to keep filling it if it has the same coordinates,
+            otherwise starts a new one.
+        """
+        if resume and os.path.exists(os.path.join(path, COORDS_FILE)):
+            store = cls.open(path, 'r+')
+            same = store.axes == list(coords) and all(
+                [_key(v) for v in store.coords[axis]] == [_key(v) for v in coords[axis]]
+                for axis in store.axes)
+            if same:
+                return store
+            store.close()
+        return cls.create(path, coords)
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    def index(self, axis: str, value) -> int:
+        try:
+            return self._index[axis][_key(value)]
+        except KeyError:
+            raise KeyError("{} is not a coordinate of axis '{}'.".format(value, axis)) from None
+
+    def where(self, point: tuple) -> tuple:
+        """Array indices of a scenario, from its coordinate values on the leading axes."""
+        return tuple(self.index(axis, value) for axis, value in zip(self.axes, point))
+
+    def write(self, point: tuple, block) -> None:
+        """
+        Writes one scenario.
+
+        point: coordinate values for the leading axes, e.g.
+            (eht, interactions, starts, rep)
+        block: the values for the remaining axes, e.g. simulate.HOURLY
+        """
+        self.values[self.where(point)] = block
+
+    def sel(self, **selectors) -> np.ndarray:
+        """
+        Slices the store by coordinate value. An axis given one value is
+            dropped, an axis given a list keeps those values, and axes not
+            named are kept whole. Single values give a view of the memmap, so
+            only the pages in the slice are read.
+        """
+        unknown = set(selectors) - set(self.axes)
+        if unknown:
+            raise KeyError("No axis named {}.".format(', '.join(sorted(unknown))))
+        result = self.values
+        # one axis at a time, so lists on several axes aren't broadcast together
+        for axis in reversed(self.axes):
+            if axis not in selectors:
+                continue
+            n = self.axes.index(axis)
+            selector = selectors[axis]
+            if isinstance(selector, (list, tuple, np.ndarray)):
+                where = [self.index(axis, v) for v in selector]
+            else:
+                where = self.index(axis, selector)
+            result = result[(slice(None),) * n + (where,)]
+        return result
+
+    def completed(self, block_axes: int = 2) -> np.ndarray:
+        """
+        Boolean array over the leading axes, True where the scenario has been
+            written. block_axes is the number of trailing axes per scenario.
+        """
+        trailing = tuple(range(self.values.ndim - block_axes, self.values.ndim))
+        return ~np.isnan(self.values).all(axis=trailing)
+
+    def flush(self) -> None:
+        if isinstance(self.values, np.memmap):
+            self.values.flush()
+
+    def close(self) -> None:
+        """Flushes and lets go of the memmap, so the files can be moved or deleted."""
+        self.flush()
+        self.values = None
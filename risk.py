@@ -0,0 +1,307 @@
+"""
+Staffing risk bands from the forecast's uncertainty.
+
+forecast.future_forecast() gives one predicted volume per day, and
+forecast_spectrum() simulates it as if it were certain. This draws many
+possible volumes for each forecast day instead, simulates every draw at each
+staffing level, and reports per date and agent starts:
+    - P(ASR > goal), the chance the day misses the ASR goal
+    - the mean ASR and the ASR quantiles (QUANTILES)
+so the starts for a day can be picked for an acceptable risk, not just for
+the point forecast.
+
+Volume draws come from the linear trend fitted to the history:
+    'residual'  - the point forecast plus residuals of the fit to the history,
+                  resampled
+    'bootstrap' - the trend is refit on resampled history days for every
+                  draw, so the slope's uncertainty grows with the horizon,
+                  plus a resampled residual
+The draws are made for every day at once with numpy. Each (date, starts)
+cell is simulated with the fast queue evaluator (queue_engine.py) in a pool
+of worker processes. Draw s of a day uses the same random numbers at every
+staffing level, so the levels are compared on the same days.
+
+The runtime is about (dates x staffing levels x samples) x seconds per
+simulated day / workers. With a budget, the sample count is picked to fit it
+from a timed probe day (see plan_samples()).
+
+Usage:
+    python risk.py --history interactions.csv --starts-min 18 --starts-max 24 --asr-goal 30
+    python risk.py --starts-min 18 --starts-max 24 --budget 60    (pulls the history)
+"""
+
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+from typing import Optional
+import numpy as np
+import pandas as pd
+import simulate as sm
+import arrivals
+import handle_times
+import staffing
+import queue_engine
+
+
+METHODS = ('residual', 'bootstrap')
+SAMPLES = 200
+MIN_SAMPLES = 20
+QUANTILES = (.05, .5, .95)
+ASR_GOAL = 30
+# acceptable chance of missing the goal, for the recommended starts
+RISK_TOLERANCE = .1
+FORECAST_DAYS = 60
+SEED = 42
+
+# simulation settings, set in each worker process by _init_worker()
+_SETTINGS = {}
+
+
+"""
+---- Volume draws
+"""
+
+
+def fit_trend(x: np.ndarray, y: np.ndarray) -> tuple:
+    """Least squares line through the points. Returns: (intercept, slope)"""
+    slope, intercept = np.polyfit(x, y, 1)
+    return float(intercept), float(slope)
+
+
+def volume_samples(df: pd.DataFrame, future_df: pd.DataFrame, samples: int = SAMPLES,
+                   method: str = 'residual', regressor=None,
+                   rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Draws possible volumes for each forecast day.
+
+    df: the history, from forecast.get_data() (date_delta and
+        DAILYINTERACTIONCOUNT columns)
+    future_df: from forecast.future_forecast() (date_delta and
+        predicted_interactions columns)
+    regressor: the fitted forecast model. Its residuals are used when given,
+        otherwise a line is fitted here.
+
+    Returns: (forecast days, samples) array of interactions.
+    """
+    if method not in METHODS:
+        raise ValueError("Method must be one of {}, not '{}'.".format(METHODS, method))
+    rng = np.random.default_rng() if rng is None else rng
+    x = df['date_delta'].to_numpy(dtype=float)
+    y = df['DAILYINTERACTIONCOUNT'].to_numpy(dtype=float)
+    future_x = future_df['date_delta'].to_numpy(dtype=float)
+
+    if regressor is not None:
+        def trend(at: np.ndarray) -> np.ndarray:
+            return np.asarray(regressor.predict(at.reshape(-1, 1)), dtype=float).ravel()
+    else:
+        intercept, slope = fit_trend(x, y)
+
+        def trend(at: np.ndarray) -> np.ndarray:
+            return intercept + slope * at
+    fitted = trend(x)
+    residuals = y - fitted
+    noise = rng.choice(residuals, size=(len(future_x), samples))
+
+    if method == 'residual':
+        if 'predicted_interactions' in future_df:
+            point = future_df['predicted_interactions'].to_numpy(dtype=float)
+        else:
+            # the trend carried past the history
+            point = trend(future_x)
+        volumes = point[:, None] + noise
+    else:
+        # one least squares refit per draw, all at once
+        rows = rng.integers(0, len(x), size=(samples, len(x)))
+        xs, ys = x[rows], y[rows]
+        x_dev = xs - xs.mean(axis=1, keepdims=True)
+        y_dev = ys - ys.mean(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slopes = (x_dev * y_dev).sum(axis=1) / (x_dev ** 2).sum(axis=1)
+        slopes = np.nan_to_num(slopes)
+        intercepts = ys.mean(axis=1) - slopes * xs.mean(axis=1)
+        volumes = intercepts[None, :] + slopes[None, :] * future_x[:, None] + noise
+    return np.maximum(volumes, 0)
+
+
+def forecast_dates(df: pd.DataFrame, future_df: pd.DataFrame) -> list:
+    """Dates of the forecast days, from the last history date and date_delta."""
+    if 'DATE' not in df:
+        return [int(d) for d in future_df['date_delta']]
+    last = pd.to_datetime(df['DATE']).max()
+    return [(last + pd.Timedelta(days=float(d))).date().isoformat()
+            for d in future_df['date_delta']]
+
+
+"""
+---- Simulation, runs in the pool processes
+"""
+
+
+def _init_worker(settings: dict) -> None:
+    global _SETTINGS
+    _SETTINGS = settings
+
+
+def simulate_cell(task: tuple) -> np.ndarray:
+    """
+    Simulates every volume draw of one forecast day at one staffing level.
+
+    task: (day index, agent starts, volume draws)
+
+    Returns: the ASR of each draw, in minutes.
+    """
+    day, starts, volumes = task
+    plan = staffing.compile_staffing(starts, _SETTINGS['agent_portions'])
+    asr = np.empty(len(volumes))
+    for s, volume in enumerate(volumes):
+        # draw s of the day gets the same random numbers at every staffing level
+        rng = np.random.default_rng([_SETTINGS['seed'], day, s])
+        arrival_times = arrivals.day_arrivals(volume * _SETTINGS['volume_correction'],
+                                              _SETTINGS['work_portions'],
+                                              _SETTINGS['arrival_mode'],
+                                              _SETTINGS['sub_hour_profile'], rng)
+        service = handle_times.sample(len(arrival_times), _SETTINGS['handle_seconds'],
+                                      _SETTINGS['handle_dist'], _SETTINGS['handle_cv'], rng=rng)
+        # drawn after the service times, like the sim
+        rates = sm.draw_agent_rates(plan.on_shift, rng, _SETTINGS['rate_dist'],
+                                    _SETTINGS['rate_cv'])
+        asr[s] = queue_engine.evaluate(arrival_times, service, plan.on_shift,
+                                       rates=rates)['asr']
+    return asr
+
+
+def sim_settings(handle_minutes: Optional[float] = None, seed: int = SEED) -> dict:
+    """The sim's current settings, for the workers."""
+    _handle_minutes = sm.HANDLE_TIME_MEAN if not handle_minutes else handle_minutes
+    return {
+        'seed': seed, 'handle_seconds': int(_handle_minutes * 60),
+        'agent_portions': sm.scaled_portions(sm.AGENT_PORTIONS),
+        'volume_correction': sm.VOLUME_CORRECTION, 'work_portions': sm.WORK_PORTIONS,
+        'arrival_mode': sm.ARRIVAL_MODE, 'sub_hour_profile': sm.SUB_HOUR_PROFILE,
+        'handle_dist': sm.HANDLE_TIME_DIST, 'handle_cv': sm.HANDLE_TIME_CV,
+        'rate_dist': sm.AGENT_RATE_DIST, 'rate_cv': sm.AGENT_RATE_CV,
+    }
+
+
+def plan_samples(budget_seconds: float, days: int, levels: int, workers: Optional[int] = None,
+                 interactions: Optional[float] = None,
+                 handle_minutes: Optional[float] = None) -> int:
+    """
+    Number of draws per day that fits the budget, from one timed probe day.
+        Never fewer than MIN_SAMPLES.
+    """
+    _workers = os.cpu_count() if not workers else workers
+    _interactions = sm.INTERACTIONS_MEAN if not interactions else interactions
+    _init_worker(sim_settings(handle_minutes))
+    started = time.perf_counter()
+    simulate_cell((0, sm.AGENT_STARTS, np.array([_interactions] * 3)))
+    per_day = (time.perf_counter() - started) / 3
+    return max(MIN_SAMPLES, int(budget_seconds * _workers / (per_day * days * levels)))
+
+
+def risk_bands(volumes: np.ndarray, dates: list, starts_range: range,
+               asr_goal: float = ASR_GOAL, handle_minutes: Optional[float] = None,
+               workers: Optional[int] = None, quantiles: tuple = QUANTILES,
+               seed: int = SEED) -> pd.DataFrame:
+    """
+    Simulates every volume draw at every staffing level.
+
+    volumes: (days, samples) array from volume_samples()
+
+    Returns: dataframe with a row per date and agent starts, with the mean
+        forecast volume, P(ASR > goal), the mean ASR and the ASR quantiles.
+    """
+    _workers = os.cpu_count() if not workers else workers
+    tasks = [(d, k, volumes[d]) for d in range(len(volumes)) for k in starts_range]
+    with concurrent.futures.ProcessPoolExecutor(
+            _workers, initializer=_init_worker,
+            initargs=(sim_settings(handle_minutes, seed),)) as pool:
+        results = list(pool.map(simulate_cell, tasks, chunksize=max(1, len(starts_range))))
+
+    rows = []
+    for (d, k, day_volumes), asr in zip(tasks, results):
+        # a day with nobody handled counts as missing the goal
+        missed = np.where(np.isnan(asr), True, asr > asr_goal)
+        row = {'Date': dates[d], 'Agent Starts': k, 'Forecast': float(day_volumes.mean()),
+               'P(ASR > goal)': float(missed.mean()), 'ASR mean': float(np.nanmean(asr))}
+        for q, value in zip(quantiles, np.nanquantile(asr, quantiles)):
+            row['ASR p{:g}'.format(q * 100)] = float(value)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def recommended_starts(bands: pd.DataFrame, risk_tolerance: float = RISK_TOLERANCE) -> pd.Series:
+    """
+    Fewest agent starts per date whose chance of missing the goal is within
+        the tolerance, NaN if no simulated level is.
+    """
+    ok = bands[bands['P(ASR > goal)'] <= risk_tolerance]
+    return ok.groupby('Date', sort=False)['Agent Starts'].min().reindex(
+        bands['Date'].unique()).astype('Int64')
+
+
+def report(bands: pd.DataFrame, asr_goal: float = ASR_GOAL,
+           risk_tolerance: float = RISK_TOLERANCE) -> str:
+    lines = ['Chance of ASR over {:g} minutes, by date and agent starts:'.format(asr_goal)]
+    table = bands.pivot(index='Date', columns='Agent Starts', values='P(ASR > goal)')
+    lines.append(table.sort_index().to_string(float_format='{:.0%}'.format))
+    recommended = recommended_starts(bands, risk_tolerance)
+    lines.append('Fewest starts with at most a {:.0%} chance of missing the goal:'.format(
+        risk_tolerance))
+    lines.append(recommended.to_string(na_rep='more than simulated'))
+    return '\n'.join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', default=None,
+                        help='CSV with DATE and DAILYINTERACTIONCOUNT, pulled if not given')
+    parser.add_argument('--days', type=int, default=FORECAST_DAYS, help='days to forecast')
+    parser.add_argument('--starts-min', type=int, required=True)
+    parser.add_argument('--starts-max', type=int, required=True)
+    parser.add_argument('--asr-goal', type=float, default=ASR_GOAL)
+    parser.add_argument('--risk', type=float, default=RISK_TOLERANCE)
+    parser.add_argument('--eht', type=float, default=None, help='handle time in minutes')
+    parser.add_argument('--method', choices=METHODS, default='residual')
+    parser.add_argument('--samples', type=int, default=None)
+    parser.add_argument('--budget', type=float, default=None,
+                        help='seconds to spend, sets the sample count')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--output', default=None, help='CSV for the full risk table')
+    args = parser.parse_args()
+
+    if args.history:
+        df = pd.read_csv(args.history)
+        df['DATE'] = pd.to_datetime(df['DATE'])
+        df['date_delta'] = (df['DATE'] - df['DATE'].max()) / np.timedelta64(1, 'D')
+    else:
+        import forecast
+        df = forecast.get_data()
+    future_df = pd.DataFrame({'date_delta': np.arange(1, args.days + 1, dtype=float)})
+    starts_range = range(args.starts_min, args.starts_max + 1)
+
+    if args.samples:
+        samples = args.samples
+    elif args.budget:
+        samples = plan_samples(args.budget, args.days, len(starts_range), args.workers,
+                               df['DAILYINTERACTIONCOUNT'].mean(), args.eht)
+    else:
+        samples = SAMPLES
+    started = time.perf_counter()
+    volumes = volume_samples(df, future_df, samples, args.method,
+                             rng=np.random.default_rng(args.seed))
+    bands = risk_bands(volumes, forecast_dates(df, future_df), starts_range, args.asr_goal,
+                       args.eht, args.workers, seed=args.seed)
+    print(report(bands, args.asr_goal, args.risk))
+    print('{} samples per day, {:.1f} s'.format(samples, time.perf_counter() - started))
+    if args.output:
+        bands.to_csv(args.output, index=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
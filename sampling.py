@@ -0,0 +1,330 @@
+"""
+Space-filling sampling of the spectrum ranges, instead of the full grid.
+
+simulate.full_spectrum() runs every combination of EHT (in steps of
+step_minutes), interactions (in steps of interactions_step) and agent starts,
+so its cost is the product of the three ranges, and most of the grid is far
+from the ASR goal where nothing interesting happens. This runs a design of a
+requested size over the same ranges instead:
+
+    lhs     Latin hypercube: every axis is cut into n equal strata and each
+            stratum gets exactly one sample, in a random pairing.
+    sobol   Scrambled Sobol sequence: a low discrepancy sequence that fills
+            the cube evenly at every prefix length. scipy's Owen scrambled
+            Sobol is used when scipy is installed, otherwise the sequence is
+            built here with the Joe-Kuo direction numbers for 3 dimensions
+            and a random digital shift.
+
+Refinement rounds can then add samples where ASR changes fastest: every
+sample is paired with its nearest neighbours (in coordinates scaled to the
+unit cube), the pairs on either side of the ASR goal go first, the rest by
+|log ASR difference| / distance, and the midpoints of the top pairs are
+simulated next. Refinement is off by default. ASR across these ranges is
+smooth, and on the fluid model's surface (fluid.py) a plain design of 100
+placed the envelope better than a design of 60 refined up to 100.
+
+EHT is sampled in whole seconds (the sim runs on int(eht * 60) anyway),
+interactions and agent starts as integers. Each scenario is seeded from the
+design's ID and its point (see shard.point_seed()), so a design reruns the
+same. Like the sweeps, the ID includes the sim's settings
+(simulate.sweep_config()), and the workers run with the caller's settings
+and don't append to log.csv. interpolate() fills a regular grid from the samples with local
+planes in log ASR, for plots and comparisons with full_spectrum() results.
+From 100 Sobol samples, under a tenth of the default grid, it puts 1 to 2%
+of the grid's cells on the wrong side of a 30 minute goal.
+
+Usage:
+    python sampling.py --samples 100 --method sobol --output envelope.csv
+    python sampling.py --samples 60 --refine 2 --refine-samples 20
+"""
+
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+from typing import Optional
+import numpy as np
+import pandas as pd
+import simulate as sm
+from checkpoint import make_sweep_id
+from shard import point_seed
+
+
+METHODS = ('lhs', 'sobol')
+SAMPLES = 100
+REFINE_ROUNDS = 0
+# share of the first design added per refinement round
+REFINE_FRACTION = .25
+NEIGHBOURS = 6
+NEIGHBOURS_FIT = 10
+ASR_GOAL = 30
+SOBOL_BITS = 30
+# Joe-Kuo direction numbers for dimensions 2 and 3: (s, a, m)
+SOBOL_DIRECTIONS = ((1, 0, (1,)), (2, 1, (1, 3)))
+
+
+"""
+---- Designs in the unit cube
+"""
+
+
+def latin_hypercube(n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    """n points in [0, 1)^d, one per stratum of every axis."""
+    strata = np.stack([rng.permutation(n) for _ in range(d)], axis=1)
+    return (strata + rng.random((n, d))) / n
+
+
+def _sobol_directions(d: int) -> np.ndarray:
+    """Direction numbers (d, SOBOL_BITS) as integers scaled to SOBOL_BITS bits."""
+    v = np.zeros((d, SOBOL_BITS), dtype=np.uint64)
+    # the first dimension is the van der Corput sequence
+    v[0] = [1 << (SOBOL_BITS - 1 - b) for b in range(SOBOL_BITS)]
+    for dim, (s, a, m) in enumerate(SOBOL_DIRECTIONS[:d - 1], start=1):
+        direction = [m[b] << (SOBOL_BITS - 1 - b) for b in range(s)]
+        for b in range(s, SOBOL_BITS):
+            value = direction[b - s] ^ (direction[b - s] >> s)
+            for k in range(1, s):
+                if (a >> (s - 1 - k)) & 1:
+                    value ^= direction[b - k]
+            direction.append(value)
+        v[dim] = direction
+    return v
+
+
+def sobol(n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    """The first n points of a scrambled Sobol sequence in [0, 1)^d."""
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        qmc = None
+    if qmc is not None:
+        return qmc.Sobol(d, scramble=True, seed=rng).random(n)
+    if d > len(SOBOL_DIRECTIONS) + 1:
+        raise ValueError('Sobol without scipy has direction numbers for up to {} dimensions.'.format(
+            len(SOBOL_DIRECTIONS) + 1))
+    v = _sobol_directions(d)
+    shift = rng.integers(0, 1 << SOBOL_BITS, size=d, dtype=np.uint64)
+    points = np.zeros((n, d))
+    x = np.zeros(d, dtype=np.uint64)
+    for i in range(n):
+        points[i] = (x ^ shift) / float(1 << SOBOL_BITS)
+        # Gray code order: flip the direction of the lowest zero bit of i
+        c = (~i & (i + 1)).bit_length() - 1
+        x ^= v[:, c]
+    return points
+
+
+def design(n: int, method: str = 'lhs', d: int = 3,
+           rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    _rng = np.random.default_rng() if rng is None else rng
+    if method == 'lhs':
+        return latin_hypercube(n, d, _rng)
+    if method == 'sobol':
+        return sobol(n, d, _rng)
+    raise ValueError("Unknown sampling method '{}', expected one of {}.".format(method, METHODS))
+
+
+"""
+---- Scenarios
+"""
+
+
+def spectrum_ranges(handle_minutes_min: float = 8.5, handle_minutes_max: float = 12,
+                    interactions_min: int = 800, interactions_max: int = 1400,
+                    agent_starts_min: int = 20, agent_starts_max: int = 30) -> np.ndarray:
+    """The full_spectrum() ranges, as (low, high) rows of handle seconds, interactions and starts."""
+    return np.array([[int(handle_minutes_min * 60), int(handle_minutes_max * 60)],
+                     [interactions_min, interactions_max],
+                     [agent_starts_min, agent_starts_max]], dtype=float)
+
+
+def to_points(unit: np.ndarray, ranges: np.ndarray) -> list:
+    """
+    Scales unit cube points to (handle seconds, interactions, starts) integer
+        points, every value of each range equally likely. Duplicates are
+        dropped.
+    """
+    low, high = ranges[:, 0], ranges[:, 1]
+    values = np.minimum(np.floor(low + unit * (high - low + 1)), high).astype(int)
+    return list(dict.fromkeys(tuple(int(x) for x in row) for row in values))
+
+
+def scaled(points, ranges: np.ndarray) -> np.ndarray:
+    """Points back in the unit cube, for distances that weigh the axes alike."""
+    low, high = ranges[:, 0], ranges[:, 1]
+    return (np.asarray(points, dtype=float) - low) / np.maximum(high - low, 1)
+
+
+def _init_worker(dist: bool, config: dict) -> None:
+    sm.CONSOLE_LOGGING_LEVEL = 'minimal'
+    # the results come back to the parent, and the workers would interleave
+    #   their lines in log.csv
+    sm.LOG_TO_FILE = False
+    sm.ENABLE_DISTRIBUTIONS = dist
+    # the parent's settings, see simulate.sweep_config()
+    for name, value in config.items():
+        setattr(sm, name.upper(), value)
+
+
+def run_point(job: tuple) -> dict:
+    """Simulates one (handle seconds, interactions, starts) point in a worker."""
+    design_id, point = job
+    handle_seconds, interactions, starts = point
+    sm.HANDLE_TIME_MEAN = handle_seconds / 60
+    sm.INTERACTIONS_MEAN = interactions
+    sm.AGENT_STARTS = starts
+    sm.set_seed(point_seed(design_id, point))
+    day_df = sm.main()
+    asr, util = ((float(day_df['ASR'][0]), float(day_df['Utilization'][0]))
+                 if day_df is not None else (np.nan, np.nan))
+    return {'EHT': round(handle_seconds / 60, 4), 'Interactions': interactions, 'Agent Starts': starts,
+            'ASR': asr, 'Utilization': util}
+
+
+def run_points(pool: concurrent.futures.Executor, design_id: str, points: list,
+               round_number: int) -> pd.DataFrame:
+    rows = list(pool.map(run_point, [(design_id, p) for p in points]))
+    df = pd.DataFrame(rows)
+    df['Round'] = round_number
+    return df
+
+
+"""
+---- Refinement
+"""
+
+
+def steepest_midpoints(df: pd.DataFrame, ranges: np.ndarray, count: int,
+                       asr_goal: float = ASR_GOAL, neighbours: int = NEIGHBOURS) -> list:
+    """
+    Up to count new points halfway along the sample pairs whose ASR changes
+        fastest, skipping points that were already simulated. Pairs on either
+        side of the ASR goal come first, and change is measured in log ASR,
+        otherwise the deeply overloaded corner, where ASR climbs by hours,
+        takes every new sample.
+    """
+    points = df[['EHT', 'Interactions', 'Agent Starts']].to_numpy(dtype=float)
+    points[:, 0] = np.round(points[:, 0] * 60)
+    asr = np.log(np.maximum(df['ASR'].to_numpy(dtype=float), 1e-9))
+    unit = scaled(points, ranges)
+    distance = np.sqrt(((unit[:, None, :] - unit[None, :, :]) ** 2).sum(axis=2))
+    np.fill_diagonal(distance, np.inf)
+    k = min(neighbours, len(points) - 1)
+    if k < 1:
+        return []
+    nearest = np.argsort(distance, axis=1)[:, :k]
+    a = np.repeat(np.arange(len(points)), k)
+    b = nearest.ravel()
+    # each pair once
+    pairs = np.unique(np.sort(np.stack([a, b], axis=1), axis=1), axis=0)
+    a, b = pairs[:, 0], pairs[:, 1]
+    slope = np.abs(asr[a] - asr[b]) / distance[a, b]
+    goal = np.log(asr_goal)
+    straddles = (np.minimum(asr[a], asr[b]) <= goal) & (np.maximum(asr[a], asr[b]) >= goal)
+    order = np.lexsort((-slope, ~straddles))
+
+    seen = {tuple(int(x) for x in p) for p in points}
+    new = []
+    for pair in order:
+        if len(new) >= count:
+            break
+        mid = tuple(int(x) for x in np.round((points[a[pair]] + points[b[pair]]) / 2))
+        if mid not in seen:
+            seen.add(mid)
+            new.append(mid)
+    return new
+
+
+def sample_spectrum(samples: int = SAMPLES, method: str = 'lhs', refine_rounds: int = REFINE_ROUNDS,
+                    refine_samples: Optional[int] = None, ranges: Optional[np.ndarray] = None,
+                    dist: bool = False, seed: Optional[int] = None, asr_goal: float = ASR_GOAL,
+                    workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Simulates a space-filling design over the spectrum ranges, then refines
+        it where ASR changes fastest.
+
+    Returns: one row per scenario, with EHT, Interactions, Agent Starts, ASR,
+        Utilization and the Round that added it (0 for the design).
+    """
+    _ranges = spectrum_ranges() if ranges is None else np.asarray(ranges, dtype=float)
+    _refine = max(1, int(samples * REFINE_FRACTION)) if not refine_samples else refine_samples
+    _workers = os.cpu_count() if not workers else workers
+    config = sm.sweep_config()
+    design_id = make_sweep_id({'sweep': 'sample_spectrum', 'method': method, 'samples': samples,
+                               'ranges': _ranges.tolist(), 'dist': dist, 'seed': seed,
+                               'config': config})
+    rng = np.random.default_rng(seed)
+
+    with concurrent.futures.ProcessPoolExecutor(_workers, initializer=_init_worker,
+                                                initargs=(dist, config)) as pool:
+        df = run_points(pool, design_id, to_points(design(samples, method, 3, rng), _ranges), 0)
+        for r in range(1, refine_rounds + 1):
+            points = steepest_midpoints(df.dropna(subset=['ASR']), _ranges, _refine, asr_goal)
+            if not points:
+                break
+            df = pd.concat([df, run_points(pool, design_id, points, r)], ignore_index=True)
+    return df
+
+
+def interpolate(df: pd.DataFrame, ehts, interactions, starts, ranges: Optional[np.ndarray] = None,
+                neighbours: int = NEIGHBOURS_FIT) -> np.ndarray:
+    """
+    ASR estimated on a regular grid, shaped (eht, interactions, starts) like
+        the result stores and fluid.py. Every grid point gets a plane fitted
+        to log ASR of its nearest samples, weighted by inverse squared
+        distance. Log ASR is close to linear locally even where ASR bends up
+        past capacity.
+    """
+    _ranges = spectrum_ranges() if ranges is None else np.asarray(ranges, dtype=float)
+    known = df.dropna(subset=['ASR'])
+    points = known[['EHT', 'Interactions', 'Agent Starts']].to_numpy(dtype=float)
+    points[:, 0] *= 60
+    values = np.log(np.maximum(known['ASR'].to_numpy(dtype=float), 1e-9))
+    grid = np.stack(np.meshgrid(np.asarray(ehts, dtype=float) * 60, interactions, starts,
+                                indexing='ij'), axis=-1).reshape(-1, 3)
+    unit, grid_unit = scaled(points, _ranges), scaled(grid, _ranges)
+    distance = np.sqrt(((grid_unit[:, None, :] - unit[None, :, :]) ** 2).sum(axis=2))
+    k = min(neighbours, len(points))
+    nearest = np.argsort(distance, axis=1)[:, :k]
+    weights = 1 / np.maximum(np.take_along_axis(distance, nearest, axis=1), 1e-6) ** 2
+    # weighted least squares for every grid point at once, the intercept is the estimate
+    x = np.concatenate([np.ones((len(grid), k, 1)), unit[nearest] - grid_unit[:, None, :]], axis=2)
+    xtw = np.swapaxes(x, 1, 2) * weights[:, None, :]
+    coef = np.linalg.solve(xtw @ x + 1e-9 * np.eye(4), xtw @ values[nearest][..., None])
+    return np.exp(coef[:, 0, 0]).reshape(len(ehts), len(interactions), len(starts))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=SAMPLES)
+    parser.add_argument('--method', choices=METHODS, default='lhs')
+    parser.add_argument('--refine', type=int, default=REFINE_ROUNDS, metavar='ROUNDS')
+    parser.add_argument('--refine-samples', type=int, default=None)
+    parser.add_argument('--goal', type=float, default=ASR_GOAL, help='ASR goal the refinement aims at')
+    parser.add_argument('--eht-min', type=float, default=8.5)
+    parser.add_argument('--eht-max', type=float, default=12)
+    parser.add_argument('--interactions-min', type=int, default=800)
+    parser.add_argument('--interactions-max', type=int, default=1400)
+    parser.add_argument('--starts-min', type=int, default=20)
+    parser.add_argument('--starts-max', type=int, default=30)
+    parser.add_argument('--dist', action='store_true', help='enable distributions')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='sampled_spectrum.csv')
+    args = parser.parse_args()
+
+    ranges = spectrum_ranges(args.eht_min, args.eht_max, args.interactions_min,
+                             args.interactions_max, args.starts_min, args.starts_max)
+    started = time.perf_counter()
+    df = sample_spectrum(args.samples, args.method, args.refine, args.refine_samples, ranges,
+                         args.dist, args.seed, args.goal, args.workers)
+    df.to_csv(args.output, index=False)
+    print('{} scenarios ({} in the design) in {:.1f} s, written to {}'.format(
+        len(df), int((df['Round'] == 0).sum()), time.perf_counter() - started, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
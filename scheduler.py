@@ -0,0 +1,451 @@
+"""
+Prioritized, persistent job queue and worker pool in front of simulate.
+
+Single runs, spectrum sweeps and forecast sweeps used to run on whatever
+thread the GUI's event loop gave them, so a long sweep blocked a quick
+what-if, and closing the app lost anything that hadn't started. Here every
+run is a job in a SQLite database (JOBS_DB), so queued and interrupted work
+survives the app closing, and a pool of worker processes runs the jobs by
+priority, lowest number first, in order of submission within a priority:
+
+    INTERACTIVE   single runs, someone is waiting for the answer
+    BATCH         spectrum and forecast sweeps
+
+Claiming a job is one transaction, so any number of workers, in any number
+of processes, can share a queue.
+
+Sweeps are preempted at scenario boundaries. After every scenario (the
+on_result callback of simulate.full_spectrum()) the worker checks whether a
+job with a better priority has been waiting longer than PREEMPT_GRACE_SECONDS,
+i.e. longer than an idle worker would have taken to claim it. If one has, the
+worker hands its sweep back to the queue and takes that job, in the same
+transaction. The sweep's checkpoint already has every finished scenario, so
+when a worker claims the sweep again it resumes at the next one. A what-if
+therefore waits for at most one scenario of a sweep, about a second.
+
+Workers update a heartbeat as they go. Stopping the pool puts the jobs it
+was running back in the queue, and a job whose worker died without being
+stopped is requeued once its heartbeat is STALE_SECONDS old, by the pool when
+it starts and by every idle worker, at most every RECOVER_SECONDS.
+
+The GUI still runs the sim on its own thread, so it can draw a sweep's
+heatmap as the scenarios come in; the queue is for the CLI and other
+processes.
+
+    queue = JobQueue()
+    job_id = queue.submit('single', {'starts': 22, 'inter_mean': 950})
+    with Scheduler(workers=2):
+        print(queue.result(job_id, wait=60))
+
+Usage:
+    python scheduler.py serve --workers 4
+    python scheduler.py submit single --params '{"starts": 22, "inter_mean": 950}'
+    python scheduler.py submit full_spectrum --params '{"agent_starts_min": 18, "store": true}'
+    python scheduler.py status
+    python scheduler.py result 12
+    python scheduler.py cancel 12
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import multiprocessing
+from typing import Optional, List
+
+
+JOBS_DB = 'jobs.db'
+INTERACTIVE = 0
+BATCH = 10
+KINDS = ('single', 'full_spectrum', 'forecast_spectrum')
+DEFAULT_PRIORITY = {'single': INTERACTIVE, 'full_spectrum': BATCH, 'forecast_spectrum': BATCH}
+STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+# idle workers look for work this often
+POLL_SECONDS = .25
+PREEMPT_GRACE_SECONDS = 1.0
+# a running job's heartbeat and preemption check, at most this often
+CHECK_SECONDS = .5
+STALE_SECONDS = 120
+# how often an idle worker looks for jobs with a stale heartbeat
+RECOVER_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    worker TEXT,
+    heartbeat REAL,
+    scenarios INTEGER NOT NULL DEFAULT 0,
+    preemptions INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, priority, id);
+"""
+
+
+class Preempted(Exception):
+    """A sweep gave way to a better job, which the worker runs next."""
+
+    def __init__(self, next_job: Optional[dict]):
+        super().__init__('preempted')
+        self.next_job = next_job
+
+
+class Cancelled(Exception):
+    """The job was cancelled while it ran."""
+
+
+"""
+---- The queue
+"""
+
+
+class JobQueue:
+    """
+    The job database. Every method is its own transaction, so one JobQueue
+        per process is enough and the GUI, workers and CLI can all share
+        the file.
+    """
+
+    def __init__(self, path: str = JOBS_DB):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        # readers don't block the writer, and the other way round
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _transaction(self):
+        """BEGIN IMMEDIATE takes the write lock up front, so two claims can't interleave."""
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def submit(self, kind: str, params: Optional[dict] = None, priority: Optional[int] = None) -> int:
+        """Queues a job. Returns: int, the job ID."""
+        if kind not in KINDS:
+            raise ValueError("Unknown job kind '{}', expected one of {}.".format(kind, KINDS))
+        _priority = DEFAULT_PRIORITY[kind] if priority is None else priority
+        cursor = self.db.execute(
+            'INSERT INTO jobs (kind, params, priority, submitted) VALUES (?, ?, ?, ?)',
+            (kind, json.dumps(params if params else {}), _priority, time.time()))
+        return cursor.lastrowid
+
+    def status(self, job_id: int) -> dict:
+        row = self.db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            raise KeyError('No job {}.'.format(job_id))
+        return _job(row)
+
+    def jobs(self, states: Optional[List[str]] = None) -> List[dict]:
+        """Jobs in the given states (default all), in the order they would run."""
+        _states = list(STATES) if not states else list(states)
+        rows = self.db.execute(
+            'SELECT * FROM jobs WHERE state IN ({}) ORDER BY priority, id'.format(
+                ','.join('?' * len(_states))), _states).fetchall()
+        return [_job(row) for row in rows]
+
+    def result(self, job_id: int, wait: Optional[float] = None):
+        """
+        A finished job's result, waiting up to wait seconds for it.
+            Raises RuntimeError if the job failed or was cancelled, and
+            TimeoutError if it isn't done in time.
+        """
+        deadline = time.time() + (wait if wait else 0)
+        while True:
+            job = self.status(job_id)
+            if job['state'] == 'done':
+                return job['result']
+            if job['state'] in ('failed', 'cancelled'):
+                raise RuntimeError('Job {} {}: {}'.format(job_id, job['state'], job['error']))
+            if time.time() >= deadline:
+                raise TimeoutError('Job {} is {}.'.format(job_id, job['state']))
+            time.sleep(POLL_SECONDS / 2)
+
+    def cancel(self, job_id: int) -> None:
+        """Cancels a queued job now, or a running one at its next scenario."""
+        db = self._transaction()
+        db.execute("UPDATE jobs SET state = 'cancelled', finished = ?, error = 'cancelled' "
+                   "WHERE id = ? AND state = 'queued'", (time.time(), job_id))
+        db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND state = 'running'",
+                   (job_id,))
+        db.execute('COMMIT')
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """Takes the best queued job for worker. Returns: the job, or None."""
+        db = self._transaction()
+        try:
+            job = self._claim_next(db, worker)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return job
+
+    def _claim_next(self, db, worker: str, better_than: Optional[int] = None,
+                    queued_before: Optional[float] = None) -> Optional[dict]:
+        query = "SELECT * FROM jobs WHERE state = 'queued'"
+        args = []
+        if better_than is not None:
+            query += ' AND priority < ? AND submitted < ?'
+            args += [better_than, queued_before]
+        row = db.execute(query + ' ORDER BY priority, id LIMIT 1', args).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        db.execute("UPDATE jobs SET state = 'running', worker = ?, started = COALESCE(started, ?), "
+                   "heartbeat = ? WHERE id = ?", (worker, now, now, row['id']))
+        return dict(_job(row), state='running', worker=worker)
+
+    def checkin(self, job: dict, worker: str, scenarios: int = 0):
+        """
+        A running job's heartbeat, at a scenario boundary. Returns: the job
+            to switch to if a better one has been waiting too long, else None.
+            Raises Cancelled if the job was cancelled.
+        """
+        db = self._transaction()
+        try:
+            now = time.time()
+            db.execute('UPDATE jobs SET heartbeat = ?, scenarios = scenarios + ? WHERE id = ?',
+                       (now, scenarios, job['id']))
+            cancelled = db.execute('SELECT cancel_requested FROM jobs WHERE id = ?',
+                                   (job['id'],)).fetchone()[0]
+            next_job = None
+            if not cancelled:
+                next_job = self._claim_next(db, worker, job['priority'], now - PREEMPT_GRACE_SECONDS)
+                if next_job is not None:
+                    db.execute("UPDATE jobs SET state = 'queued', worker = NULL, "
+                               "preemptions = preemptions + 1 WHERE id = ?", (job['id'],))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        if cancelled:
+            raise Cancelled()
+        return next_job
+
+    def finish(self, job_id: int, result) -> None:
+        self.db.execute("UPDATE jobs SET state = 'done', finished = ?, result = ? WHERE id = ?",
+                        (time.time(), json.dumps(result, default=str), job_id))
+
+    def fail(self, job_id: int, error: str, state: str = 'failed') -> None:
+        self.db.execute('UPDATE jobs SET state = ?, finished = ?, error = ? WHERE id = ?',
+                        (state, time.time(), error, job_id))
+
+    def release(self, worker: str) -> int:
+        """Requeues the jobs a stopped worker was running. Returns: how many."""
+        cursor = self.db.execute("UPDATE jobs SET state = 'queued', worker = NULL "
+                                 "WHERE state = 'running' AND worker = ?", (worker,))
+        return cursor.rowcount
+
+    def recover(self, stale_seconds: float = STALE_SECONDS) -> int:
+        """Requeues running jobs whose worker stopped checking in. Returns: how many."""
+        cursor = self.db.execute(
+            "UPDATE jobs SET state = 'queued', worker = NULL WHERE state = 'running' "
+            "AND heartbeat < ?", (time.time() - stale_seconds,))
+        return cursor.rowcount
+
+
+def _job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    return job
+
+
+"""
+---- Workers
+"""
+
+
+def run_job(queue: JobQueue, job: dict, worker: str):
+    """Runs one job in this process. Returns: the job's result, JSON-able."""
+    import simulate as sm
+    sm.CONSOLE_LOGGING_LEVEL = 'minimal'
+    params = dict(job['params'])
+    if job['kind'] == 'single':
+        day_df = sm.single_run(**params)
+        if day_df is None:
+            raise RuntimeError('The run failed, see the worker output.')
+        return {c: day_df[c][0].item() if hasattr(day_df[c][0], 'item') else day_df[c][0]
+                for c in day_df.columns if not c.endswith('Label')}
+
+    last_check = [time.perf_counter()]
+    done_since = [0]
+
+    def on_result(point: tuple, day_df) -> None:
+        done_since[0] += 1
+        now = time.perf_counter()
+        if now - last_check[0] < CHECK_SECONDS:
+            return
+        last_check[0] = now
+        next_job = queue.checkin(job, worker, done_since[0])
+        done_since[0] = 0
+        if next_job is not None:
+            raise Preempted(next_job)
+
+    sweep = sm.full_spectrum if job['kind'] == 'full_spectrum' else sm.forecast_spectrum
+    sweep_id = sweep(on_result=on_result, **params)
+    queue.checkin(job, worker, done_since[0])
+    return {'sweep_id': sweep_id,
+            'store': sm.store_path(sweep_id) if params.get('store') else None}
+
+
+def worker_name(pid: Optional[int] = None) -> str:
+    return '{}:{}'.format(socket.gethostname(), os.getpid() if pid is None else pid)
+
+
+def worker_loop(path: str = JOBS_DB, stop=None) -> None:
+    """Claims and runs jobs until stop (a multiprocessing.Event) is set."""
+    worker = worker_name()
+    queue = JobQueue(path)
+    job = None
+    last_recover = time.perf_counter()
+    try:
+        while stop is None or not stop.is_set():
+            if job is None:
+                job = queue.claim(worker)
+                if job is None:
+                    if time.perf_counter() - last_recover >= RECOVER_SECONDS:
+                        # a worker that died mid-job leaves it running for good otherwise
+                        queue.recover()
+                        last_recover = time.perf_counter()
+                    time.sleep(POLL_SECONDS)
+                    continue
+            try:
+                result = run_job(queue, job, worker)
+            except Preempted as p:
+                job = p.next_job
+                continue
+            except Cancelled:
+                queue.fail(job['id'], 'cancelled', state='cancelled')
+            except Exception as e:
+                queue.fail(job['id'], '{}: {}'.format(type(e).__name__, e))
+            else:
+                queue.finish(job['id'], result)
+            job = None
+    finally:
+        queue.close()
+
+
+class Scheduler:
+    """
+    A pool of worker processes on a job database.
+
+    workers - number of processes, defaults to the CPU count
+    """
+
+    def __init__(self, path: str = JOBS_DB, workers: Optional[int] = None):
+        self.path = path
+        self.workers = os.cpu_count() if not workers else workers
+        self.processes = []
+        self.stop_event = multiprocessing.Event()
+
+    def start(self) -> 'Scheduler':
+        queue = JobQueue(self.path)
+        requeued = queue.recover()
+        queue.close()
+        if requeued:
+            print('Requeued', requeued, 'jobs that were running when their worker stopped.')
+        self.stop_event.clear()
+        self.processes = [multiprocessing.Process(target=worker_loop, args=(self.path, self.stop_event),
+                                                  daemon=True)
+                          for _ in range(self.workers)]
+        for p in self.processes:
+            p.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = 5) -> None:
+        """
+        Stops the workers. A worker that is still running a job after timeout
+            is terminated and its job goes back in the queue, a sweep resumes
+            from its checkpoint.
+        """
+        self.stop_event.set()
+        queue = JobQueue(self.path)
+        for p in self.processes:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+            queue.release(worker_name(p.pid))
+        queue.close()
+        self.processes = []
+
+    def __enter__(self) -> 'Scheduler':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def print_jobs(jobs: List[dict]) -> None:
+    print('{:>5}  {:<18}{:>9}  {:<10}{:>10}{:>8}  {}'.format(
+        'ID', 'kind', 'priority', 'state', 'scenarios', 'preempt', 'worker'))
+    for job in jobs:
+        print('{:>5}  {:<18}{:>9}  {:<10}{:>10}{:>8}  {}'.format(
+            job['id'], job['kind'], job['priority'], job['state'], job['scenarios'],
+            job['preemptions'], job['worker'] if job['worker'] else ''))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=JOBS_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='run a worker pool until interrupted')
+    serve.add_argument('--workers', type=int, default=None)
+    submit = commands.add_parser('submit', help='queue a job')
+    submit.add_argument('kind', choices=KINDS)
+    submit.add_argument('--params', default='{}', help='JSON keyword arguments for simulate')
+    submit.add_argument('--priority', type=int, default=None)
+    status = commands.add_parser('status', help='list jobs, or show one')
+    status.add_argument('job_id', type=int, nargs='?')
+    result = commands.add_parser('result', help='print a job result')
+    result.add_argument('job_id', type=int)
+    result.add_argument('--wait', type=float, default=0)
+    cancel = commands.add_parser('cancel', help='cancel a job')
+    cancel.add_argument('job_id', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        scheduler = Scheduler(args.db, args.workers).start()
+        print('Running', scheduler.workers, 'workers on', args.db, '- Ctrl+C to stop.')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            scheduler.stop()
+        return 0
+
+    queue = JobQueue(args.db)
+    if args.command == 'submit':
+        print(queue.submit(args.kind, json.loads(args.params), args.priority))
+    elif args.command == 'status':
+        if args.job_id is None:
+            print_jobs(queue.jobs())
+        else:
+            print(json.dumps(queue.status(args.job_id), indent=2, default=str))
+    elif args.command == 'result':
+        print(json.dumps(queue.result(args.job_id, args.wait), indent=2, default=str))
+    elif args.command == 'cancel':
+        queue.cancel(args.job_id)
+    queue.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Local simulation service over HTTP/JSON.
+
+Lets spreadsheets, dashboards and scripts ask for simulated ASR without the
+GUI. Simulations run in a pool of worker processes, so any number of clients
+can query at once without blocking each other.
+
+    GET  /health
+    GET  /stats
+    GET  /single-run?starts=20&interactions=1000&eht=9.91
+    POST /sweep             {"eht_min": 9, "eht_max": 10, "eht_step": .5,
+                             "interactions_min": 900, "interactions_max": 1100,
+                             "interactions_step": 100, "starts_min": 18, "starts_max": 22}
+    GET  /staffing-target?interactions=1000&eht=9.91&asr_goal=30
+
+Every endpoint takes its parameters either in the query string or as a JSON
+body. Scenario parameters: starts, interactions, eht (minutes), and
+optionally dist (randomize volume and EHT), handle_dist (see
+handle_times.py), engine ('simpy' or 'queue') and seed.
+
+A scenario is identified by its normalized parameters. Identical requests
+that arrive while the scenario is running wait on the same future instead of
+running it again, and finished scenarios are served from an LRU cache. Runs
+are seeded (seed defaults to 0), so a cached answer is the answer a fresh
+run would give.
+
+Usage:
+    python service.py --port 8765 --workers 4
+"""
+
+import sys
+import json
+import math
+import asyncio
+import argparse
+import collections
+import concurrent.futures
+import urllib.parse
+from typing import Optional
+
+
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_SIZE = 4096
+MAX_SWEEP_SCENARIOS = 5000
+MAX_BODY_BYTES = 1 << 20
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+"""
+---- Worker side, runs in the pool processes
+"""
+
+
+def _init_worker() -> None:
+    import simulate as sm
+    sm.CONSOLE_LOGGING_LEVEL = 'minimal'
+    # results go back to the client, and the workers would interleave their
+    #   lines in log.csv and grow LOG_BUFFER for as long as the service runs
+    sm.LOG_TO_FILE = False
+
+
+def finite(value: float) -> Optional[float]:
+    """The value, or None (null in JSON) when it is NaN or infinite."""
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def run_scenario(scenario: tuple) -> dict:
+    """Simulates one day for a normalized scenario (see normalize())."""
+    import simulate as sm
+
+    params = dict(scenario)
+    sm.ENGINE = params['engine']
+    sm.ENABLE_DISTRIBUTIONS = params['dist']
+    sm.HANDLE_TIME_DIST = params['handle_dist']
+    sm.AGENT_STARTS = params['starts']
+    sm.INTERACTIONS_MEAN = params['interactions']
+    sm.HANDLE_TIME_MEAN = params['eht']
+    sm.set_seed(params['seed'])
+    day_df = sm.simulate_day()
+    return {
+        'starts': params['starts'],
+        'interactions': int(day_df['Interactions Today'][0]),
+        'eht': params['eht'],
+        'handled': int(day_df['Interactions Handled'][0]),
+        # NaN when nobody was handled
+        'asr': finite(day_df['ASR'][0]),
+        'utilization': finite(day_df['Utilization'][0]),
+        'backlog': len(sm.CUSTOMERS_WAITING),
+    }
+
+
+"""
+---- Request handling
+"""
+
+
+class BadRequest(Exception):
+    pass
+
+
+def normalize(params: dict) -> tuple:
+    """
+    Validates the scenario parameters and returns them as a hashable, sorted
+        tuple, so the same scenario always has the same key.
+    """
+    try:
+        scenario = {
+            'starts': int(params['starts']),
+            'interactions': int(round(float(params['interactions']))),
+            'eht': round(float(params['eht']), 4),
+            'dist': str(params.get('dist', False)).lower() in ('1', 'true', 'yes'),
+            'handle_dist': str(params.get('handle_dist', 'fixed')),
+            'engine': str(params.get('engine', 'simpy')),
+            'seed': int(params.get('seed', 0)),
+        }
+    except KeyError as e:
+        raise BadRequest("Missing parameter {}.".format(e))
+    except (TypeError, ValueError) as e:
+        raise BadRequest("Bad parameter: {}".format(e))
+    if scenario['starts'] < 1 or scenario['interactions'] <= 0 or scenario['eht'] <= 0:
+        raise BadRequest("starts must be at least 1, interactions and eht positive.")
+    if scenario['engine'] not in ('simpy', 'queue'):
+        raise BadRequest("engine must be 'simpy' or 'queue'.")
+    if scenario['handle_dist'] not in ('fixed', 'lognormal', 'gamma', 'empirical'):
+        raise BadRequest("Unknown handle_dist '{}'.".format(scenario['handle_dist']))
+    return tuple(sorted(scenario.items()))
+
+
+def frange(start: float, stop: float, step: float) -> list:
+    if step <= 0:
+        raise BadRequest("Steps must be positive.")
+    count = int(round((stop - start) / step)) + 1
+    return [round(start + i * step, 4) for i in range(max(count, 0))]
+
+
+class SimulationService:
+    """Runs scenarios on a process pool, with coalescing and an LRU cache."""
+
+    def __init__(self, workers: Optional[int] = None, cache_size: int = CACHE_SIZE):
+        self.pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker)
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.in_flight = {}
+        self.stats = {'requests': 0, 'runs': 0, 'cache_hits': 0, 'coalesced': 0}
+
+    async def scenario(self, key: tuple) -> dict:
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return self.cache[key]
+        if key in self.in_flight:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, run_scenario, key)
+        self.in_flight[key] = future
+        self.stats['runs'] += 1
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            del self.in_flight[key]
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    async def single_run(self, params: dict) -> dict:
+        return await self.scenario(normalize(params))
+
+    async def sweep(self, params: dict) -> dict:
+        try:
+            ehts = frange(float(params['eht_min']), float(params['eht_max']),
+                          float(params.get('eht_step', .5)))
+            volumes = range(int(params['interactions_min']), int(params['interactions_max']) + 1,
+                            int(params.get('interactions_step', 50)))
+            starts = range(int(params['starts_min']), int(params['starts_max']) + 1)
+        except KeyError as e:
+            raise BadRequest("Missing parameter {}.".format(e))
+        except ValueError as e:
+            raise BadRequest("Bad parameter: {}".format(e))
+        keys = [normalize(dict(params, eht=e, interactions=v, starts=s))
+                for e in ehts for v in volumes for s in starts]
+        if len(keys) > MAX_SWEEP_SCENARIOS:
+            raise BadRequest("Sweep has {} scenarios, the limit is {}.".format(
+                len(keys), MAX_SWEEP_SCENARIOS))
+        results = await asyncio.gather(*(self.scenario(k) for k in keys))
+        return {'scenarios': len(results), 'results': results}
+
+    async def staffing_target(self, params: dict) -> dict:
+        """
+        Fewest agent starts that keep the day's ASR at or under asr_goal,
+            found with a binary search (ASR goes down as starts go up). A day
+            with no ASR (nobody handled) misses the goal.
+        """
+        try:
+            goal = float(params['asr_goal'])
+            low = int(params.get('starts_min', 1))
+            high = int(params.get('starts_max', 200))
+        except KeyError as e:
+            raise BadRequest("Missing parameter {}.".format(e))
+        except ValueError as e:
+            raise BadRequest("Bad parameter: {}".format(e))
+
+        best = await self.scenario(normalize(dict(params, starts=high)))
+        if best['asr'] is None or best['asr'] > goal:
+            return {'feasible': False, 'asr_goal': goal, 'result': best}
+        while low < high:
+            middle = (low + high) // 2
+            result = await self.scenario(normalize(dict(params, starts=middle)))
+            if result['asr'] is not None and result['asr'] <= goal:
+                high, best = middle, result
+            else:
+                low = middle + 1
+        return {'feasible': True, 'asr_goal': goal, 'starts': high, 'result': best}
+
+    async def handle(self, method: str, path: str, params: dict) -> tuple:
+        """Returns (status code, JSON-able body)."""
+        routes = {
+            '/single-run': self.single_run,
+            '/sweep': self.sweep,
+            '/staffing-target': self.staffing_target,
+        }
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/stats':
+            return 200, dict(self.stats, cached=len(self.cache), in_flight=len(self.in_flight))
+        if path not in routes:
+            return 404, {'error': "No endpoint {}.".format(path)}
+        if method not in ('GET', 'POST'):
+            return 405, {'error': "Use GET or POST."}
+        self.stats['requests'] += 1
+        try:
+            return 200, await routes[path](params)
+        except BadRequest as e:
+            return 400, {'error': str(e)}
+
+    async def serve_client(self, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> None:
+        try:
+            status, body = await self.read_request(reader)
+            # NaN is not JSON, results send null instead
+            payload = json.dumps(body, allow_nan=False).encode('utf-8')
+        except Exception as e:
+            status = 500
+            payload = json.dumps({'error': repr(e)}).encode('utf-8')
+        head = ('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n'
+                'Content-Length: {}\r\nConnection: close\r\n\r\n').format(
+                    status, STATUS_TEXT.get(status, ''), len(payload))
+        writer.write(head.encode('ascii') + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def read_request(self, reader: asyncio.StreamReader) -> tuple:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) < 2:
+            return 400, {'error': "Malformed request."}
+        method, target = request_line[0].upper(), request_line[1]
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        url = urllib.parse.urlsplit(target)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_BODY_BYTES:
+            return 413, {'error': "Request body is too large."}
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                return 400, {'error': "Body is not valid JSON."}
+            if not isinstance(body, dict):
+                return 400, {'error': "Body must be a JSON object."}
+            params.update(body)
+        return await self.handle(method, url.path, params)
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def serve(host: str = HOST, port: int = PORT, workers: Optional[int] = None) -> None:
+    service = SimulationService(workers)
+    server = await asyncio.start_server(service.serve_client, host, port)
+    print("Simulation service listening on http://{}:{}".format(host, port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
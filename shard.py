@@ -0,0 +1,484 @@
+"""
+Sharded sweeps, run by any number of workers through a shared folder.
+
+A sweep that is too big for one workstation is split into shards of grid
+points, and each shard is written as a work item into a shared directory
+(a network drive works). Workers on any machine claim shards, simulate them,
+and write one result file per shard. A merge step then combines the shard
+results into one result set.
+
+Layout of a sweep, under <root>/<sweep id>/:
+    sweep.json   the sweep parameters
+    pending/     shards waiting for a worker
+    claimed/     shards a worker is running, as <shard>.<owner token>.json.
+                 The file's modification time is the worker's lease, it is
+                 renewed after every scenario.
+    done/        shards that finished
+    failed/      shards that raised an error, with the traceback
+    results/     <shard>.csv with one row per scenario
+
+Claiming is an os.rename() from pending/ to claimed/. A rename is atomic, so
+when two workers go for the same shard one of them gets FileNotFoundError and
+moves on to the next. The claimed name carries a token unique to the claim,
+so a worker only renews or finishes its own claim: if its lease ran out and
+the shard was claimed again, its file is gone and it lets the shard go. A
+worker that dies leaves its shard in claimed/, and once its lease has not
+been renewed for LEASE_SECONDS any worker moves it back to pending/. Idle
+workers keep polling every POLL_SECONDS until every shard is done or failed,
+so shards held by workers that died are picked up when their leases expire.
+Every scenario is seeded from the sweep ID and its grid point, so a shard
+that runs twice writes the same results, and results are written
+atomically, so a half finished shard never shows up in the merge. Workers
+don't append to their local log.csv, the shard results are the record.
+Leases use file times, so the machines' clocks should roughly agree.
+
+Usage:
+    python shard.py create --root S:/sweeps --sweep forecast --forecast 949,934,986
+    python shard.py work --root S:/sweeps --sweep-id 1a2b3c4d5e6f
+    python shard.py status --root S:/sweeps --sweep-id 1a2b3c4d5e6f
+    python shard.py merge --root S:/sweeps --sweep-id 1a2b3c4d5e6f --output sweep.csv
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import hashlib
+import argparse
+import traceback
+from typing import Optional, List
+import pandas as pd
+from checkpoint import make_sweep_id, _fsync_dir
+
+
+SHARD_ROOT = 'shards'
+SHARD_SIZE = 50
+# seconds a claimed shard can go without a lease renewal before it is requeued
+LEASE_SECONDS = 15 * 60
+# seconds an idle worker waits between looks for work
+POLL_SECONDS = 30
+STATES = ('pending', 'claimed', 'done', 'failed')
+SHARD_EXTENSION = '.json'
+
+
+class LeaseLost(Exception):
+    """The shard was requeued while this worker was running it."""
+
+
+"""
+---- Grids
+    The grid points are generated in the same order as the loops in
+    simulate.full_spectrum() and simulate.forecast_spectrum().
+"""
+
+
+def full_spectrum_params(repeat_count: int = 1, dist: bool = False,
+                         handle_minutes_min: float = 8.5, handle_minutes_max: float = 12,
+                         step_minutes: float = .5, handle_stdev: float = .083,
+                         interactions_min: int = 800, interactions_max: int = 1400,
+                         interactions_step: int = 50, inter_stdev: int = 40,
+                         agent_starts_min: int = 20, agent_starts_max: int = 30,
+                         config: Optional[dict] = None) -> dict:
+    """config: the sim's settings from simulate.sweep_config(), the workers use them."""
+    return {
+        'sweep': 'full_spectrum', 'repeat_count': repeat_count, 'dist': dist,
+        'handle_seconds': [int(handle_minutes_min * 60), int(handle_minutes_max * 60),
+                           int(step_minutes * 60)],
+        'handle_stdev': handle_stdev,
+        'interactions': [interactions_min, interactions_max, interactions_step],
+        'inter_stdev': inter_stdev,
+        'agent_starts': [agent_starts_min, agent_starts_max],
+        'config': config,
+    }
+
+
+def forecast_spectrum_params(interaction_forecast: List[float], repeat_count: int = 1,
+                             dist: bool = False, handle_minutes_min: float = 8.5,
+                             handle_minutes_max: float = 12, step_minutes: float = .5,
+                             handle_stdev: float = .083, agent_starts_min: int = 20,
+                             agent_starts_max: int = 30,
+                             config: Optional[dict] = None) -> dict:
+    return {
+        'sweep': 'forecast_spectrum', 'repeat_count': repeat_count, 'dist': dist,
+        'interaction_forecast': [float(x) for x in interaction_forecast],
+        'handle_seconds': [int(handle_minutes_min * 60), int(handle_minutes_max * 60),
+                           int(step_minutes * 60)],
+        'handle_stdev': handle_stdev,
+        'agent_starts': [agent_starts_min, agent_starts_max],
+        'config': config,
+    }
+
+
+def grid_points(params: dict) -> list:
+    """
+    Every grid point of the sweep, in sweep order.
+        full_spectrum: (handle seconds, interactions, agent starts, repetition)
+        forecast_spectrum: (day, handle seconds, agent starts, repetition)
+    """
+    start, stop, step = params['handle_seconds']
+    starts_min, starts_max = params['agent_starts']
+    repeats = range(params['repeat_count'])
+    if params['sweep'] == 'full_spectrum':
+        i_min, i_max, i_step = params['interactions']
+        return [(i, j, k, l)
+                for i in range(start, stop + 1, step)
+                for j in range(i_min, i_max + 1, i_step)
+                for k in range(starts_min, starts_max + 1)
+                for l in repeats]
+    return [(day, j, k, l)
+            for day in range(len(params['interaction_forecast']))
+            for j in range(start, stop + 1, step)
+            for k in range(starts_min, starts_max + 1)
+            for l in repeats]
+
+
+def point_seed(sweep_id: str, point: tuple) -> int:
+    """Seed for one scenario, the same on every machine and every rerun."""
+    blob = '{}:{}'.format(sweep_id, ','.join(str(x) for x in point))
+    return int(hashlib.sha1(blob.encode('utf-8')).hexdigest()[:8], 16)
+
+
+"""
+---- Files
+"""
+
+
+def sweep_dir(root: str, sweep_id: str) -> str:
+    return os.path.join(root, sweep_id)
+
+
+def shard_name(index: int) -> str:
+    return 'shard-{:05d}'.format(index)
+
+
+def write_atomic(path: str, text: str) -> None:
+    """
+    Writes the file through a temporary file that is swapped in, so readers
+        only ever see a complete file. The temporary name is unique to this
+        process, so two workers writing the same path don't collide.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, worker_id())
+    with open(tmp_path, 'w', newline='') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+def worker_id() -> str:
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
+
+
+def create(params: dict, root: str = SHARD_ROOT, shard_size: int = SHARD_SIZE) -> str:
+    """
+    Splits the sweep into shards and queues them. Creating the same sweep
+        again only adds the shards that don't exist yet in any state.
+
+    Returns: str, the sweep ID.
+    """
+    sweep_id = make_sweep_id(params)
+    base = sweep_dir(root, sweep_id)
+    for state in STATES + ('results',):
+        os.makedirs(os.path.join(base, state), exist_ok=True)
+    write_atomic(os.path.join(base, 'sweep.json'),
+                 json.dumps({'sweep_id': sweep_id, 'params': params, 'shard_size': shard_size}))
+
+    points = grid_points(params)
+    existing = set()
+    for state in STATES:
+        existing.update(f.split('.')[0] for f in os.listdir(os.path.join(base, state)))
+    for index, first in enumerate(range(0, len(points), shard_size)):
+        name = shard_name(index)
+        if name in existing:
+            continue
+        item = {'shard': name, 'points': points[first:first + shard_size]}
+        write_atomic(os.path.join(base, 'pending', name + SHARD_EXTENSION), json.dumps(item))
+    return sweep_id
+
+
+def load_sweep(root: str, sweep_id: str) -> dict:
+    with open(os.path.join(sweep_dir(root, sweep_id), 'sweep.json'), 'r') as f:
+        return json.load(f)
+
+
+def owner_token() -> str:
+    """Unique to one claim, the worker ID plus a random part. Has no dots."""
+    return '{}-{}'.format(worker_id(), uuid.uuid4().hex[:8]).replace('.', '_')
+
+
+def claimed_name(name: str, token: str) -> str:
+    """pending/shard-00001.json is claimed as claimed/shard-00001.<token>.json"""
+    return '{}.{}{}'.format(name[:-len(SHARD_EXTENSION)], token, SHARD_EXTENSION)
+
+
+def unclaimed_name(name: str) -> str:
+    """The pending or done name of a claimed shard file."""
+    return name.split('.')[0] + SHARD_EXTENSION
+
+
+def claim(root: str, sweep_id: str) -> Optional[str]:
+    """
+    Claims the first pending shard under a new owner token.
+
+    Returns: path of the claimed shard file, or None if nothing is pending.
+    """
+    base = sweep_dir(root, sweep_id)
+    for name in sorted(os.listdir(os.path.join(base, 'pending'))):
+        if not name.endswith(SHARD_EXTENSION):
+            continue
+        claimed = os.path.join(base, 'claimed', claimed_name(name, owner_token()))
+        try:
+            os.rename(os.path.join(base, 'pending', name), claimed)
+        except FileNotFoundError:
+            # another worker got there first
+            continue
+        renew(claimed)
+        return claimed
+    return None
+
+
+def renew(claimed: str) -> None:
+    """
+    Extends the lease on a claimed shard. The path has the claim's owner
+        token, so once the shard is requeued it no longer exists, even if
+        another worker has claimed the shard again.
+    """
+    try:
+        os.utime(claimed)
+    except FileNotFoundError:
+        raise LeaseLost(claimed)
+
+
+def requeue_expired(root: str, sweep_id: str, lease_seconds: float = LEASE_SECONDS) -> int:
+    """
+    Moves shards whose lease ran out back to pending/.
+
+    Returns: int, the number of shards requeued.
+    """
+    base = sweep_dir(root, sweep_id)
+    now = time.time()
+    requeued = 0
+    for name in os.listdir(os.path.join(base, 'claimed')):
+        claimed = os.path.join(base, 'claimed', name)
+        try:
+            expired = now - os.path.getmtime(claimed) > lease_seconds
+            if expired:
+                os.rename(claimed, os.path.join(base, 'pending', unclaimed_name(name)))
+                requeued += 1
+        except FileNotFoundError:
+            # finished or requeued by someone else in the meantime
+            continue
+    return requeued
+
+
+def finish(claimed: str, state: str) -> bool:
+    """
+    Moves a claimed shard to done/ or failed/, if this worker still holds it.
+
+    Returns: bool, False if the lease ran out and the shard was requeued. Its
+        results are still good, the next run of the shard finds them.
+    """
+    base = os.path.dirname(os.path.dirname(claimed))
+    name = unclaimed_name(os.path.basename(claimed))
+    try:
+        os.rename(claimed, os.path.join(base, state, name))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+"""
+---- Running
+"""
+
+
+def run_point(sm, params: dict, sweep_id: str, point: tuple) -> pd.DataFrame:
+    """Simulates one grid point the way the spectrum sweeps do."""
+    sm.LOG_TO_FILE = False
+    # the settings of the machine that created the sweep, see simulate.sweep_config()
+    for name, value in (params.get('config') or {}).items():
+        setattr(sm, name.upper(), value)
+    sm.ENABLE_DISTRIBUTIONS = params['dist']
+    sm.HANDLE_TIME_STDEV = params['handle_stdev']
+    if params['sweep'] == 'full_spectrum':
+        handle_seconds, interactions, starts, rep = point
+        sm.INTERACTIONS_STDEV = params['inter_stdev']
+    else:
+        day, handle_seconds, starts, rep = point
+        interactions = params['interaction_forecast'][day]
+    sm.HANDLE_TIME_MEAN = handle_seconds / 60
+    sm.INTERACTIONS_MEAN = interactions
+    sm.AGENT_STARTS = starts
+    sm.set_seed(point_seed(sweep_id, point))
+    return sm.simulate_day()
+
+
+def run_shard(sm, claimed: str, sweep: dict) -> None:
+    """Runs every point of a claimed shard and writes the shard's results."""
+    with open(claimed, 'r') as f:
+        item = json.load(f)
+    base = os.path.dirname(os.path.dirname(claimed))
+    result_path = os.path.join(base, 'results', item['shard'] + '.csv')
+    if os.path.exists(result_path):
+        # finished by a worker whose lease had already run out
+        return
+
+    params = sweep['params']
+    point_columns = (['handle_seconds', 'interactions', 'agent_starts', 'rep']
+                     if params['sweep'] == 'full_spectrum'
+                     else ['day', 'handle_seconds', 'agent_starts', 'rep'])
+    rows = []
+    for point in item['points']:
+        day_df = run_point(sm, params, sweep['sweep_id'], tuple(point))
+        row = dict(zip(point_columns, point))
+        row.update({c: day_df[c][0] for c in day_df.columns if not c.endswith('Label')})
+        rows.append(row)
+        renew(claimed)
+    write_atomic(result_path, pd.DataFrame(rows).to_csv(index=False))
+
+
+def work(root: str, sweep_id: str, lease_seconds: float = LEASE_SECONDS,
+         max_shards: Optional[int] = None, poll_seconds: float = POLL_SECONDS) -> int:
+    """
+    Claims and runs shards until every shard is done or failed. While the
+        other shards are claimed by other workers it waits, polling every
+        poll_seconds, and takes over the ones whose lease runs out.
+
+    Returns: int, the number of shards this worker completed.
+    """
+    import simulate as sm
+
+    sweep = load_sweep(root, sweep_id)
+    completed = 0
+    while max_shards is None or completed < max_shards:
+        claimed = claim(root, sweep_id)
+        if claimed is None:
+            if requeue_expired(root, sweep_id, lease_seconds) > 0:
+                continue
+            counts = status(root, sweep_id)
+            if counts['pending'] == 0 and counts['claimed'] == 0:
+                break
+            time.sleep(poll_seconds)
+            continue
+        name = unclaimed_name(os.path.basename(claimed))
+        try:
+            run_shard(sm, claimed, sweep)
+        except LeaseLost:
+            print("Lost the lease on", name, "- another worker has it.")
+            continue
+        except Exception as e:
+            print("Shard", name, "failed.")
+            traceback.print_exception(e)
+            failed_log = os.path.join(sweep_dir(root, sweep_id), 'failed', name + '.log')
+            if finish(claimed, 'failed'):
+                write_atomic(failed_log, ''.join(traceback.format_exception(e)))
+            continue
+        if not finish(claimed, 'done'):
+            print("Lost the lease on", name, "- its results are kept for the next run.")
+            continue
+        completed += 1
+        print("Finished", name)
+    return completed
+
+
+def status(root: str, sweep_id: str) -> dict:
+    """Number of shards in each state."""
+    base = sweep_dir(root, sweep_id)
+    return {state: len([f for f in os.listdir(os.path.join(base, state))
+                        if f.endswith(SHARD_EXTENSION)])
+            for state in STATES}
+
+
+def merge(root: str, sweep_id: str, output: Optional[str] = None) -> pd.DataFrame:
+    """
+    Combines the shard results into one dataframe in grid order, and writes it
+        to output if given. Warns about shards that have no results yet.
+    """
+    base = sweep_dir(root, sweep_id)
+    sweep = load_sweep(root, sweep_id)
+    total = -(-len(grid_points(sweep['params'])) // sweep['shard_size'])
+    frames = []
+    missing = []
+    for index in range(total):
+        path = os.path.join(base, 'results', shard_name(index) + '.csv')
+        if os.path.exists(path):
+            frames.append(pd.read_csv(path))
+        else:
+            missing.append(shard_name(index))
+    if missing:
+        print("Warning:", len(missing), "of", total, "shards have no results yet.")
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if output:
+        write_atomic(output, df.to_csv(index=False))
+    return df
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('create', 'work', 'status', 'requeue', 'merge'))
+    parser.add_argument('--root', default=SHARD_ROOT)
+    parser.add_argument('--sweep-id', default=None)
+    parser.add_argument('--sweep', choices=('full', 'forecast'), default='full')
+    parser.add_argument('--forecast', default=None, help='comma separated daily interactions')
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--dist', action='store_true')
+    parser.add_argument('--handle-min', type=float, default=8.5)
+    parser.add_argument('--handle-max', type=float, default=12)
+    parser.add_argument('--step', type=float, default=.5)
+    parser.add_argument('--inter-min', type=int, default=800)
+    parser.add_argument('--inter-max', type=int, default=1400)
+    parser.add_argument('--inter-step', type=int, default=50)
+    parser.add_argument('--starts-min', type=int, default=20)
+    parser.add_argument('--starts-max', type=int, default=30)
+    parser.add_argument('--lease', type=float, default=LEASE_SECONDS)
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS,
+                        help='seconds between looks for work while other workers hold shards')
+    parser.add_argument('--max-shards', type=int, default=None)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        import simulate as sm
+        config = sm.sweep_config()
+        if args.sweep == 'forecast':
+            if not args.forecast:
+                parser.error("--forecast is needed for a forecast sweep")
+            params = forecast_spectrum_params(
+                [float(x) for x in args.forecast.split(',')], args.repeat, args.dist,
+                args.handle_min, args.handle_max, args.step,
+                agent_starts_min=args.starts_min, agent_starts_max=args.starts_max,
+                config=config)
+        else:
+            params = full_spectrum_params(
+                args.repeat, args.dist, args.handle_min, args.handle_max, args.step,
+                interactions_min=args.inter_min, interactions_max=args.inter_max,
+                interactions_step=args.inter_step, agent_starts_min=args.starts_min,
+                agent_starts_max=args.starts_max, config=config)
+        sweep_id = create(params, args.root, args.shard_size)
+        print("Sweep", sweep_id, "queued:", status(args.root, sweep_id))
+        return 0
+
+    if not args.sweep_id:
+        parser.error("--sweep-id is needed for '{}'".format(args.command))
+    if args.command == 'work':
+        import simulate as sm
+        sm.CONSOLE_LOGGING_LEVEL = 'minimal'
+        print("Completed", work(args.root, args.sweep_id, args.lease, args.max_shards,
+                                    args.poll), "shards.")
+    elif args.command == 'status':
+        print(status(args.root, args.sweep_id))
+    elif args.command == 'requeue':
+        print("Requeued", requeue_expired(args.root, args.sweep_id, args.lease), "shards.")
+    else:
+        df = merge(args.root, args.sweep_id, args.output)
+        print(len(df), "scenarios merged.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
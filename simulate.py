@@ -68,7 +68,18 @@ import pandas as pd
 import datetime
 import csv
 import math
-from typing import Optional, List
+import gc
+import contextlib
+from array import array
+from typing import Optional, List, Iterator, Callable
+import profiler
+import tracer
+import arrivals
+import handle_times
+import staffing
+import queue_engine
+from checkpoint import SweepCheckpoint, make_sweep_id
+from result_store import ResultStore, store_path
 
 
 """ Global vars
@@ -79,7 +90,14 @@ minutes later when data is recorded/displayed.
 
 # Console logging can be set to 'verbose', 'normal', or 'minimal'
 CONSOLE_LOGGING_LEVEL = 'minimal'
+# derived from CONSOLE_LOGGING_LEVEL by set_console_flags() at the start of
+#   each day, so the hot path checks a bool instead of comparing strings.
+VERBOSE = False
+CONSOLE_OUTPUT = False
 LOG_BUFFER = ""
+# log_data() appends every day to log.csv and LOG_BUFFER. Off for callers that
+#   keep their own results, e.g. service.py's worker processes.
+LOG_TO_FILE = True
 
 """
 ------- Set these vars based on current real world data
@@ -99,6 +117,25 @@ INTERACTIONS_STDEV = 40
 #   our heaviest volumes
 HANDLE_TIME_MEAN = 9.91
 HANDLE_TIME_STDEV = .083
+# spread of the individual interactions' handle times around the day's EHT:
+#   'fixed', 'lognormal', 'gamma' or 'empirical' (see handle_times.py)
+HANDLE_TIME_DIST = 'fixed'
+# coefficient of variation (stdev / mean) for 'lognormal' and 'gamma'. The
+#   agent-day EHTs in the VSC statistics export have a CV of about .5
+HANDLE_TIME_CV = .5
+# spread of the agents' speeds. Each agent's own handle time relative to the
+#   day's EHT is drawn from one of the handle time distributions
+#   ('empirical' resamples the agent-day EHTs in the VSC statistics export),
+#   the agent's service rate is its inverse, and the day's rates are scaled
+#   to a mean of 1, so the spread changes who handles what but not the
+#   center's capacity. 'fixed' is every agent the same.
+#   Anything else runs the day on the queue engine even when ENGINE is
+#   'simpy', because simpy's Resource can't tell its agents apart. The first
+#   such day prints a warning.
+AGENT_RATE_DIST = 'fixed'
+AGENT_RATE_CV = .3
+# set by warn_rate_engine(), so the warning is printed once
+RATE_ENGINE_WARNED = False
 # dictionary for setting the proportion of customer interactions that come
 #   in for each hour.
 #       Must add up to 1
@@ -116,6 +153,63 @@ AGENT_PORTIONS = {
     '12': .84, '13': .75, '14': .57, '15': .4, '16': .31, '17': .22,
     '18': .22, '19': .13, '20': .09, '21': .09, '22': .04, '23': .04
 }
+# how the day's arrival times are generated (see arrivals.py):
+#   'exact' gives exactly INTERACTIONS_TODAY arrivals, 'poisson' draws them
+#   from a non-homogeneous Poisson process that follows WORK_PORTIONS.
+ARRIVAL_MODE = 'exact'
+# optional weights for equal slices of each hour, e.g. [.3, .3, .2, .2] for 
+#   quarter hours. Can also be a dict keyed like WORK_PORTIONS. None spreads
+#   each hour's work evenly.
+SUB_HOUR_PROFILE = None
+# multi-day runs (see simulate_days()) scale the day's interactions and agent
+#   starts by these factors for the day of the week. Set them from history,
+#   e.g. weekend volume relative to a weekday.
+WEEKDAY_VOLUME_FACTORS = {
+    'Mon': 1.0, 'Tue': 1.0, 'Wed': 1.0, 'Thu': 1.0, 'Fri': 1.0, 'Sat': 1.0, 'Sun': 1.0
+}
+WEEKDAY_STAFFING_FACTORS = {
+    'Mon': 1.0, 'Tue': 1.0, 'Wed': 1.0, 'Thu': 1.0, 'Fri': 1.0, 'Sat': 1.0, 'Sun': 1.0
+}
+# keys of the weekday factors, in date.weekday() order
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+# which engine simulates the day:
+#   'simpy' - one simpy process per customer, hour by hour. Traces and hourly
+#       console output show every step. Time grows with the customers waiting
+#       each hour, fine for a single site (~1,000 interactions, ~20 starts).
+#   'queue' - scale mode for consolidated multi-site days (e.g. 50,000
+#       interactions, 1,000 agent starts). Runs the whole day at once with
+#       queue_engine.py in O(n log n) time for n interactions, and O(1) memory
+#       per agent. Takes the same inputs and fills the same outputs, but the
+#       results differ where customers wait across an hour boundary:
+#       simpy restarts every hour with the customers still waiting or in
+#       service, and a customer whose help was cut off by the hour only
+#       resumes if an agent is free at the top of the next hour, otherwise
+#       they wait again and start over. The queue engine never interrupts
+#       anyone, agents going off shift finish their customer first. So with
+#       a backlog simpy handles fewer customers and reports a higher ASR,
+#       e.g. 1000 interactions, 20 starts, 9.91 min EHT: simpy 62.2 min with
+#       976 handled, queue 57.97 with 990. Without a backlog they agree.
+#       tests/test_engines.py holds them to 10% of ASR.
+ENGINE = 'simpy'
+ENGINES = ('simpy', 'queue')
+# correction factors, fitted to historical days by calibrate.py:
+#   VOLUME_CORRECTION scales the day's interactions when arrivals are drawn
+#       (the old interval-based arrivals needed 1.0112 for rounding, exact
+#       arrivals don't)
+#   STAFFING_SCALE scales AGENT_PORTIONS, for agents working more or less of
+#       the plan than it says
+#   UTILIZATION_CORRECTION and UTILIZATION_CLAMP, utilization over the clamp
+#       is reported as 1.0 (see get_utilization())
+VOLUME_CORRECTION = 1.0
+STAFFING_SCALE = 1.0
+UTILIZATION_CORRECTION = 1.0
+UTILIZATION_CLAMP = .95
+# every setting above that changes a day's results, other than the ones a
+#   sweep varies or sets itself, see sweep_config()
+SWEEP_SETTINGS = ('WORK_PORTIONS', 'AGENT_PORTIONS', 'STAFFING_SCALE', 'ENGINE',
+                  'HANDLE_TIME_DIST', 'HANDLE_TIME_CV', 'AGENT_RATE_DIST', 'AGENT_RATE_CV',
+                  'ARRIVAL_MODE', 'SUB_HOUR_PROFILE', 'VOLUME_CORRECTION',
+                  'UTILIZATION_CORRECTION', 'UTILIZATION_CLAMP')
 
 
 """
@@ -123,14 +217,20 @@ AGENT_PORTIONS = {
      DO NOT hardcode these variables.
 """
 START = datetime.datetime.now()
-AGENT_NO = 0
-# tracks the agents currently working
-#   key is int tracking the agent that is starting
-AGENTS_WORKING = {}
+# random number generator for the vectorized stages, reseed with set_seed()
+RNG = np.random.default_rng()
+# the day's compiled staffing plan (see staffing.py), set by set_staffing_plan()
+STAFFING = None
+# number of agents working the current hour
+AGENTS_ON_SHIFT = 0
 # tracks the number of agents that are available to work the rest of the day
 BENCH = -1
 # this is set for the day by the setter function
 INTERACTIONS_TODAY = 0
+# arrival times of the day's customers in seconds since midnight, sorted
+ARRIVALS = np.zeros(0)
+# index into ARRIVALS of the first arrival in each hour (25 entries)
+ARRIVAL_HOURS = np.zeros(25, dtype=int)
 # Customer interaction intervals are on a normal dist based on trailing 30 day
 #   data
 # CUSTOMER_INTERVAL = 33 # how often customer interactions flow in, cases/
@@ -139,25 +239,66 @@ CUSTOMER_INTERVAL = 0
 HOUR_INTERVAL = 0
 # tracks the current customer number
 CUSTOMER_NUM = 0
+# last customer number of the previous day, when customers carry over between
+#   days the day's first customer is FIRST_CUSTOMER + 1
+FIRST_CUSTOMER = 0
 # 60 seconds * 60 minutes = 1 hour
 SIM_TIME = 60 * 60
+DAY_SECONDS = 24 * SIM_TIME
 CURRENT_HOUR = 0
-WAIT_TIMES = []
+# speed to respond of each customer handled today, in seconds. A typed array
+#   stores 8 bytes per customer instead of a float object and a list slot.
+WAIT_TIMES = array('d')
 CUSTOMERS_HANDLED = 0
 CURRENT_HOUR = 0
 # set by a setter, based on the mean and stdev given. will be represented in seconds.
 HANDLE_TIME = -1
-# 2d list containing the customers waiting at any given time.
-# each element is a list of size 2, where:
-# [0] is the name
-# [1] is the time they entered the waiting queue, relative to the beginning of the hour
-CUSTOMERS_WAITING = []
-# 2d list where each element is a list [customer name, env time that help began]
-CUSTOMERS_BEING_HELPED = []
+# handle time of each of the day's customers in seconds, indexed by customer
+#   number - FIRST_CUSTOMER - 1. Drawn around HANDLE_TIME by set_service_times().
+SERVICE_TIMES = np.zeros(0)
+# the customers waiting (or being helped) at any given time, keyed by 
+#   customer name, in the order they arrived. Each value is a WaitingCustomer.
+# A dict so adding and removing a customer is O(1) however long the queue gets.
+CUSTOMERS_WAITING = {}
+# customers being helped, customer name -> seconds before the end of the hour
+#   that help began
+CUSTOMERS_BEING_HELPED = {}
+# customer processes started in the current hour, closed by end_hour()
+HOUR_CUSTOMERS = []
 # the wait times for the customers that did not get processed last hour
 RESIDUAL_WAIT_TIMES = []
 # most recent customer to enter the waiting queue, who was already in the queue when the hour started.
 PREV_HOUR_CUTOFF_CUST = 0
+# the day's event trace (see tracer.py), None unless tracing is enabled
+TRACE = None
+# metrics recorded for every hour of the day, in HOURLY's column order:
+#   agents working, new arrivals, interactions handled, customers waiting or
+#   being helped at the end of the hour, and the ASR of the interactions 
+#   handled in the hour (minutes)
+HOURLY_METRICS = ('agents_working', 'arrivals', 'handled', 'backlog', 'asr')
+HOURLY = np.full((24, len(HOURLY_METRICS)), np.nan)
+# service rate of every agent the queue engine puts on shift, in the order
+#   they come on, None when AGENT_RATE_DIST is 'fixed'
+AGENT_RATES = None
+# per-agent results of the last queue engine day (see agent_stats_to_df())
+AGENT_STATS = None
+
+
+class WaitingCustomer:
+    """
+    Entry in CUSTOMERS_WAITING. Uses __slots__, so each waiting customer costs
+        three fields instead of a list and its boxed items.
+
+    name - customer number
+    waited - seconds from entering the waiting queue until the end of the hour
+    handle_time - seconds it takes to help them
+    """
+    __slots__ = ('name', 'waited', 'handle_time')
+
+    def __init__(self, name: int, waited: float, handle_time: float):
+        self.name = name
+        self.waited = waited
+        self.handle_time = handle_time
 
 
 class CallCenter:
@@ -166,23 +307,33 @@ class CallCenter:
     Container for an env, staff resources, and handle time 
     """
 
-    def __init__(self, env: simpy.Environment, num_employees: int, handle_time: int):
+    def __init__(self, env: simpy.Environment, num_employees: int, handle_time: int,
+                 agent_ids: Optional[List[int]] = None):
         self.env = env
         self.staff = simpy.Resource(env, num_employees)
         self.support_time = handle_time
+        # agent numbers that are not helping anyone, only used for tracing
+        self.free_agents = list(agent_ids) if agent_ids else list(range(num_employees))
+
+    def claim_agent(self) -> int:
+        """Takes a free agent number for a customer that was just given staff."""
+        return self.free_agents.pop() if self.free_agents else -2
+
+    def release_agent(self, agent: int) -> None:
+        self.free_agents.append(agent)
 
     def support(self, customer: int, opt_handle_time: int = None):
         # time it takes to handle a call.
         if opt_handle_time == None:
             yield self.env.timeout(self.support_time)
-            if CONSOLE_LOGGING_LEVEL == 'verbose':
+            if VERBOSE:
                 print(
                     f"Support finished for {customer} at {self.env.now/60:.2f}")
         # if an argument for the handle time is not given, use the global
         #   handle time. Else use the given handle time.
         else:
             yield self.env.timeout(opt_handle_time)
-            if CONSOLE_LOGGING_LEVEL == 'verbose':
+            if VERBOSE:
                 print(
                     f"Support finished for {customer} at {self.env.now/60:.2f}")
 
@@ -202,125 +353,79 @@ def set_handle_time() -> None:
         HANDLE_TIME = int(HANDLE_TIME_MEAN * 60)
 
 
-def set_agents_working(hour: int = 12) -> None:
+def set_staffing_plan() -> None:
     """
-    Setter for AGENTS_WORKING
-    This will be used to determine how many agents are working, each time the
-        simulation simulates an hour.
+    Setter for STAFFING. Plans are memoized per (AGENT_STARTS, AGENT_PORTIONS),
+        so this is only computed once per staffing level in a sweep.
+    """
+    global STAFFING
 
-    TODO: make the number of employees returned dynamic, based on the number 
-            of total agent starts and the time of day.
+    STAFFING = staffing.compile_staffing(AGENT_STARTS, scaled_portions(AGENT_PORTIONS))
+
+
+def set_agent_rates() -> None:
+    """
+    Setter for AGENT_RATES, draws a service rate for every agent of the day.
+    Assumes:
+        STAFFING has been set.
     """
+    global AGENT_RATES
 
-    global CURRENT_HOUR, AGENT_NO, AGENTS_WORKING, BENCH
-    # simplified version
-    # AGENTS_WORKING = 18
+    AGENT_RATES = draw_agent_rates(STAFFING.on_shift, RNG)
 
-    # filling the bench
-    if CURRENT_HOUR == 0:
-        # subtracting 1 to account for the night agent
-        BENCH = AGENT_STARTS - 1
 
-    # setting up AGENTS_WORKING for off hours
-    # if it's earler than 3 am, night agent from previous day will be working
-    if CURRENT_HOUR < 3:
-        if CURRENT_HOUR == 0:
-            add_agent(4, -1)
-        else:
-            decrement_agent_hours_left()
+def draw_agent_rates(on_shift, rng: Optional[np.random.Generator] = None,
+                     dist: Optional[str] = None, cv: Optional[float] = None) -> Optional[np.ndarray]:
+    """
+    Service rates for every agent number queue_engine.run_day() gives out
+        for this staffing. dist and cv default to AGENT_RATE_DIST and
+        AGENT_RATE_CV, so tools that run days on the queue engine themselves
+        (risk.py, optimize.py, calibrate.py) spread the agents like the sim.
 
-    # if it's later than 9 pm
-    elif CURRENT_HOUR > 21:
-        # if it's 10 pm, there is one agent and they have 2 hours left
-        if CURRENT_HOUR == 22:
-            AGENTS_WORKING = {-1: 2}
-        else:
-            decrement_agent_hours_left()
+    Returns: float array with a mean of 1, or None for 'fixed'.
+    """
+    _dist = AGENT_RATE_DIST if dist is None else dist
+    _cv = AGENT_RATE_CV if cv is None else cv
+    if _dist == 'fixed':
+        return None
+    count = queue_engine.agents_needed(on_shift)
+    rates = 1 / handle_times.sample(count, 1.0, _dist, _cv, rng=rng)
+    # the mean rate is 1, so the agents together work as fast as the same number at EHT
+    return rates / rates.mean()
 
-    # hours between 3 am and 9 pm inclusive
-    else:
-        previous_agent_count = get_agents_working_count()
-        decrement_agent_hours_left()
-        ideal_agents_working = int(
-            AGENT_STARTS * AGENT_PORTIONS[str(CURRENT_HOUR)])
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
-            print("Ideal number of agents working:", ideal_agents_working)
-        ideal_agents_added = ideal_agents_working - previous_agent_count
-
-        # case where staff and caseload are ramping up
-        if ideal_agents_working > get_agents_working_count():
-            # case where there are enough agents on the bench to fill the needed workcload
-            if ideal_agents_added <= BENCH:
-                for i in range(ideal_agents_added):
-                    add_agent()
-
-            # case where there are not enough on the bench for ideal workload
-            elif ideal_agents_added > BENCH:
-                for i in range(BENCH):
-                    add_agent()
-
-    if CONSOLE_LOGGING_LEVEL != 'minimal': print("On bench:", BENCH)
-    # for agent in AGENTS_WORKING:
-    #     print("Agent", agent, "has", AGENTS_WORKING[agent], "hours left." )
-
-    # case where there are not enough agents and so capacity is running at
-    #   minimum
-    if AGENTS_WORKING == 0:
-        if CONSOLE_LOGGING_LEVEL != 'minimal': print("You ran out of agent resources. Work is now running with 1 staff resource.")
-        AGENTS_WORKING = 1
-
-
-def add_agent(hours_left: int = 8, this_agent: int = 0) -> None:
-    """
-    Adds one agent to the dict of currently working agents.
-        if this_agnet variable is left default it means that this is the first
-        agent of the day (technically started yesterday), which is why the 
-        AGENT_NO does not get incremented.
-    """
-
-    global AGENT_NO
-    global AGENTS_WORKING
-    global BENCH
-    # default adds an agent to AGENTS_WORKING
-    if this_agent == 0:
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
-            print("Added agent", AGENT_NO, "to AGENTS_WORKING, with",
-                  hours_left, "hours left.")
-        AGENT_NO += 1
-        AGENTS_WORKING[AGENT_NO] = hours_left
-        BENCH -= 1
-    # adds specific agent
-    else:
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
-            print("Added agent", this_agent,
-                  "to AGENTS_WORKING, with", hours_left, "hours left.")
-        AGENTS_WORKING[this_agent] = hours_left
 
+def scaled_portions(agent_portions: dict, scale: Optional[float] = None) -> dict:
+    """AGENT_PORTIONS scaled by STAFFING_SCALE (or the given scale)."""
+    _scale = STAFFING_SCALE if scale is None else scale
+    if _scale == 1.0:
+        return agent_portions
+    return {h: p * _scale for h, p in agent_portions.items()}
 
-def decrement_agent_hours_left() -> None:
+
+def set_agents_working(hour: int = 12) -> None:
     """
-    Subtracts an hour from the time each agent has left to work
-    if the time they have left is 0, it removes them.
+    Setter for AGENTS_ON_SHIFT
+    This will be used to determine how many agents are working, each time the
+        simulation simulates an hour.
+    Assumes: 
+        STAFFING has been set.
+        CURRENT_HOUR has been set.
     """
-    global AGENTS_WORKING
+    global AGENTS_ON_SHIFT, BENCH
 
-    for i in tuple(AGENTS_WORKING):
-        try:
-            if AGENTS_WORKING[i] == 0:
-                del AGENTS_WORKING[i]
-            else:
-                AGENTS_WORKING[i] -= 1
-        except:
-            print("Error: Out of bounds", i, "for AGENTS_WORKING dict.")
-            continue
+    AGENTS_ON_SHIFT = int(STAFFING.on_shift[CURRENT_HOUR])
+    BENCH = int(STAFFING.bench[CURRENT_HOUR])
+    if VERBOSE:
+        print("Agents starting this hour:", STAFFING.new_agents[CURRENT_HOUR])
+    if CONSOLE_OUTPUT: print("On bench:", BENCH)
 
 
 def get_agents_working_count() -> int:
     """
-    Getter for AGENTS WORKING
+    Getter for AGENTS_ON_SHIFT
     """
-    if CONSOLE_LOGGING_LEVEL != 'minimal': print("Agents working:", len(AGENTS_WORKING))
-    return len(AGENTS_WORKING)
+    if CONSOLE_OUTPUT: print("Agents working:", AGENTS_ON_SHIFT)
+    return AGENTS_ON_SHIFT
 
 
 def day_customer_interval(hour: int = 12) -> int:
@@ -344,6 +449,8 @@ def day_customer_interval(hour: int = 12) -> int:
 def hour_customer_interval(hour: int = 12) -> int:
     """
     Provides the interval upon which the work comes in for a given hour.
+    No longer used by simulate_day(), which takes its arrivals from
+        set_arrivals(). Kept for comparison with older results.
     Assumes: 
         INTERACTIONS_TODAY has been set.
         CURRENT_HOUR has been set.
@@ -357,15 +464,51 @@ def hour_customer_interval(hour: int = 12) -> int:
     # correction_coefficient = 1
     interactions_this_hour = int(
         (INTERACTIONS_TODAY * WORK_PORTIONS[str(CURRENT_HOUR)]) * correction_coefficient)
-    if CONSOLE_LOGGING_LEVEL == 'verbose':
+    if VERBOSE:
         print("Interactions for hour", CURRENT_HOUR,
               " are:", interactions_this_hour)
     HOUR_INTERVAL = int(3600 / interactions_this_hour)
-    if CONSOLE_LOGGING_LEVEL == 'verbose':
+    if VERBOSE:
         print("Customer interval for this hour is:", HOUR_INTERVAL, "seconds.")
     return HOUR_INTERVAL
 
 
+def set_arrivals() -> None:
+    """
+    Setter for ARRIVALS, generates every arrival of the day in one go.
+    Assumes: 
+        INTERACTIONS_TODAY has been set.
+    """
+    global ARRIVALS, ARRIVAL_HOURS
+
+    ARRIVALS = arrivals.day_arrivals(INTERACTIONS_TODAY * VOLUME_CORRECTION, WORK_PORTIONS,
+                                     ARRIVAL_MODE, SUB_HOUR_PROFILE, RNG)
+    ARRIVAL_HOURS = arrivals.hour_slices(ARRIVALS)
+    if VERBOSE:
+        print("Arrivals per hour:", np.diff(ARRIVAL_HOURS).tolist())
+
+
+def set_service_times() -> None:
+    """
+    Setter for SERVICE_TIMES, draws a handle time for every arrival of the day.
+    Assumes: 
+        HANDLE_TIME and ARRIVALS have been set.
+    """
+    global SERVICE_TIMES
+
+    SERVICE_TIMES = handle_times.sample(len(ARRIVALS), HANDLE_TIME, HANDLE_TIME_DIST,
+                                        HANDLE_TIME_CV, rng=RNG)
+
+
+def set_seed(seed: Optional[int] = None) -> None:
+    """Seeds every random number generator the sim uses, for repeatable runs."""
+    global RNG
+
+    random.seed(seed)
+    np.random.seed(seed)
+    RNG = np.random.default_rng(seed)
+
+
 def set_interactions_today() -> None:
     global INTERACTIONS_TODAY
 
@@ -377,20 +520,28 @@ def set_interactions_today() -> None:
         INTERACTIONS_TODAY = INTERACTIONS_MEAN
 
 
-def customer(env: simpy.Environment, call_center: CallCenter, wait_time: int = 0) -> None:
+def customer(env: simpy.Environment, call_center: CallCenter, wait_time: int = 0,
+             name: Optional[int] = None, handle_time: Optional[float] = None) -> None:
     """ 
     Represents a customer interaction
 
     wait_time: int representing the number of seconds the customer has been 
         waiting.
+    name: customer number. Only given for customers carried over from the
+        previous hour, new customers take the next CUSTOMER_NUM.
+    handle_time: seconds it takes to help this customer, defaults to the 
+        customer's entry in SERVICE_TIMES.
     """
     global CUSTOMERS_HANDLED, CUSTOMERS_WAITING, CUSTOMER_NUM, CUSTOMERS_BEING_HELPED
 
     # print("Current day: ", get_day(env))
-    CUSTOMER_NUM += 1
-    name = CUSTOMER_NUM
+    if name is None:
+        CUSTOMER_NUM += 1
+        name = CUSTOMER_NUM
+    if handle_time is None:
+        handle_time = SERVICE_TIMES[name - FIRST_CUSTOMER - 1]
     wait_start = (env.now - wait_time)
-    if CONSOLE_LOGGING_LEVEL == 'verbose':
+    if VERBOSE:
         print(f"Customer {name} enters waiting queue at {wait_start/60:.2f}!")
     # adding a customer to the list waiting
     # 2d array that holds the cust name, their wait time if they are still in
@@ -398,8 +549,8 @@ def customer(env: simpy.Environment, call_center: CallCenter, wait_time: int = 0
 
     # only add cust to waiting if they were not already waiting
     if wait_start >= 0:
-        CUSTOMERS_WAITING.append([name, SIM_TIME - wait_start])
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
+        CUSTOMERS_WAITING[name] = WaitingCustomer(name, SIM_TIME - wait_start, handle_time)
+        if VERBOSE:
             print(
                 f"CUSTOMERS_WAITING size after adding customer = {len(CUSTOMERS_WAITING)}")
         # print_customers_waiting()
@@ -407,46 +558,49 @@ def customer(env: simpy.Environment, call_center: CallCenter, wait_time: int = 0
     with call_center.staff.request() as request:
         yield request
 
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
+        service_start = env.now
+        if TRACE is not None:
+            agent = call_center.claim_agent()
+        if VERBOSE:
             print(f"Customer {name} enterscall at {env.now/60:.2f}")
-        # add customer to the being-helped list
-        if len(CUSTOMERS_BEING_HELPED) == 0:
-            CUSTOMERS_BEING_HELPED.append([name, int(SIM_TIME - env.now)])
-
-        elif name < CUSTOMERS_BEING_HELPED[0][0] or name > CUSTOMERS_BEING_HELPED[-1][0]:
-            CUSTOMERS_BEING_HELPED.append([name, int(SIM_TIME - env.now)])
+        # add customer to the being-helped list, customers carried over from
+        #   last hour are already on it.
+        helped = CUSTOMERS_BEING_HELPED.get(name)
+        if helped is None:
+            helped = int(SIM_TIME - env.now)
+            CUSTOMERS_BEING_HELPED[name] = helped
 
         # if customer was already being helped, subtract the time they've been helped from the
-        #   time it takes to help them. Otherwise use the global handle time.
-        if env.now == 0:
-            for cust in CUSTOMERS_BEING_HELPED:
-                # if cust is being helped and they didn't enter queue at the beginning of this hour:
-                if cust[0] == name:
-                    if cust[1] != 3600:
-                        yield env.process(call_center.support(name, HANDLE_TIME - cust[1]))
-                        break
-
-                    else:
-                        yield env.process(call_center.support(name))
-
+        #   time it takes to help them. Otherwise use their full handle time.
+        if env.now == 0 and helped != 3600:
+            # help started last hour, helped seconds before it ended
+            service_start = -helped
+            yield env.process(call_center.support(name, handle_time - helped))
         else:
-            yield env.process(call_center.support(name))
+            # a carried over customer who had to wait again starts over
+            CUSTOMERS_BEING_HELPED[name] = int(SIM_TIME - env.now)
+            yield env.process(call_center.support(name, handle_time))
 
         wait_end = env.now
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
+        if VERBOSE:
             print(f"Customer {name} left call at {env.now/60:.2f}")
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
+        if VERBOSE:
             print(
-                f"Removing customer {CUSTOMERS_WAITING[0][0]} from waiting array")
-        CUSTOMERS_WAITING.pop(0)
-        CUSTOMERS_BEING_HELPED.pop(0)
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
+                f"Removing customer {name} from waiting array")
+        CUSTOMERS_WAITING.pop(name, None)
+        CUSTOMERS_BEING_HELPED.pop(name, None)
+        if VERBOSE:
             print(
                 f"CUSTOMERS_WAITING size after removing customer = {len(CUSTOMERS_WAITING)}")
 
         speed_to_respond = wait_end - wait_start
         WAIT_TIMES.append(speed_to_respond)
-        if CONSOLE_LOGGING_LEVEL == 'verbose':
+        if TRACE is not None:
+            call_center.release_agent(agent)
+            day_offset = CURRENT_HOUR * SIM_TIME
+            TRACE.record(name, day_offset + wait_start, day_offset + service_start,
+                         day_offset + wait_end, agent)
+        if VERBOSE:
             print(f"Speed to respond: {speed_to_respond / 60:.2f}")
         CUSTOMERS_HANDLED += 1
 
@@ -454,118 +608,349 @@ def customer(env: simpy.Environment, call_center: CallCenter, wait_time: int = 0
 def print_customers_waiting() -> None:
     global CUSTOMERS_WAITING
 
-    if CONSOLE_LOGGING_LEVEL != 'minimal': 
+    if CONSOLE_OUTPUT: 
         print("Waiting: [ ", end="")
-        for cust in CUSTOMERS_WAITING:
-            print(" [ ", end="")
-            for i in cust:
-                print(f" {i} ", end="")
-            print(" ] ", end="")
+        for cust in CUSTOMERS_WAITING.values():
+            print(f" [ {cust.name} {cust.waited} {cust.handle_time} ] ", end="")
         print(" ]")
 
 
 def run_sim(env: simpy.Environment, num_employees: int, handle_time: int,
-            customer_interval: int, waiting: int = 2) -> None:
+            hour_arrivals: np.ndarray) -> None:
     """
     Runs the simulation, simulates one hour per execution. 
+
+    hour_arrivals: arrival times of the new customers this hour, in seconds
+        from the start of the hour.
     """
     global CUSTOMERS_WAITING
     global CUSTOMER_NUM
     global PREV_HOUR_CUTOFF_CUST
 
-    # this is used so that customers who have been waiting more than
-    #   1 hour can have another hour added to their wait time.
-    first_customer_this_hour = CUSTOMER_NUM + len(CUSTOMERS_WAITING) + 1
-    if CONSOLE_LOGGING_LEVEL == 'verbose':
-        print(f"First customer this hour: {first_customer_this_hour}")
-
     # accounting for additional hours that customers have been waiting
-    try:
-        for i in range(first_customer_this_hour - 1):
-            CUSTOMERS_WAITING[i][1] += 3600
-
-    except:
-        pass
+    for cust in CUSTOMERS_WAITING.values():
+        cust.waited += 3600
 
     # showing the customers waiting
-    if CONSOLE_LOGGING_LEVEL != 'minimal': print("Customers waiting:", len(CUSTOMERS_WAITING))
+    if CONSOLE_OUTPUT: print("Customers waiting:", len(CUSTOMERS_WAITING))
 
+    # agent numbers are only needed to label the event trace
+    agent_ids = STAFFING.agent_ids(CURRENT_HOUR) if TRACE is not None else None
     # avoids the error where you run out of employee resources
     if num_employees == 0:
-        call_center = CallCenter(env, 1, handle_time)
+        call_center = CallCenter(env, 1, handle_time, agent_ids)
     else:
-        call_center = CallCenter(env, num_employees, handle_time)
+        call_center = CallCenter(env, num_employees, handle_time, agent_ids)
 
-    # the range is the number of customers that are already waiting
-    # for 5 waiting, you would do range(1,6)
-    if len(CUSTOMERS_WAITING) == 0:
-        for i in range(1, 2):
-            env.process(customer(env, call_center))
+    # customers that are already waiting keep their name and handle time
+    for cust in list(CUSTOMERS_WAITING.values()):
+        process = customer(env, call_center, cust.waited - 3600, cust.name, cust.handle_time)
+        HOUR_CUSTOMERS.append(process)
+        env.process(process)
 
-    else:
-        for i in range(1, len(CUSTOMERS_WAITING)+1):
-            env.process(customer(env,  call_center,
-                                 CUSTOMERS_WAITING[i-1][1] - 3600))
+    for arrival in hour_arrivals.tolist():
+        yield env.timeout(arrival - env.now)
+        process = customer(env, call_center)
+        HOUR_CUSTOMERS.append(process)
+        env.process(process)
 
-    while True:
-        yield env.timeout(random.randint(customer_interval - 1,
-                                         customer_interval + 1))
 
-        try:
-            i += 1
-        except:
-            i = 1
+def end_hour() -> None:
+    """
+    Frees the hour's environment. The customer processes still suspended when 
+        it stops are closed (the customers themselves carry over in 
+        CUSTOMERS_WAITING), and the environment's reference cycles are 
+        collected now with a young generation pass, instead of piling up over
+        the day until a full collection. 
+    """
+    global HOUR_CUSTOMERS
+
+    for process in HOUR_CUSTOMERS:
+        process.close()
+    HOUR_CUSTOMERS = []
+    gc.collect(1)
+
+
+def record_hour(waits_before: int) -> int:
+    """
+    Fills CURRENT_HOUR's row of HOURLY at the end of a simpy hour.
 
-        this_customer = customer(env, call_center)
-        env.process(this_customer)
-        # if env.now() == SIM_TIME:
+    waits_before: len(WAIT_TIMES) at the start of the hour.
+
+    Returns: len(WAIT_TIMES) now, for the next hour.
+    """
+    waits = np.frombuffer(WAIT_TIMES)[waits_before:] if len(WAIT_TIMES) else np.zeros(0)
+    HOURLY[CURRENT_HOUR] = (AGENTS_ON_SHIFT,
+                            ARRIVAL_HOURS[CURRENT_HOUR + 1] - ARRIVAL_HOURS[CURRENT_HOUR],
+                            len(waits), len(CUSTOMERS_WAITING),
+                            waits.mean() / 60 if len(waits) else np.nan)
+    return len(WAIT_TIMES)
+
+
+def record_hours(arrival_times: np.ndarray, ends: np.ndarray) -> None:
+    """Fills every row of HOURLY from the queue engine's times, vectorized."""
+    done = ends <= DAY_SECONDS
+    end_hours = np.minimum(ends[done] // SIM_TIME, 23).astype(int)
+    handled = np.bincount(end_hours, minlength=24)
+    respond = np.bincount(end_hours, weights=(ends - arrival_times)[done], minlength=24)
+    boundaries = np.arange(1, 25) * SIM_TIME
+    # arrivals are sorted, the ends aren't
+    backlog = (np.searchsorted(arrival_times, boundaries, side='right')
+               - np.searchsorted(np.sort(ends), boundaries, side='right'))
+    HOURLY[:, 0] = STAFFING.on_shift
+    HOURLY[:, 1] = np.diff(ARRIVAL_HOURS)
+    HOURLY[:, 2] = handled
+    HOURLY[:, 3] = backlog
+    with np.errstate(invalid='ignore', divide='ignore'):
+        HOURLY[:, 4] = np.where(handled > 0, respond / handled / 60, np.nan)
+
+
+def run_queue_day() -> None:
+    """
+    Runs the whole day with the queue engine (ENGINE = 'queue') instead of 
+        simpy. Customers carried over from yesterday go first, with whatever
+        is left of their handle time. Afterwards the tracking vars are set the 
+        same way the simpy engine leaves them, including the customers still 
+        waiting or being helped at midnight, so day_to_df() and multi-day 
+        runs work with either engine.
+    """
+    global CUSTOMER_NUM, CUSTOMERS_HANDLED, WAIT_TIMES
+    global CUSTOMERS_WAITING, CUSTOMERS_BEING_HELPED
+
+    carried = list(CUSTOMERS_WAITING.values())
+    carried_arrivals = np.array([-c.waited for c in carried], dtype=float)
+    carried_handle = np.array([c.handle_time for c in carried], dtype=float)
+    carried_service = carried_handle - np.array(
+        [CUSTOMERS_BEING_HELPED.get(c.name, 0) for c in carried], dtype=float)
+    names = np.concatenate((np.array([c.name for c in carried], dtype=np.int64),
+                            np.arange(FIRST_CUSTOMER + 1, FIRST_CUSTOMER + len(ARRIVALS) + 1)))
+    arrival_times = np.concatenate((carried_arrivals, ARRIVALS))
+    service = np.concatenate((carried_service, SERVICE_TIMES))
+    handle = np.concatenate((carried_handle, SERVICE_TIMES))
+    if len(carried) > 0:
+        order = np.argsort(arrival_times, kind='stable')
+        names, arrival_times = names[order], arrival_times[order]
+        service, handle = service[order], handle[order]
+
+    agents = np.empty(len(names), dtype=np.int64)
+    shifts = []
+    starts, ends = queue_engine.run_day(arrival_times, service, STAFFING.on_shift,
+                                        SIM_TIME, agents, rates=AGENT_RATES, shifts=shifts)
+    set_agent_stats(starts, ends, agents, shifts)
+
+    record_hours(arrival_times, ends)
+    done = ends <= DAY_SECONDS
+    WAIT_TIMES = array('d', (ends - arrival_times)[done].tobytes())
+    CUSTOMERS_HANDLED = int(done.sum())
+    CUSTOMER_NUM = FIRST_CUSTOMER + len(ARRIVALS)
+    # customers not done by midnight, in the format the simpy engine uses
+    CUSTOMERS_WAITING = {}
+    CUSTOMERS_BEING_HELPED = {}
+    for k in np.flatnonzero(~done).tolist():
+        name = int(names[k])
+        CUSTOMERS_WAITING[name] = WaitingCustomer(name, float(DAY_SECONDS - arrival_times[k]),
+                                                  float(handle[k]))
+        if starts[k] < DAY_SECONDS:
+            CUSTOMERS_BEING_HELPED[name] = int(DAY_SECONDS - starts[k])
+
+    if TRACE is not None:
+        TRACE.record_many(names[done], arrival_times[done], starts[done], ends[done],
+                          agents[done])
+    if CONSOLE_OUTPUT:
+        print("Customers handled: " + str(CUSTOMERS_HANDLED))
+        print("Customers waiting at midnight:", len(CUSTOMERS_WAITING))
+
+
+def set_agent_stats(starts: np.ndarray, ends: np.ndarray, agents: np.ndarray,
+                    shifts: list) -> None:
+    """Setter for AGENT_STATS, from a queue engine day."""
+    global AGENT_STATS
+
+    busy, on_shift = queue_engine.agent_utilization(starts, ends, agents, shifts, DAY_SECONDS)
+    done = ends <= DAY_SECONDS
+    with np.errstate(invalid='ignore', divide='ignore'):
+        utilization = np.where(on_shift > 0, busy / on_shift, np.nan)
+    AGENT_STATS = {
+        'rate': np.ones(len(shifts)) if AGENT_RATES is None else AGENT_RATES[:len(shifts)],
+        'shift_start': np.array([shift[0] for shift in shifts]) / SIM_TIME,
+        'shift_end': np.array([DAY_SECONDS if shift[1] is None else shift[1]
+                               for shift in shifts]) / SIM_TIME,
+        'handled': np.bincount(agents[done], minlength=len(shifts)),
+        'busy_hours': busy / SIM_TIME,
+        'utilization': utilization,
+    }
+    if CONSOLE_OUTPUT:
+        print("Agent utilization: min {:.2f}, mean {:.2f}, max {:.2f}".format(
+            np.nanmin(utilization), np.nanmean(utilization), np.nanmax(utilization)))
+
+
+def agent_stats_to_df() -> pd.DataFrame:
+    """
+    Creates a dataframe with one row per agent of the last queue engine day:
+        their service rate, the hours they came on and went off shift, the
+        interactions they handled, and the share of their shift spent helping
+        customers. Agents are numbered in the order they came on shift.
+    """
+    if AGENT_STATS is None:
+        raise ValueError("Per-agent results are only kept by the queue engine, "
+                         "set ENGINE = 'queue' or an AGENT_RATE_DIST.")
+    return pd.DataFrame({
+        "Agent": np.arange(len(AGENT_STATS['rate'])),
+        "Rate": np.round(AGENT_STATS['rate'], 3),
+        "Shift Start": np.round(AGENT_STATS['shift_start'], 2),
+        "Shift End": np.round(AGENT_STATS['shift_end'], 2),
+        "Interactions Handled": AGENT_STATS['handled'],
+        "Busy Hours": np.round(AGENT_STATS['busy_hours'], 2),
+        "Utilization": np.round(AGENT_STATS['utilization'], 3),
+    })
 
 
 def clear_tracking_vars() -> None:
     """This is so that the sim can be run multiple times in one execution"""
     global CUSTOMER_NUM, CUSTOMERS_BEING_HELPED, CUSTOMERS_WAITING
     global CUSTOMERS_HANDLED, WAIT_TIMES, RESIDUAL_WAIT_TIMES
-    global PREV_HOUR_CUTOFF_CUST, WAIT_TIMES
+    global PREV_HOUR_CUTOFF_CUST, WAIT_TIMES, FIRST_CUSTOMER
 
     CUSTOMER_NUM = 0
-    CUSTOMERS_BEING_HELPED = []
-    CUSTOMERS_WAITING = []
+    FIRST_CUSTOMER = 0
+    CUSTOMERS_BEING_HELPED = {}
+    CUSTOMERS_WAITING = {}
+    CUSTOMERS_HANDLED = 0
+    RESIDUAL_WAIT_TIMES = []
+    PREV_HOUR_CUTOFF_CUST = 0
+    WAIT_TIMES = array('d')
+
+
+def carry_over_tracking_vars() -> None:
+    """
+    Starts the next day without clearing the queue. Customers still waiting or
+        being helped at midnight keep their place, and the day's counts and 
+        wait times start from zero. Customer numbers keep counting up, so the 
+        carried over customers never share a number with the new day's.
+    """
+    global CUSTOMERS_HANDLED, WAIT_TIMES, RESIDUAL_WAIT_TIMES
+    global PREV_HOUR_CUTOFF_CUST, FIRST_CUSTOMER
+
+    FIRST_CUSTOMER = CUSTOMER_NUM
     CUSTOMERS_HANDLED = 0
     RESIDUAL_WAIT_TIMES = []
     PREV_HOUR_CUTOFF_CUST = 0
-    WAIT_TIMES = []
+    WAIT_TIMES = array('d')
 
 
-def simulate_day() -> None:
-    """runs the sim for 24 hours, tracking the necessary variables"""
-    global CURRENT_HOUR, CUSTOMERS_WAITING, CUSTOMER_NUM
+def set_console_flags() -> None:
+    """Converts CONSOLE_LOGGING_LEVEL into the VERBOSE and CONSOLE_OUTPUT flags."""
+    global VERBOSE, CONSOLE_OUTPUT
+
+    VERBOSE = CONSOLE_LOGGING_LEVEL == 'verbose'
+    CONSOLE_OUTPUT = CONSOLE_LOGGING_LEVEL != 'minimal'
+
+
+def no_phase(name: str) -> contextlib.nullcontext:
+    """Stand-in for Profiler.phase() when profiling is disabled."""
+    return NO_PHASE
+
+
+NO_PHASE = contextlib.nullcontext()
+
+
+def warn_rate_engine() -> None:
+    """Says once per process that agent rates moved a simpy day to the queue engine."""
+    global RATE_ENGINE_WARNED
+    if not RATE_ENGINE_WARNED:
+        RATE_ENGINE_WARNED = True
+        print("Warning: AGENT_RATE_DIST is '{}', the days run on the queue engine "
+              "instead of simpy.".format(AGENT_RATE_DIST))
+
+
+def simulate_day(carry_over: bool = False) -> pd.DataFrame:
+    """runs the sim for 24 hours, tracking the necessary variables
+
+    carry_over: keep the customers that were still waiting at the end of the
+        previous day, instead of starting the day with an empty queue.
+
+    If profiling is enabled (see profiler.py), the time spent in each phase of
+    the day is recorded. If tracing is enabled (see tracer.py), every handled
+    interaction is written to the day's trace file.
+
+    Returns: the day's dataframe, as logged to "log.csv".
+    """
+    global CURRENT_HOUR, CUSTOMERS_WAITING, CUSTOMER_NUM, TRACE, AGENT_STATS
+    if ENGINE not in ENGINES:
+        raise ValueError("ENGINE must be one of {}, not '{}'.".format(ENGINES, ENGINE))
+    set_console_flags()
+    prof = profiler.ACTIVE
+    phase = no_phase if prof is None else prof.phase
+    environment = simpy.Environment if prof is None else profiler.CountingEnvironment
+    if prof is not None:
+        prof.start_run('{} starts, {} interactions, {:.2f} min EHT'.format(
+            AGENT_STARTS, INTERACTIONS_MEAN, HANDLE_TIME_MEAN))
+
     set_interactions_today()
-    clear_tracking_vars()
+    if carry_over:
+        carry_over_tracking_vars()
+    else:
+        clear_tracking_vars()
     set_handle_time()
-
-    for i in range(0, 24):
-
-        CURRENT_HOUR = i
-        set_agents_working()
-        my_env = simpy.Environment()
-        interval = hour_customer_interval(CURRENT_HOUR)
-        agent_count = get_agents_working_count()
-        my_env.process(run_sim(my_env, agent_count, HANDLE_TIME, interval))
-        my_env.run(until=SIM_TIME)
-        # subtracting the waiting customers from the customer num, so that when
-        #   they are added to the next hour, they have the correct name.
-        CUSTOMER_NUM -= len(CUSTOMERS_WAITING)
-        if CONSOLE_LOGGING_LEVEL != 'minimal': print("Hour", CURRENT_HOUR, "ending.")
-        # logging and displaying data
-        if CONSOLE_LOGGING_LEVEL != 'minimal': print("Customers handled: " + str(CUSTOMERS_HANDLED))
-        my_df = hour_to_df()
-        asr = get_asr()
-        if CONSOLE_LOGGING_LEVEL != 'minimal': print(f"ASR: {asr:.2f}")
-        if CONSOLE_LOGGING_LEVEL != 'minimal': print(my_df.head())
-        # log_data(my_df)
-
-    day_df = day_to_df()
-    log_data(day_df)
+    set_staffing_plan()
+    set_arrivals()
+    set_service_times()
+    # drawn after the service times, so the customers are the same whatever the rates
+    set_agent_rates()
+    HOURLY.fill(np.nan)
+    AGENT_STATS = None
+    if tracer.ACTIVE is not None:
+        TRACE = tracer.ACTIVE.begin_day('{}a_{}i'.format(AGENT_STARTS, INTERACTIONS_TODAY),
+                                        INTERACTIONS_TODAY + INTERACTIONS_TODAY // 4)
+
+    if ENGINE == 'simpy' and AGENT_RATES is not None:
+        warn_rate_engine()
+    if ENGINE == 'queue' or AGENT_RATES is not None:
+        with phase('env_run'):
+            run_queue_day()
+    else:
+        waits_before = 0
+        for i in range(0, 24):
+
+            CURRENT_HOUR = i
+            with phase('staffing'):
+                set_agents_working()
+                agent_count = get_agents_working_count()
+            with phase('env_build'):
+                my_env = environment()
+                hour_arrivals = ARRIVALS[ARRIVAL_HOURS[i]:ARRIVAL_HOURS[i + 1]] - i * SIM_TIME
+                my_env.process(run_sim(my_env, agent_count, HANDLE_TIME, hour_arrivals))
+            with phase('env_run'):
+                my_env.run(until=SIM_TIME)
+                end_hour()
+                waits_before = record_hour(waits_before)
+            if prof is not None:
+                prof.count('simpy_events', my_env.events_processed)
+            # logging and displaying data, the hourly dataframe is only built
+            #   when it will be printed.
+            if CONSOLE_OUTPUT:
+                print("Hour", CURRENT_HOUR, "ending.")
+                print("Customers handled: " + str(CUSTOMERS_HANDLED))
+                my_df = hour_to_df()
+                asr = get_asr()
+                print(f"ASR: {asr:.2f}")
+                print(my_df.head())
+                # log_data(my_df)
+
+    if TRACE is not None:
+        tracer.ACTIVE.end_day()
+        TRACE = None
+
+    with phase('metrics'):
+        day_df = day_to_df()
+    if LOG_TO_FILE:
+        with phase('logging'):
+            log_data(day_df)
+
+    if prof is not None:
+        prof.count('customers', CUSTOMER_NUM - FIRST_CUSTOMER)
+        prof.end_run()
+    return day_df
 
 
 def max_output_possible() -> float:
@@ -590,14 +975,12 @@ def get_utilization() -> float:
     #   one unit of handle time.
 
     # amount of labor time available
-    # correction for rounding error
-    # correction = .95
-    correction = 1.0
     labor_time = 60 * 60 * 8 * AGENT_STARTS
     customers_possible = int(labor_time / HANDLE_TIME)
-    util = CUSTOMERS_HANDLED / (customers_possible * correction)
+    # correction for rounding error, see calibrate.py
+    util = CUSTOMERS_HANDLED / (customers_possible * UTILIZATION_CORRECTION)
 
-    if util > 0.95:
+    if util > UTILIZATION_CLAMP:
         return 1.0
     else:
         return util
@@ -609,8 +992,9 @@ def get_asr() -> float:
     Must be called after the sim has completed.
     Return: float
     """
-
-    return sum(WAIT_TIMES) / len(WAIT_TIMES) / 60
+    if len(WAIT_TIMES) == 0:
+        return float('nan')
+    return np.frombuffer(WAIT_TIMES).mean() / 60
 
 
 def hour_to_df() -> pd.DataFrame:
@@ -713,16 +1097,18 @@ def log_data(df) -> None:
     df.to_csv('log.csv', mode='a', index=False, header=False)
 
 
-def main() -> None:
+def main() -> Optional[pd.DataFrame]:
+    """Simulates a day. Returns: the day's dataframe, or None if the run failed."""
 
     # # running the sim
     # print("Starting Call Center Simulation")
     # simulate_day()
 
+    set_console_flags()
     try:
         # running the sim
-        if CONSOLE_LOGGING_LEVEL != 'minimal': print("Starting Call Center Simulation")
-        simulate_day()
+        if CONSOLE_OUTPUT: print("Starting Call Center Simulation")
+        return simulate_day()
 
     except ValueError as ve:
         print("\nError: You may have run out of agents for the day\n")
@@ -730,6 +1116,64 @@ def main() -> None:
     except Exception as e:
         print("An unhandled error ocurred during this run of the simulation.")
         traceback.print_exception(e)
+    return None
+
+
+def simulate_days(days: Optional[int] = None, start_date: Optional[datetime.date] = None,
+                  interaction_forecast: Optional[List[float]] = None,
+                  agent_starts: Optional[List[int]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Simulates consecutive days, carrying the customers still waiting at 
+        midnight into the next day. Days are simulated one at a time as the
+        results are consumed, so long horizons don't build up in memory and 
+        the caller can stop early.
+
+    days: number of days, defaults to the length of the forecast, or a week.
+    start_date: date of the first day, defaults to today. Sets the weekday
+        used for WEEKDAY_VOLUME_FACTORS and WEEKDAY_STAFFING_FACTORS.
+    interaction_forecast: interactions for each day. Without it each day gets
+        INTERACTIONS_MEAN scaled by the weekday volume factor.
+    agent_starts: agent starts for each day. Without it each day gets
+        AGENT_STARTS scaled by the weekday staffing factor.
+
+    Yields: each day's dataframe (as logged to "log.csv"), with the "Date" 
+        and the "Backlog" of customers left waiting at the end of the day.
+
+    e.g.
+        for day_df in simulate_days(28):
+            if day_df["Backlog"][0] > 200:
+                break
+    """
+    global INTERACTIONS_MEAN, AGENT_STARTS
+
+    _days = days if days else len(interaction_forecast) if interaction_forecast else 7
+    _start_date = datetime.date.today() if not start_date else start_date
+    interactions_mean = INTERACTIONS_MEAN
+    agent_starts_base = AGENT_STARTS
+
+    try:
+        for d in range(_days):
+            date = _start_date + datetime.timedelta(days=d)
+            weekday = WEEKDAYS[date.weekday()]
+            if interaction_forecast:
+                INTERACTIONS_MEAN = int(round(interaction_forecast[d]))
+            else:
+                INTERACTIONS_MEAN = int(round(interactions_mean * WEEKDAY_VOLUME_FACTORS[weekday]))
+            if agent_starts:
+                AGENT_STARTS = agent_starts[d]
+            else:
+                AGENT_STARTS = max(1, int(round(agent_starts_base * WEEKDAY_STAFFING_FACTORS[weekday])))
+
+            day_df = simulate_day(carry_over=d > 0)
+            day_df.insert(0, "Date", date.isoformat())
+            day_df["Backlog"] = len(CUSTOMERS_WAITING)
+            if CONSOLE_OUTPUT:
+                print(date, weekday, "backlog at midnight:", len(CUSTOMERS_WAITING))
+            yield day_df
+    finally:
+        # the base values come back even if the caller stops early
+        INTERACTIONS_MEAN = interactions_mean
+        AGENT_STARTS = agent_starts_base
 
 
 def full_spectrum(repeat_count: Optional[int] = None, dist: Optional[bool] = None,
@@ -737,11 +1181,27 @@ def full_spectrum(repeat_count: Optional[int] = None, dist: Optional[bool] = Non
                   step_minutes: Optional[float] = None, handle_stdev: Optional[float] = None,
                   interactions_min: Optional[int] = None, interactions_max: Optional[int] = None,
                   interactions_step: Optional[int] = None, inter_stdev: Optional[int] = None,
-                  agent_starts_min: Optional[int] = None, agent_starts_max: Optional[int] = None) -> None:
+                  agent_starts_min: Optional[int] = None, agent_starts_max: Optional[int] = None,
+                  sweep_id: Optional[str] = None, resume: bool = True, store: bool = False,
+                  on_result: Optional[Callable[[tuple, pd.DataFrame], None]] = None) -> str:
     """Runs the sim in the full range of dependent variables
         -Note: This can take a very long time, because it is essentially O(n^3)
             where n is the number of steps through each variable loop
-        """
+        -Progress is checkpointed under the sweep ID after every scenario that
+            completes. If the run dies, calling it again with the same
+            arguments and settings (see sweep_config()), or the same sweep_id,
+            skips the scenarios that already finished.
+        -With store, every scenario's HOURLY metrics are also written to a
+            result store (see result_store.py) under the sweep ID, with the
+            axes (eht, interactions, starts, rep, hour, metric).
+        -on_result is called with (eht, interactions, starts, rep) and the
+            day's dataframe after every scenario that runs, e.g. to draw the
+            results as they come in (see heatmap.py). The scenario is already
+            checkpointed, so on_result can raise to stop the sweep there and
+            a rerun picks up at the next scenario (see scheduler.py).
+
+    Returns: str, the sweep ID.
+    """
     global ENABLE_DISTRIBUTIONS, HANDLE_TIME_MEAN, INTERACTIONS_MEAN
     global AGENT_STARTS, INTERACTIONS_STDEV, HANDLE_TIME_STDEV
 
@@ -766,27 +1226,71 @@ def full_spectrum(repeat_count: Optional[int] = None, dist: Optional[bool] = Non
     _start = int(_handle_minutes_min * 60)
     _stop = int(_handle_minutes_max * 60)
     _step = int(_step_minutes * 60)
-    for i in range(_start, _stop + 1, _step):
-        HANDLE_TIME_MEAN = i/60
-
-        for j in range(_interactions_min, _interactions_max + 1, _interactions_step):
-            INTERACTIONS_MEAN = j
 
-            for k in range(_agent_starts_min, _agent_starts_max + 1):
-                AGENT_STARTS = k
-
-                for l in range(0, _repeat_count):
-                    main()
+    params = {
+        'sweep': 'full_spectrum', 'repeat_count': _repeat_count,
+        'dist': ENABLE_DISTRIBUTIONS, 'handle_seconds': [_start, _stop, _step],
+        'handle_stdev': HANDLE_TIME_STDEV,
+        'interactions': [_interactions_min, _interactions_max, _interactions_step],
+        'inter_stdev': INTERACTIONS_STDEV,
+        'agent_starts': [_agent_starts_min, _agent_starts_max],
+        'config': sweep_config(),
+    }
+    checkpoint = open_checkpoint(params, sweep_id, resume)
+    results = open_result_store(checkpoint, {
+        'eht': [i / 60 for i in range(_start, _stop + 1, _step)],
+        'interactions': list(range(_interactions_min, _interactions_max + 1, _interactions_step)),
+        'starts': list(range(_agent_starts_min, _agent_starts_max + 1)),
+        'rep': list(range(_repeat_count)),
+    }, lambda point: (point[0] / 60,) + point[1:], resume) if store else None
+
+    # on_result can raise to stop the sweep, the store is flushed and closed either way
+    try:
+        for i in range(_start, _stop + 1, _step):
+            HANDLE_TIME_MEAN = i/60
+
+            for j in range(_interactions_min, _interactions_max + 1, _interactions_step):
+                INTERACTIONS_MEAN = j
+
+                for k in range(_agent_starts_min, _agent_starts_max + 1):
+                    AGENT_STARTS = k
+
+                    for l in range(0, _repeat_count):
+                        point = (i, j, k, l)
+                        if checkpoint.is_done(point):
+                            continue
+                        day_df = main()
+                        if day_df is None:
+                            # the run failed, a rerun of the sweep tries it again
+                            continue
+                        if results is not None:
+                            results.write((i / 60, j, k, l), HOURLY)
+                        checkpoint.mark_done(point)
+                        if on_result is not None:
+                            on_result((i / 60, j, k, l), day_df)
+    finally:
+        if results is not None:
+            results.close()
+    checkpoint.clear()
+    return checkpoint.sweep_id
                     
                     
 def forecast_spectrum(interaction_forecast: List[int], repeat_count: Optional[int] = None, dist: Optional[bool] = None,
                   handle_minutes_min: Optional[float] = None, handle_minutes_max: Optional[float] = None,
                   step_minutes: Optional[float] = None, handle_stdev: Optional[float] = None,
-                  agent_starts_min: Optional[int] = None, agent_starts_max: Optional[int] = None) -> None:
+                  agent_starts_min: Optional[int] = None, agent_starts_max: Optional[int] = None,
+                  sweep_id: Optional[str] = None, resume: bool = True, store: bool = False,
+                  on_result: Optional[Callable[[tuple, pd.DataFrame], None]] = None) -> str:
     """Runs the sim in the full range of dependent variables
         -Note: This can take a very long time, because it is essentially O(n^3)
             where n is the number of steps through each variable loop
-        """
+        -Checkpointed and resumable the same way as full_spectrum().
+        -With store, hourly metrics go to a result store like full_spectrum(),
+            with the axes (day, eht, starts, rep, hour, metric).
+        -on_result works like full_spectrum(), with (day, eht, starts, rep).
+
+    Returns: str, the sweep ID.
+    """
     global ENABLE_DISTRIBUTIONS, HANDLE_TIME_MEAN, INTERACTIONS_MEAN
     global AGENT_STARTS, INTERACTIONS_STDEV, HANDLE_TIME_STDEV\
         
@@ -808,23 +1312,112 @@ def forecast_spectrum(interaction_forecast: List[int], repeat_count: Optional[in
     _start = int(_handle_minutes_min * 60)
     _stop = int(_handle_minutes_max * 60)
     _step = int(_step_minutes * 60)
-    for interactions in interaction_forecast:
-        INTERACTIONS_MEAN = interactions
 
-        for j in range(_start, _stop + 1, _step):
-            HANDLE_TIME_MEAN = j/60
+    params = {
+        'sweep': 'forecast_spectrum', 'repeat_count': _repeat_count,
+        'dist': ENABLE_DISTRIBUTIONS,
+        'interaction_forecast': [float(x) for x in interaction_forecast],
+        'handle_seconds': [_start, _stop, _step], 'handle_stdev': HANDLE_TIME_STDEV,
+        'agent_starts': [_agent_starts_min, _agent_starts_max],
+        'config': sweep_config(),
+    }
+    checkpoint = open_checkpoint(params, sweep_id, resume)
+    results = open_result_store(checkpoint, {
+        'day': list(range(len(interaction_forecast))),
+        'eht': [j / 60 for j in range(_start, _stop + 1, _step)],
+        'starts': list(range(_agent_starts_min, _agent_starts_max + 1)),
+        'rep': list(range(_repeat_count)),
+    }, lambda point: (point[0], point[1] / 60) + point[2:], resume) if store else None
+
+    try:
+        for day, interactions in enumerate(interaction_forecast):
+            INTERACTIONS_MEAN = interactions
+
+            for j in range(_start, _stop + 1, _step):
+                HANDLE_TIME_MEAN = j/60
+
+                for k in range(_agent_starts_min, _agent_starts_max + 1):
+                    AGENT_STARTS = k
+
+                    for l in range(0, _repeat_count):
+                        point = (day, j, k, l)
+                        if checkpoint.is_done(point):
+                            continue
+                        day_df = main()
+                        if day_df is None:
+                            continue
+                        if results is not None:
+                            results.write((day, j / 60, k, l), HOURLY)
+                        checkpoint.mark_done(point)
+                        if on_result is not None:
+                            on_result((day, j / 60, k, l), day_df)
+    finally:
+        if results is not None:
+            results.close()
+    checkpoint.clear()
+    return checkpoint.sweep_id
+
+
+def sweep_config() -> dict:
+    """
+    The settings a sweep's results depend on besides its grid (SWEEP_SETTINGS,
+        keyed by the lower case name), part of the sweep parameters so a
+        sweep with other settings gets another sweep ID.
+    """
+    return {name.lower(): globals()[name] for name in SWEEP_SETTINGS}
+
 
-            for k in range(_agent_starts_min, _agent_starts_max + 1):
-                AGENT_STARTS = k
+def open_checkpoint(params: dict, sweep_id: Optional[str] = None,
+                    resume: bool = True) -> SweepCheckpoint:
+    """
+    Opens the checkpoint for a sweep. The sweep ID defaults to a hash of the 
+        sweep parameters, so an identical sweep resumes where it stopped.
+    """
+    set_console_flags()
+    _sweep_id = make_sweep_id(params) if not sweep_id else sweep_id
+    checkpoint = SweepCheckpoint(_sweep_id, params, resume)
+    if len(checkpoint) > 0:
+        print("Resuming sweep", _sweep_id, "with", len(checkpoint),
+              "scenarios already completed.")
+    elif CONSOLE_OUTPUT:
+        print("Starting sweep", _sweep_id)
+    return checkpoint
+
+
+def open_result_store(checkpoint: SweepCheckpoint, scenario_coords: dict,
+                      store_point: Callable[[tuple], tuple], resume: bool = True) -> ResultStore:
+    """
+    Opens the sweep's result store, under the sweep ID. scenario_coords are
+        the sweep's own axes, the hour and metric axes are added here.
+        store_point maps a checkpoint's grid point to its store coordinates.
 
-                for l in range(0, _repeat_count):
-                    main()
+    Checkpointed scenarios that aren't in the store, e.g. the sweep first ran
+        without store or the store was started over because its coordinates
+        changed, are taken off the checkpoint so the sweep runs them again.
+    """
+    coords = dict(scenario_coords, hour=list(range(24)), metric=list(HOURLY_METRICS))
+    store = ResultStore.open_or_create(store_path(checkpoint.sweep_id), coords, resume)
+    if CONSOLE_OUTPUT:
+        print("Writing hourly results to", store.path)
+    written = store.completed()
+    missing = set()
+    for point in checkpoint.completed:
+        try:
+            if not written[store.where(store_point(point))]:
+                missing.add(point)
+        except KeyError:
+            missing.add(point)
+    if missing:
+        print("Warning:", len(missing), "checkpointed scenarios are missing from the result "
+              "store and will be run again.")
+        checkpoint.completed -= missing
+    return store
 
 
 def single_run(dist: Optional[bool] = None, starts: Optional[int] = None, inter_mean: Optional[int] = None,
                inter_stdev: Optional[int] = None, handle_mean: Optional[float] = None,
-               handle_stdev: Optional[float] = None) -> None:
-    """Runs the sim a single time"""
+               handle_stdev: Optional[float] = None) -> Optional[pd.DataFrame]:
+    """Runs the sim a single time. Returns: the day's dataframe, like main()."""
     global ENABLE_DISTRIBUTIONS, HANDLE_TIME_MEAN, INTERACTIONS_MEAN
     global AGENT_STARTS, INTERACTIONS_STDEV, HANDLE_TIME_STDEV
 
@@ -841,7 +1434,7 @@ def single_run(dist: Optional[bool] = None, starts: Optional[int] = None, inter_
     HANDLE_TIME_MEAN = 9.909 if not handle_mean else handle_mean
     HANDLE_TIME_STDEV = .083 if not handle_stdev else handle_stdev
 
-    main()
+    return main()
 
 
 def spectrum_run() -> None:
@@ -890,3 +1483,4 @@ if __name__ == "__main__":
     single_run()
     # full_spectrum()
     # custom_run()
+    # for day_df in simulate_days(7): pass
@@ -0,0 +1,115 @@
+"""
+Staffing plans compiled from AGENT_STARTS and AGENT_PORTIONS.
+
+The number of agents working each hour only depends on the number of agent
+starts and on AGENT_PORTIONS, so instead of rebuilding a dict of working
+agents one agent at a time every simulated hour, the whole day is compiled
+once into 24 element arrays and memoized. A sweep that runs the same starts
+at many volumes and handle times reuses the same plan.
+
+The plan follows the rules the hourly setter always used:
+    - one night agent (agent -1) works from midnight until 5 am, and is the
+        only agent working from 10 pm until midnight
+    - from 3 am to 9 pm agents are brought in from the bench until
+        int(AGENT_STARTS * AGENT_PORTIONS[hour]) are working, or the bench
+        (AGENT_STARTS - 1) is empty
+    - an agent that starts at hour h works hours h through h + 8
+"""
+
+import functools
+import numpy as np
+import arrivals
+
+
+# hours from the start of a shift until the agent is gone
+SHIFT_HOURS = 9
+NIGHT_AGENT = -1
+NIGHT_AGENT_HOURS = range(0, 5)
+DAY_HOURS = range(3, 22)
+
+
+class StaffingPlan:
+    """
+    Compiled staffing for one day. All arrays have 24 entries, one per hour.
+
+    on_shift   - agents working in the hour
+    new_agents - agents that start their shift in the hour
+    bench      - agents left on the bench at the end of the hour
+    first_agent, last_agent - the day shift agents working in the hour are
+        numbered first_agent..last_agent (empty if first > last), in the order
+        they started
+    """
+
+    def __init__(self, on_shift: np.ndarray, new_agents: np.ndarray, bench: np.ndarray,
+                 first_agent: np.ndarray, last_agent: np.ndarray):
+        self.on_shift = on_shift
+        self.new_agents = new_agents
+        self.bench = bench
+        self.first_agent = first_agent
+        self.last_agent = last_agent
+        for array in (on_shift, new_agents, bench, first_agent, last_agent):
+            array.setflags(write=False)
+
+    def agent_ids(self, hour: int) -> list:
+        """Agent numbers working in the hour, the night agent is -1."""
+        ids = [NIGHT_AGENT] if self.night_agent_working(hour) else []
+        return ids + list(range(self.first_agent[hour], self.last_agent[hour] + 1))
+
+    @staticmethod
+    def night_agent_working(hour: int) -> bool:
+        return hour in NIGHT_AGENT_HOURS or hour >= DAY_HOURS.stop
+
+
+def portions_key(agent_portions: dict) -> tuple:
+    return tuple(float(agent_portions[str(h)]) for h in range(24))
+
+
+def compile_staffing(agent_starts: int, agent_portions: dict) -> StaffingPlan:
+    """Returns the (memoized) staffing plan for the day."""
+    return _compile(int(agent_starts), portions_key(agent_portions))
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(agent_starts: int, portions: tuple) -> StaffingPlan:
+    portions = np.array(portions)
+    ideal = (agent_starts * portions).astype(int)
+    new_agents = np.zeros(24, dtype=int)
+    bench = np.zeros(24, dtype=int)
+    # subtracting 1 to account for the night agent
+    left = agent_starts - 1
+    night = np.array([StaffingPlan.night_agent_working(h) for h in range(24)], dtype=int)
+
+    for h in DAY_HOURS:
+        # agents still working this hour from earlier starts
+        previous = new_agents[max(0, h - SHIFT_HOURS):h].sum() + night[h - 1]
+        staying = new_agents[max(0, h - SHIFT_HOURS + 1):h].sum() + night[h]
+        if ideal[h] > staying:
+            added = min(ideal[h] - previous, left)
+            if added > 0:
+                new_agents[h] = added
+                left -= added
+        bench[h] = left
+    bench[:DAY_HOURS.start] = agent_starts - 1
+    bench[DAY_HOURS.stop:] = left
+
+    # day shift agents working = starts within the last SHIFT_HOURS hours
+    window = np.convolve(new_agents, np.ones(SHIFT_HOURS, dtype=int))[:24]
+    window[DAY_HOURS.stop:] = 0
+    on_shift = window + night
+
+    numbered = np.cumsum(new_agents)
+    first_agent = np.concatenate((np.zeros(SHIFT_HOURS, dtype=int),
+                                  numbered[:-SHIFT_HOURS])) + 1
+    last_agent = numbered.copy()
+    last_agent[DAY_HOURS.stop:] = 0
+    first_agent[DAY_HOURS.stop:] = 1
+    return StaffingPlan(on_shift, new_agents, bench, first_agent, last_agent)
+
+
+def compile_arrival_counts(interactions: float, work_portions: dict,
+                           sub_hour_profile=None) -> np.ndarray:
+    """
+    Exact number of arrivals in each hour (or sub-hour bin) for the day's
+        volume, memoized like the staffing plan.
+    """
+    return arrivals.exact_counts(int(round(interactions)), work_portions, sub_hour_profile)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import simulate as sm
+import queue_engine
+
+
+def day(monkeypatch, rates=None):
+    monkeypatch.setattr(sm, 'LOG_TO_FILE', False)
+    monkeypatch.setattr(sm, 'ENGINE', 'queue')
+    monkeypatch.setattr(sm, 'HANDLE_TIME_DIST', 'lognormal')
+    monkeypatch.setattr(sm, 'AGENT_STARTS', 20)
+    monkeypatch.setattr(sm, 'INTERACTIONS_MEAN', 1000)
+    if rates is not None:
+        monkeypatch.setattr(sm, 'draw_agent_rates', rates)
+    sm.set_seed(3)
+    return sm.simulate_day()
+
+
+def test_rates_of_one_reproduce_the_rate_free_day(monkeypatch):
+    expected = day(monkeypatch)
+    ones = day(monkeypatch, lambda on_shift, rng: np.ones(queue_engine.agents_needed(on_shift)))
+    for column in ('Interactions Handled', 'ASR', 'Utilization'):
+        assert ones[column][0] == expected[column][0]
+
+    rng = np.random.default_rng(0)
+    arrival_times = np.sort(rng.uniform(0, queue_engine.DAY_SECONDS, 500))
+    service = rng.exponential(600, 500)
+    on_shift = rng.integers(1, 10, 24)
+    plain = queue_engine.run_day(arrival_times, service, on_shift)
+    rated = queue_engine.run_day(arrival_times, service, on_shift,
+                                 rates=np.ones(queue_engine.agents_needed(on_shift)))
+    np.testing.assert_array_equal(plain[0], rated[0])
+    np.testing.assert_array_equal(plain[1], rated[1])
+
+
+@pytest.mark.parametrize('dist', ['fixed', 'lognormal'])
+def test_agent_utilization_adds_up_to_the_days_work(monkeypatch, dist):
+    monkeypatch.setattr(sm, 'AGENT_RATE_DIST', dist)
+    day_df = day(monkeypatch)
+    stats = sm.AGENT_STATS
+    assert stats['handled'].sum() == day_df['Interactions Handled'][0]
+    busy = stats['busy_hours'] * sm.SIM_TIME
+    on_shift = (np.minimum(stats['shift_end'], 24) - stats['shift_start']) * sm.SIM_TIME
+    assert np.all(busy <= on_shift + 1e-6)
+    # every agent-hour of the staffing plan is someone's shift, the agents
+    #   going off shift only stay to finish a customer
+    assert on_shift.sum() >= sm.STAFFING.on_shift.sum() * sm.SIM_TIME - 1e-6
+    if dist != 'fixed':
+        assert sm.AGENT_RATES.mean() == pytest.approx(1.0)
+
+
+def test_agent_utilization_counts_each_customers_service(monkeypatch):
+    rng = np.random.default_rng(1)
+    arrival_times = np.sort(rng.uniform(0, queue_engine.DAY_SECONDS, 600))
+    service = rng.exponential(600, 600)
+    on_shift = rng.integers(1, 8, 24)
+    rates = sm.draw_agent_rates(on_shift, rng, 'gamma', .3)
+    agents = np.empty(600, dtype=np.int64)
+    shifts = []
+    starts, ends = queue_engine.run_day(arrival_times, service, on_shift, agents=agents,
+                                        rates=rates, shifts=shifts)
+    np.testing.assert_allclose(ends - starts, service / rates[agents])
+    busy, on = queue_engine.agent_utilization(starts, ends, agents, shifts)
+    horizon = queue_engine.DAY_SECONDS
+    assert busy.sum() == pytest.approx((np.minimum(ends, horizon) - np.minimum(starts, horizon)).sum())
+    assert np.all(busy <= on + 1e-6)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import simulate as sm
+import arrivals
+
+
+@pytest.mark.parametrize('total', [0, 1, 7, 999, 1020, 50000])
+def test_largest_remainder_counts_add_up_to_the_day(total):
+    counts = arrivals.exact_counts(total, sm.WORK_PORTIONS, [.3, .3, .2, .2])
+    assert counts.shape == (96,)
+    assert counts.sum() == total
+    # every bin is within one of its share
+    ideal = total * arrivals.bin_weights(sm.WORK_PORTIONS, [.3, .3, .2, .2])
+    assert np.abs(counts - ideal).max() < 1
+
+
+def test_exact_day_has_every_interaction_in_its_hour():
+    rng = np.random.default_rng(0)
+    times = arrivals.day_arrivals(1020, sm.WORK_PORTIONS, 'exact', rng=rng)
+    assert len(times) == 1020
+    assert (np.diff(times) >= 0).all() and times[0] >= 0 and times[-1] < 86400
+    per_hour = np.diff(arrivals.hour_slices(times))
+    assert per_hour.tolist() == arrivals.exact_counts(1020, sm.WORK_PORTIONS).tolist()
+
+
+def test_poisson_days_average_the_volume():
+    rng = np.random.default_rng(1)
+    days = [len(arrivals.day_arrivals(1000, sm.WORK_PORTIONS, 'poisson', rng=rng))
+            for _ in range(400)]
+    # the standard error of the mean is about 1.6
+    assert abs(np.mean(days) - 1000) < 8
+
+
+def test_unknown_mode_and_bad_profiles_are_refused():
+    with pytest.raises(ValueError):
+        arrivals.bin_counts(1000, sm.WORK_PORTIONS, 'uniform')
+    with pytest.raises(ValueError):
+        arrivals.sub_hour_weights([1, -1])
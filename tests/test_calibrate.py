@@ -0,0 +1,32 @@
+import numpy as np
+import simulate as sm
+import calibrate
+
+
+def observed_days(monkeypatch, staffing_scale):
+    """Days simulated with a known STAFFING_SCALE, as calibrate reads them."""
+    monkeypatch.setattr(sm, 'LOG_TO_FILE', False)
+    monkeypatch.setattr(sm, 'ENGINE', 'queue')
+    monkeypatch.setattr(sm, 'STAFFING_SCALE', staffing_scale)
+    days = []
+    for starts, interactions, eht in [(20, 1000, 9.91), (22, 950, 10), (24, 1100, 9.5),
+                                      (21, 900, 10.5), (23, 1050, 9.75), (19, 850, 10)]:
+        monkeypatch.setattr(sm, 'AGENT_STARTS', starts)
+        monkeypatch.setattr(sm, 'INTERACTIONS_MEAN', interactions)
+        monkeypatch.setattr(sm, 'HANDLE_TIME_MEAN', eht)
+        sm.set_seed(len(days))
+        asr = float(sm.simulate_day()['ASR'][0])
+        days.append({'date': None, 'starts': starts, 'interactions': interactions, 'eht': eht,
+                     'asr': asr, 'utilization': None})
+    monkeypatch.setattr(sm, 'STAFFING_SCALE', 1.0)
+    return days
+
+
+def test_fit_recovers_the_staffing_scale_with_the_volume_held(monkeypatch):
+    history = observed_days(monkeypatch, .9)
+    result = calibrate.fit(history, replications=2, workers=1, time_budget=60, engine='queue')
+    assert result['factor'] == 'staffing_scale'
+    assert result['after']['volume_correction'] == sm.VOLUME_CORRECTION
+    assert abs(result['after']['staffing_scale'] - .9) <= .03
+    assert result['rmse_after'] < result['rmse_before']
+    assert 'staffing_scale' in calibrate.recommended(result)
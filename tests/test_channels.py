@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import simulate as sm
+import staffing
+import queue_engine
+import channels
+
+
+@pytest.mark.parametrize('interactions, starts', [(800, 22), (1000, 20), (1400, 18)])
+def test_equal_priorities_are_first_come_first_served(interactions, starts):
+    rng = np.random.default_rng(interactions)
+    day = [channels.Channel('calls', .7, handle_dist='lognormal'),
+           channels.Channel('cases', .3, handle_dist='gamma')]
+    arrival_times, service, priorities, _ = channels.sample_day(day, interactions, rng)
+    on_shift = staffing.compile_staffing(starts, sm.AGENT_PORTIONS).on_shift
+    by_priority = queue_engine.run_priority(arrival_times, service, priorities, on_shift)
+    fifo = queue_engine.run_day(arrival_times, service, on_shift)
+    np.testing.assert_allclose(by_priority[0], fifo[0])
+    np.testing.assert_allclose(by_priority[1], fifo[1])
+
+
+def test_the_higher_priority_channel_waits_less():
+    on_shift = staffing.compile_staffing(16, sm.AGENT_PORTIONS).on_shift
+    results = channels.evaluate(channels.default_channels(1200), on_shift, 1200,
+                                rng=np.random.default_rng(0))
+    assert results['calls']['wait'] < results['all']['wait'] < results['cases']['wait']
+    assert results['calls']['interactions'] + results['cases']['interactions'] == \
+        results['all']['interactions'] == 1200
+
+
+def test_default_channels_split_the_day():
+    calls, cases = channels.default_channels(1000)
+    assert calls.share + cases.share == pytest.approx(1)
+    assert cases.share * 1000 == pytest.approx(channels.CASES_PER_DAY)
+    assert [c.share for c in channels.default_channels(100)] == [0, 1]
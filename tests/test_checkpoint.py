@@ -0,0 +1,51 @@
+import pytest
+import simulate as sm
+from checkpoint import SweepCheckpoint, make_sweep_id
+
+
+def test_points_survive_a_reload_and_a_torn_last_line(tmp_path):
+    checkpoint = SweepCheckpoint('sweep', {'a': 1}, resume=False, directory=str(tmp_path))
+    for point in [(1, 2), (3, 4), (1, 2)]:
+        checkpoint.mark_done(point)
+    with open(checkpoint.path, 'a') as f:
+        f.write('[5, ')
+    resumed = SweepCheckpoint('sweep', {'a': 1}, directory=str(tmp_path))
+    assert resumed.completed == {(1, 2), (3, 4)}
+    resumed.mark_done((5, 6))
+    assert SweepCheckpoint('sweep', {'a': 1}, directory=str(tmp_path)).completed == {
+        (1, 2), (3, 4), (5, 6)}
+
+
+def test_resuming_with_other_parameters_is_refused(tmp_path):
+    SweepCheckpoint('sweep', {'a': 1}, resume=False, directory=str(tmp_path)).mark_done((1,))
+    with pytest.raises(ValueError):
+        SweepCheckpoint('sweep', {'a': 2}, directory=str(tmp_path))
+    assert len(SweepCheckpoint('sweep', {'a': 2}, resume=False, directory=str(tmp_path))) == 0
+
+
+@pytest.mark.parametrize('name, value', [('HANDLE_TIME_CV', .7), ('ARRIVAL_MODE', 'poisson'),
+                                         ('VOLUME_CORRECTION', 1.1), ('AGENT_RATE_DIST', 'gamma'),
+                                         ('UTILIZATION_CLAMP', .9), ('ENGINE', 'queue')])
+def test_sweep_id_changes_with_the_settings(monkeypatch, name, value):
+    before = make_sweep_id({'config': sm.sweep_config()})
+    monkeypatch.setattr(sm, name, value)
+    assert make_sweep_id({'config': sm.sweep_config()}) != before
+
+
+def test_a_stopped_sweep_resumes_at_the_next_scenario(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sm, 'LOG_TO_FILE', False)
+    grid = dict(handle_minutes_min=9, handle_minutes_max=9, interactions_min=800,
+                interactions_max=900, interactions_step=100, agent_starts_min=20,
+                agent_starts_max=21)
+    seen = []
+
+    def stop_after_two(point, day_df):
+        seen.append(point)
+        if len(seen) == 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        sm.full_spectrum(on_result=stop_after_two, **grid)
+    sm.full_spectrum(on_result=lambda point, day_df: seen.append(point), **grid)
+    assert len(seen) == 4 and len(set(seen)) == 4
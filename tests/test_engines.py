@@ -0,0 +1,30 @@
+import pytest
+import simulate as sm
+
+# the queue engine never cuts a customer's help off at the hour, so with a
+#   backlog it handles a few more customers and reports a lower ASR than simpy
+ASR_TOLERANCE = .10
+HANDLED_TOLERANCE = .02
+
+
+def run(monkeypatch, engine, starts, interactions, eht):
+    monkeypatch.setattr(sm, 'ENGINE', engine)
+    monkeypatch.setattr(sm, 'AGENT_STARTS', starts)
+    monkeypatch.setattr(sm, 'INTERACTIONS_MEAN', interactions)
+    monkeypatch.setattr(sm, 'HANDLE_TIME_MEAN', eht)
+    sm.set_seed(0)
+    day_df = sm.simulate_day()
+    return float(day_df['ASR'][0]), int(day_df['Interactions Handled'][0])
+
+
+@pytest.mark.parametrize('starts, interactions, eht', [
+    (20, 1000, 9.91), (18, 950, 9.91), (20, 800, 9), (24, 1200, 10), (30, 1400, 10)])
+def test_engines_agree_within_tolerance(monkeypatch, starts, interactions, eht):
+    monkeypatch.setattr(sm, 'LOG_TO_FILE', False)
+    simpy_asr, simpy_handled = run(monkeypatch, 'simpy', starts, interactions, eht)
+    queue_asr, queue_handled = run(monkeypatch, 'queue', starts, interactions, eht)
+    assert queue_asr == pytest.approx(simpy_asr, rel=ASR_TOLERANCE)
+    assert queue_handled == pytest.approx(simpy_handled, rel=HANDLED_TOLERANCE)
+    # the difference only goes one way
+    assert queue_asr <= simpy_asr + .01
+    assert queue_handled >= simpy_handled
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+import handle_times
+
+
+@pytest.mark.parametrize('dist', ['lognormal', 'gamma'])
+@pytest.mark.parametrize('cv', [.25, .5, 1.0])
+def test_draws_have_the_mean_and_cv(dist, cv):
+    draws = handle_times.sample(200000, 600, dist, cv, rng=np.random.default_rng(0))
+    assert draws.mean() == pytest.approx(600, rel=.01)
+    assert draws.std() / draws.mean() == pytest.approx(cv, rel=.03)
+
+
+def test_empirical_draws_are_scaled_to_the_mean():
+    samples = np.array([300., 600., 1200.])
+    draws = handle_times.sample(100000, 500, 'empirical', empirical=samples,
+                                rng=np.random.default_rng(0))
+    assert set(np.round(draws, 6)) <= set(np.round(samples * 500 / samples.mean(), 6))
+    assert draws.mean() == pytest.approx(500, rel=.01)
+
+
+def test_fixed_is_the_mean_and_unknown_is_refused():
+    assert handle_times.sample(5, 594.6).tolist() == [594.6] * 5
+    with pytest.raises(ValueError):
+        handle_times.sample(5, 600, 'weibull')
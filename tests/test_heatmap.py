@@ -0,0 +1,52 @@
+import numpy as np
+import heatmap as hm
+import fluid
+
+
+class FakeGraph:
+    """Just enough of sg.Graph, records each rectangle's fill."""
+
+    def __init__(self):
+        self.fill = {}
+        self.TKCanvas = self
+
+    def erase(self):
+        self.fill = {}
+
+    def change_coordinates(self, *corners):
+        pass
+
+    def draw_rectangle(self, *corners, fill_color=None, line_color=None):
+        figure = len(self.fill)
+        self.fill[figure] = fill_color
+        return figure
+
+    def draw_text(self, *args, **kwargs):
+        return None
+
+    def delete_figure(self, figure):
+        pass
+
+    def itemconfig(self, figure, fill=None):
+        self.fill[figure] = fill
+
+
+def test_fluid_preview_fills_the_grid_until_the_sweep_replaces_it():
+    ehts, interactions, starts = fluid.grid_axes(9, 9.5, interactions_min=800,
+                                                 interactions_max=900, interactions_step=100,
+                                                 agent_starts_min=20, agent_starts_max=21)
+    asr = fluid.evaluate_grid(ehts, interactions, starts)['asr']
+    graph = FakeGraph()
+    heat = hm.Heatmap(graph, starts, interactions)
+    heat.preview(ehts, interactions, starts, asr)
+    assert graph.fill[heat.cells[(900, 21)]] == hm.asr_color(asr[0, 1, 1])
+    assert hm.BACKGROUND not in graph.fill.values()
+
+    heat.update(ehts[0], 900, 21, 80.0)
+    heat.draw(force=True)
+    assert graph.fill[heat.cells[(900, 21)]] == hm.asr_color(80.0)
+    assert graph.fill[heat.cells[(800, 20)]] == hm.asr_color(asr[0, 0, 0])
+    # the next handle time shows its own estimates
+    heat.update(ehts[1], 800, 20, 12.0)
+    heat.draw(force=True)
+    assert graph.fill[heat.cells[(900, 21)]] == hm.asr_color(asr[1, 1, 1])
@@ -0,0 +1,32 @@
+import numpy as np
+import simulate as sm
+import staffing
+import optimize
+
+
+def test_agent_portions_compile_to_the_scored_starts():
+    rng = np.random.default_rng(0)
+    hours = list(staffing.DAY_HOURS)
+    for agent_starts in (3, 20, 57, 400):
+        for _ in range(50):
+            shift_starts = np.zeros(24, dtype=int)
+            np.add.at(shift_starts, rng.choice(hours, size=agent_starts - 1), 1)
+            portions = optimize.to_agent_portions(shift_starts, agent_starts)
+            plan = staffing.compile_staffing(agent_starts, portions)
+            assert plan.new_agents.tolist() == shift_starts.tolist()
+
+
+def test_optimized_portions_round_trip_through_the_sim_staffing():
+    result = optimize.optimize(20, 1000, 9.91, replications=1, workers=1, time_budget=1)
+    plan = staffing.compile_staffing(20, sm.scaled_portions(result['agent_portions'], 1.0))
+    assert plan.on_shift.tolist() == result['on_shift']
+    assert sum(result['shift_starts']) == 19
+
+
+def test_min_agents_holds_over_the_day_shift_hours():
+    result = optimize.optimize(20, 1000, 9.91, min_agents=3, replications=1, workers=1,
+                               time_budget=1)
+    on_shift = np.array(result['on_shift'])
+    assert on_shift[staffing.DAY_HOURS.start:staffing.DAY_HOURS.stop].min() >= 3
+    assert np.isfinite(result['asr']) and np.isfinite(result['asr_all'])
+    assert 'handled by midnight' in optimize.report(result)
@@ -0,0 +1,48 @@
+import numpy as np
+import queue_engine
+
+
+def random_day(rng, n=400):
+    arrival_times = np.sort(rng.uniform(0, queue_engine.DAY_SECONDS, n))
+    service = rng.exponential(20 * 60, n)
+    return arrival_times, service
+
+
+def random_plan(rng, hours):
+    return rng.integers(1, 12, hours).tolist()
+
+
+def test_staffing_sweep_matches_separate_days():
+    rng = np.random.default_rng(1)
+    for _ in range(40):
+        arrival_times, service = random_day(rng)
+        base = random_plan(rng, 24)
+        plans = []
+        for k in range(6):
+            plan = list(base)
+            fork = int(rng.integers(0, 24))
+            plan[fork:] = random_plan(rng, 24 - fork)
+            # some plans end early, or are prefixes of others
+            plans.append(plan[:int(rng.integers(fork + 1, 25))])
+        plans.append(base[:10])
+        plans.append(base)
+        results = queue_engine.run_staffing_sweep(arrival_times, service, plans)
+        for plan, (starts, ends) in zip(plans, results):
+            expected_starts, expected_ends = queue_engine.run_day(arrival_times, service, plan)
+            np.testing.assert_allclose(starts, expected_starts)
+            np.testing.assert_allclose(ends, expected_ends)
+
+
+def test_fork_day_matches_a_separate_day():
+    rng = np.random.default_rng(2)
+    for _ in range(40):
+        arrival_times, service = random_day(rng)
+        plan = random_plan(rng, 24)
+        snapshots = {}
+        starts, ends = queue_engine.run_day(arrival_times, service, plan, snapshots=snapshots)
+        for hour, snapshot in snapshots.items():
+            other = plan[:hour] + random_plan(rng, 24 - hour)
+            forked = queue_engine.fork_day(arrival_times, service, other, snapshot, starts, ends)
+            expected = queue_engine.run_day(arrival_times, service, other)
+            np.testing.assert_allclose(forked[0], expected[0])
+            np.testing.assert_allclose(forked[1], expected[1])
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import simulate as sm
+from result_store import ResultStore, store_path
+
+COORDS = {'eht': [9.0, 9.5], 'starts': [20, 21, 22], 'hour': list(range(4)), 'metric': ['asr', 'handled']}
+
+
+def filled(path):
+    store = ResultStore.create(str(path), COORDS)
+    for eht in COORDS['eht']:
+        for starts in COORDS['starts']:
+            store.write((eht, starts), np.full((4, 2), eht * 100 + starts))
+    return store
+
+
+def test_sel_drops_single_values_and_keeps_lists(tmp_path):
+    store = filled(tmp_path)
+    assert store.sel(starts=21, metric='asr').shape == (2, 4)
+    assert store.sel(eht=9.5, starts=21, hour=0, metric='asr') == 971
+    both = store.sel(eht=[9.5, 9.0], starts=[22, 20], hour=0, metric='handled')
+    np.testing.assert_array_equal(both, [[972, 970], [922, 920]])
+    # coordinates are matched by value, not by float identity
+    assert store.sel(eht=9.50000001, starts=20, hour=0, metric='asr') == 970
+    with pytest.raises(KeyError):
+        store.sel(starts=23)
+    with pytest.raises(KeyError):
+        store.sel(volume=800)
+
+
+def test_open_or_create_keeps_a_store_with_the_same_coords(tmp_path):
+    store = filled(tmp_path)
+    store.close()
+    reopened = ResultStore.open_or_create(str(tmp_path), COORDS)
+    assert reopened.completed().all()
+    assert reopened.sel(eht=9.0, starts=22, hour=3, metric='asr') == 922
+
+
+@pytest.mark.parametrize('coords, resume', [(dict(COORDS, starts=[20, 21, 23]), True),
+                                            (COORDS, False)])
+def test_open_or_create_starts_over(tmp_path, coords, resume):
+    filled(tmp_path).close()
+    store = ResultStore.open_or_create(str(tmp_path), coords, resume)
+    assert store.coords['starts'] == coords['starts']
+    assert not store.completed().any()
+
+
+def test_resuming_with_store_reruns_scenarios_missing_from_it(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sm, 'LOG_TO_FILE', False)
+    grid = dict(handle_minutes_min=9, handle_minutes_max=9, interactions_min=800,
+                interactions_max=800, agent_starts_min=20, agent_starts_max=21)
+    seen = []
+
+    def stop_after_one(point, day_df):
+        seen.append(point)
+        raise KeyboardInterrupt
+
+    # the first scenario is checkpointed without a store
+    with pytest.raises(KeyboardInterrupt):
+        sm.full_spectrum(on_result=stop_after_one, **grid)
+    sweep_id = sm.full_spectrum(store=True, on_result=lambda point, day_df: seen.append(point),
+                                **grid)
+    assert seen.count((9, 800, 20, 0)) == 2
+    store = ResultStore.open(store_path(sweep_id))
+    assert store.completed().all()
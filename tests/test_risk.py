@@ -0,0 +1,13 @@
+import numpy as np
+import pandas as pd
+import risk
+
+
+def test_residual_draws_follow_a_sloped_history():
+    x = np.arange(100, dtype=float)
+    history = pd.DataFrame({'date_delta': x[::-1], 'DAILYINTERACTIONCOUNT': 500 + 4 * x[::-1]})
+    future = pd.DataFrame({'date_delta': np.arange(100, 160, dtype=float)})
+    volumes = risk.volume_samples(history, future, samples=10, method='residual',
+                                  rng=np.random.default_rng(0))
+    assert volumes.shape == (60, 10)
+    np.testing.assert_allclose(volumes.mean(axis=1), 500 + 4 * future['date_delta'], atol=1e-6)
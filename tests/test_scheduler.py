@@ -0,0 +1,43 @@
+import threading
+import pytest
+import simulate as sm
+import scheduler
+from result_store import ResultStore
+
+
+def test_an_idle_worker_requeues_and_runs_a_stale_job(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sm, 'LOG_TO_FILE', False)
+    monkeypatch.setattr(scheduler, 'RECOVER_SECONDS', 0)
+    queue = scheduler.JobQueue(str(tmp_path / 'jobs.db'))
+    job_id = queue.submit('single', {'starts': 20, 'inter_mean': 800})
+    # a worker claimed it and died
+    queue.claim('gone:1')
+    queue.db.execute('UPDATE jobs SET heartbeat = 0 WHERE id = ?', (job_id,))
+
+    stop = threading.Event()
+    worker = threading.Thread(target=scheduler.worker_loop, args=(queue.path, stop))
+    worker.start()
+    try:
+        assert queue.result(job_id, wait=60)['Agent Starts'] == 20
+    finally:
+        stop.set()
+        worker.join()
+        queue.close()
+
+
+def test_a_stopped_sweep_closes_its_result_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sm, 'LOG_TO_FILE', False)
+    closed = []
+    close = ResultStore.close
+    monkeypatch.setattr(ResultStore, 'close', lambda self: closed.append(close(self)))
+
+    def preempt(point, day_df):
+        raise scheduler.Preempted(None)
+
+    with pytest.raises(scheduler.Preempted):
+        sm.full_spectrum(handle_minutes_min=9, handle_minutes_max=9, interactions_min=800,
+                         interactions_max=800, agent_starts_min=20, agent_starts_max=20,
+                         store=True, on_result=preempt)
+    assert len(closed) == 1
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import pytest
+import service
+
+
+@pytest.fixture(scope='module')
+def sim():
+    sim = service.SimulationService(workers=1)
+    yield sim
+    sim.close()
+
+
+def call(sim, method, path, params=None):
+    return asyncio.run(sim.handle(method, path, dict(params if params else {})))
+
+
+def request(sim, raw: bytes):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await sim.read_request(reader)
+    return asyncio.run(read())
+
+
+def test_a_scenario_runs_once_and_is_then_cached(sim):
+    scenario = {'starts': 20, 'interactions': '800', 'eht': '9.5', 'engine': 'queue'}
+    status, first = call(sim, 'GET', '/single-run', scenario)
+    assert status == 200
+    assert first['starts'] == 20 and first['interactions'] == 800 and first['asr'] > 0
+    runs = sim.stats['runs']
+    assert call(sim, 'POST', '/single-run', scenario) == (200, first)
+    assert sim.stats['runs'] == runs
+
+
+@pytest.mark.parametrize('params', [{'interactions': 800, 'eht': 9.5},
+                                    {'starts': 'many', 'interactions': 800, 'eht': 9.5},
+                                    {'starts': 20, 'interactions': 0, 'eht': 9.5},
+                                    {'starts': 20, 'interactions': 800, 'eht': 9.5,
+                                     'engine': 'des'}])
+def test_bad_scenarios_are_400(sim, params):
+    status, body = call(sim, 'GET', '/single-run', params)
+    assert status == 400 and body['error']
+
+
+def test_unknown_paths_are_404_and_other_methods_405(sim):
+    assert call(sim, 'GET', '/health') == (200, {'status': 'ok'})
+    assert call(sim, 'GET', '/runs')[0] == 404
+    assert call(sim, 'DELETE', '/single-run')[0] == 405
+
+
+def test_requests_are_parsed_from_the_query_and_the_body(sim):
+    body = json.dumps({'eht_min': 9, 'eht_max': 9, 'interactions_min': 800,
+                       'interactions_max': 900, 'interactions_step': 100, 'starts_min': 20,
+                       'starts_max': 20, 'engine': 'queue'}).encode()
+    status, result = request(sim, b'POST /sweep HTTP/1.1\r\nContent-Length: '
+                             + str(len(body)).encode() + b'\r\n\r\n' + body)
+    assert status == 200 and result['scenarios'] == 2
+    assert request(sim, b'POST /sweep HTTP/1.1\r\nContent-Length: 3\r\n\r\n{x}')[0] == 400
+    assert request(sim, b'GET /sweep HTTP/1.1\r\nContent-Length: 2000000\r\n\r\n')[0] == 413
+    assert request(sim, b'\r\n')[0] == 400
+
+
+def test_staffing_target_meets_the_goal(sim):
+    status, body = call(sim, 'GET', '/staffing-target', {
+        'interactions': 900, 'eht': 9.5, 'asr_goal': 30, 'engine': 'queue',
+        'starts_min': 10, 'starts_max': 30})
+    assert status == 200 and body['feasible']
+    assert body['result']['asr'] <= 30
+    status, fewer = call(sim, 'GET', '/single-run', {
+        'starts': body['starts'] - 1, 'interactions': 900, 'eht': 9.5, 'engine': 'queue'})
+    assert fewer['asr'] is None or fewer['asr'] > 30
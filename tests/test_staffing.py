@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+import simulate as sm
+import staffing
+
+
+def legacy_timetable(agent_starts: int, agent_portions: dict) -> tuple:
+    """
+    The hourly setter the plan replaced, set_agents_working() with
+        add_agent() and decrement_agent_hours_left(), one hour at a time.
+
+    Returns: (agents working, agents started, bench) for each hour
+    """
+    working, agent_no, bench = {}, 0, 0
+    on_shift, started, benched = [], [], []
+
+    def decrement():
+        for agent in tuple(working):
+            if working[agent] == 0:
+                del working[agent]
+            else:
+                working[agent] -= 1
+
+    for hour in range(24):
+        added = 0
+        if hour == 0:
+            bench = agent_starts - 1
+        if hour < 3:
+            if hour == 0:
+                working[-1] = 4
+            else:
+                decrement()
+        elif hour > 21:
+            if hour == 22:
+                working = {-1: 2}
+            else:
+                decrement()
+        else:
+            previous = len(working)
+            decrement()
+            ideal = int(agent_starts * agent_portions[str(hour)])
+            if ideal > len(working):
+                added = min(ideal - previous, bench)
+                for _ in range(max(added, 0)):
+                    agent_no += 1
+                    working[agent_no] = 8
+                    bench -= 1
+                added = max(added, 0)
+        on_shift.append(len(working))
+        started.append(added)
+        benched.append(bench)
+    return on_shift, started, benched
+
+
+@pytest.mark.parametrize('agent_starts', [1, 2, 5, 13, 18, 20, 22, 30, 57, 120])
+@pytest.mark.parametrize('scale', [.6, 1.0, 1.3])
+def test_compiled_plan_matches_the_hourly_setter(agent_starts, scale):
+    portions = sm.scaled_portions(sm.AGENT_PORTIONS, scale)
+    plan = staffing.compile_staffing(agent_starts, portions)
+    on_shift, started, benched = legacy_timetable(agent_starts, portions)
+    assert plan.on_shift.tolist() == on_shift
+    assert plan.new_agents.tolist() == started
+    assert plan.bench.tolist() == benched
+
+
+def test_random_portions_match_the_hourly_setter():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        agent_starts = int(rng.integers(1, 80))
+        portions = {str(h): float(p) for h, p in enumerate(rng.random(24) * 1.2)}
+        plan = staffing.compile_staffing(agent_starts, portions)
+        on_shift, started, benched = legacy_timetable(agent_starts, portions)
+        assert plan.on_shift.tolist() == on_shift
+        assert plan.new_agents.tolist() == started
+        assert plan.bench.tolist() == benched
+
+
+def test_plans_are_memoized_and_read_only():
+    plan = staffing.compile_staffing(20, sm.AGENT_PORTIONS)
+    assert staffing.compile_staffing(20, dict(sm.AGENT_PORTIONS)) is plan
+    with pytest.raises(ValueError):
+        plan.on_shift[0] = 5
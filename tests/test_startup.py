@@ -0,0 +1,18 @@
+import importlib.util
+import pytest
+import benchmark
+
+
+@pytest.mark.parametrize('modules', ['simulate', 'simulate, forecast, vsc_data'])
+def test_importing_the_sim_is_fast_and_light(modules):
+    seconds, heavy = benchmark.time_startup(modules)
+    assert heavy == []
+    assert seconds <= benchmark.STARTUP_BUDGET_SECONDS
+
+
+@pytest.mark.skipif(importlib.util.find_spec('PySimpleGUI') is None,
+                    reason='PySimpleGUI is not installed')
+def test_importing_the_gui_is_fast_and_light():
+    seconds, heavy = benchmark.time_startup('gui')
+    assert heavy == []
+    assert seconds <= benchmark.STARTUP_BUDGET_SECONDS
@@ -0,0 +1,193 @@
+"""
+Per-interaction event trace, written to a memory-mapped binary file.
+
+Debugging an odd ASR with CONSOLE_LOGGING_LEVEL = 'verbose' prints a line per
+customer event and slows the sim down by orders of magnitude. Instead, turn
+the tracer on and every handled interaction is written as one fixed-width
+record (TRACE_DTYPE) straight into a memory-mapped file, one file per
+simulated day:
+    customer       customer number for the day
+    arrival        seconds since midnight the customer entered the queue
+    service_start  seconds since midnight an agent started on it
+    service_end    seconds since midnight the agent finished
+    agent          agent number (-1 is the night agent)
+
+The files have no header, so a day is read back zero-copy with
+np.memmap(path, dtype=TRACE_DTYPE), see load_trace().
+
+Usage:
+    import tracer
+    tracer.enable('traces')
+    sm.single_run()
+    tracer.disable()
+    trace = tracer.load_trace(tracer.list_traces('traces')[-1])
+    print(tracer.summary(trace))
+"""
+
+import os
+import glob
+import datetime
+from typing import Optional
+import numpy as np
+
+
+TRACE_DTYPE = np.dtype([
+    ('customer', '<i4'),
+    ('arrival', '<f8'),
+    ('service_start', '<f8'),
+    ('service_end', '<f8'),
+    ('agent', '<i4'),
+])
+TRACE_EXTENSION = '.trace'
+# records allocated up front, the file doubles in size when it fills up
+INITIAL_CAPACITY = 2048
+
+# the trace session that simulate_day() writes to, None when tracing is off
+ACTIVE = None
+
+
+class DayTrace:
+    """Writes the records of one simulated day into a memory-mapped file."""
+
+    def __init__(self, path: str, capacity: int = INITIAL_CAPACITY):
+        self.path = path
+        self.count = 0
+        self.capacity = max(1, capacity)
+        self._file = open(path, 'w+b')
+        self._file.truncate(self.capacity * TRACE_DTYPE.itemsize)
+        self._records = np.memmap(self._file, dtype=TRACE_DTYPE, mode='r+',
+                                  shape=(self.capacity,))
+
+    def record(self, customer: int, arrival: float, service_start: float,
+               service_end: float, agent: int) -> None:
+        if self.count == self.capacity:
+            self._grow()
+        self._records[self.count] = (customer, arrival, service_start, service_end, agent)
+        self.count += 1
+
+    def record_many(self, customers: np.ndarray, arrivals: np.ndarray, service_starts: np.ndarray,
+                    service_ends: np.ndarray, agents: np.ndarray) -> None:
+        """Writes a whole batch of records at once."""
+        n = len(customers)
+        while self.count + n > self.capacity:
+            self._grow()
+        block = self._records[self.count:self.count + n]
+        block['customer'] = customers
+        block['arrival'] = arrivals
+        block['service_start'] = service_starts
+        block['service_end'] = service_ends
+        block['agent'] = agents
+        self.count += n
+
+    def _grow(self) -> None:
+        self._records.flush()
+        del self._records
+        self.capacity *= 2
+        self._file.truncate(self.capacity * TRACE_DTYPE.itemsize)
+        self._records = np.memmap(self._file, dtype=TRACE_DTYPE, mode='r+',
+                                  shape=(self.capacity,))
+
+    def close(self) -> None:
+        """Flushes the records and trims the unused capacity off the file."""
+        if self._file.closed:
+            return
+        self._records.flush()
+        del self._records
+        self._file.truncate(self.count * TRACE_DTYPE.itemsize)
+        self._file.close()
+
+
+class TraceSession:
+    """Hands out one DayTrace per simulated day, all in the same folder."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.day = None
+        self.paths = []
+        os.makedirs(directory, exist_ok=True)
+
+    def begin_day(self, label: str = '', expected: int = INITIAL_CAPACITY) -> DayTrace:
+        self.end_day()
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        name = '{}_{}{}'.format(stamp, label, TRACE_EXTENSION) if label else stamp + TRACE_EXTENSION
+        path = os.path.join(self.directory, name)
+        self.day = DayTrace(path, expected)
+        self.paths.append(path)
+        return self.day
+
+    def end_day(self) -> None:
+        if self.day is not None:
+            self.day.close()
+            self.day = None
+
+
+def enable(directory: str = 'traces') -> TraceSession:
+    """Turns tracing on for every following simulate_day() call."""
+    global ACTIVE
+    disable()
+    ACTIVE = TraceSession(directory)
+    return ACTIVE
+
+
+def disable() -> Optional[TraceSession]:
+    """Turns tracing off, closing the current day's file."""
+    global ACTIVE
+    session = ACTIVE
+    if session is not None:
+        session.end_day()
+    ACTIVE = None
+    return session
+
+
+def list_traces(directory: str = 'traces') -> list:
+    """Trace files in the folder, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, '*' + TRACE_EXTENSION)))
+
+
+def load_trace(path: str) -> np.ndarray:
+    """
+    Maps a day's trace into memory without copying it.
+
+    Returns: read-only structured array with TRACE_DTYPE fields.
+    """
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=TRACE_DTYPE)
+    return np.memmap(path, dtype=TRACE_DTYPE, mode='r')
+
+
+def summary(trace: np.ndarray) -> dict:
+    """
+    ASR and counts for a trace, overall and by arrival hour.
+    Speed to respond is measured the same way as the sim measures it, from
+    arrival to the end of service.
+    """
+    if len(trace) == 0:
+        return {'interactions': 0, 'asr': float('nan'), 'hourly_asr': [],
+                'hourly_interactions': [], 'agents': 0}
+    respond = (trace['service_end'] - trace['arrival']) / 60
+    hour = np.clip((trace['arrival'] // 3600).astype(int), 0, 23)
+    counts = np.bincount(hour, minlength=24)
+    totals = np.bincount(hour, weights=respond, minlength=24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hourly = totals / counts
+    return {
+        'interactions': int(len(trace)),
+        'asr': float(respond.mean()),
+        'mean_wait': float(((trace['service_start'] - trace['arrival']) / 60).mean()),
+        'hourly_asr': hourly.round(2).tolist(),
+        'hourly_interactions': counts.tolist(),
+        'agents': int(len(np.unique(trace['agent']))),
+    }
+
+
+def plot_trace(trace: np.ndarray, title: str = 'Speed to respond by arrival time') -> None:
+    """Scatter of speed to respond against arrival time, coloured by agent."""
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(10, 5))
+    plt.scatter(trace['arrival'] / 3600, (trace['service_end'] - trace['arrival']) / 60,
+                c=trace['agent'], s=6, cmap='tab20')
+    plt.title(title)
+    plt.xlabel('arrival hour')
+    plt.ylabel('speed to respond (minutes)')
+    plt.show()